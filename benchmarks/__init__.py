@@ -0,0 +1,4 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmarks of the Repository, run them with python -m benchmarks.<name> """
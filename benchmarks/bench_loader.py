@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare the csv loader of the Repository with the DictReader loader it replaced.
+
+The baseline is the loader of the original Repository, filling a plain dict: one dict per row,
+\\N replaced in every field, Movie and Rating built from keyword arguments, ratings kept as
+strings. The current loader is timed alone, then followed by build_indexes(), which the
+baseline had no equivalent of.
+
+    python -m benchmarks.bench_loader --movies 200000
+"""
+import argparse
+import csv
+import gc
+import tempfile
+import time
+from pathlib import Path
+
+from classes import ColumnStore, DictStore, Movie, Rating, Repository
+
+from .data import write_csv
+
+
+def baseline_import(movie_path: Path, rating_path: Path) -> dict[str, Movie]:
+    """ The loader of the original Repository, return its movies by uid """
+    movies: dict[str, Movie] = {}
+    with open(movie_path, encoding="utf8") as movie_file:
+        reader = csv.DictReader(movie_file)
+        for row in reader:
+            for key, elem in row.items():
+                row[key] = elem.replace(r"\N", "")
+            row["uid"] = row.pop("tconst")
+            row["isAdult"] = bool(int(row["isAdult"]))
+            if row["genres"]:
+                row["genres"] = row["genres"].split(",")
+
+            movie = Movie(**row)
+            if movie.uid not in movies or movies[movie.uid] != movie:
+                movies[movie.uid] = movie
+
+    with open(rating_path, encoding="utf8") as rating_file:
+        reader = csv.DictReader(rating_file)
+        for row in reader:
+            for key, elem in row.items():
+                row[key] = elem.replace(r"\N", "")
+            row["uid"] = row.pop("tconst")
+            rating = Rating(**row)
+            if movies[rating.uid].rating != rating:
+                movies[rating.uid] = movies[rating.uid]._replace(rating=rating)
+    return movies
+
+
+def current_import(store_type: type, movie_path: Path, rating_path: Path) -> Repository:
+    """ The loader of the Repository """
+    repository = Repository(store_type())
+    repository.import_movies(movie_path)
+    repository.import_ratings(rating_path)
+    return repository
+
+
+def current_import_indexed(store_type: type, movie_path: Path, rating_path: Path) -> Repository:
+    """ The loader of the Repository, followed by building the indexes """
+    repository = current_import(store_type, movie_path, rating_path)
+    repository.build_indexes()
+    return repository
+
+
+def best_time(loader, *args, repeat: int) -> tuple[float, object]:
+    """
+    Return the best time of repeat calls of loader(*args), and the last result. The previous
+    result is dropped and the garbage collected first, so each call starts from the same heap.
+    """
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = loader(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def same_movies(repository: Repository, expected: dict[str, Movie]) -> bool:
+    """
+    Return True if the repository holds the movies of the baseline, whose ratings are strings
+    and whose missing genres are empty strings.
+    """
+    if len(repository.movies) != len(expected):
+        return False
+    for uid, movie in expected.items():
+        loaded = repository.movies.get(uid)
+        if loaded is None or loaded[:5] != movie[:5] or list(loaded.genres) != list(movie.genres):
+            return False
+        rating = movie.rating and (float(movie.rating.averageRating), int(movie.rating.numVotes))
+        if (loaded.rating and tuple(loaded.rating[1:])) != rating:
+            return False
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--movies", type=int, default=200000, help="number of movies generated")
+    parser.add_argument("--repeat", type=int, default=3, help="loads timed, the best is kept")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        movie_path, rating_path = write_csv(Path(directory), args.movies)
+        print(f"{args.movies} movies, best of {args.repeat}")
+        baseline, expected = best_time(baseline_import, movie_path, rating_path,
+                                       repeat=args.repeat)
+        print(f"{'baseline':<26} {baseline:7.3f}s")
+        for store_type in (DictStore, ColumnStore):
+            for label, loader in [("load", current_import),
+                                  ("load+indexes", current_import_indexed)]:
+                current, repository = best_time(loader, store_type, movie_path, rating_path,
+                                                repeat=args.repeat)
+                if not same_movies(repository, expected):
+                    raise AssertionError(f"{store_type.__name__}: the loaders disagree")
+                print(f"{store_type.__name__:<12} {label:<13} {current:7.3f}s  "
+                      f"speedup {baseline / current:5.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Generate synthetic data shaped like the IMDB datasets, reproducible from a seed """
+import csv
+import gzip
+import random
+from collections.abc import Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+WORDS = ("the a of love night man god father war star dark city lost day house life king amélie "
+         "café über señor blue red world last time story girl boy dead black").split()
+GENRES = ("Drama Comedy Action Thriller Romance Horror Documentary Crime Adventure Family Sci-Fi "
+          "Adult").split()
+# Title types of title.basics.tsv other than movie, which the conversion filters out
+OTHER_TYPES = ["short", "tvSeries", "tvEpisode", "video", "tvMovie"]
+# Categories of title.principals.tsv, and the parts of the names of name.basics.tsv
+CATEGORIES = ["actor", "actress", "director", "writer", "producer", "composer", "self"]
+FIRST_NAMES = "anna marc léa john maria pierre sofia jean emma louis chloé paul".split()
+LAST_NAMES = "martin smith dupont garcía müller rossi kowalski nguyen silva brown".split()
+# Credits of each title in title.principals.tsv, and titles per person of name.basics.tsv
+CREDITS_PER_TITLE = 5
+TITLES_PER_PERSON = 2
+# Number of titles of each scale offered by the benchmarks
+SCALES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+
+
+class SyntheticTitle(NamedTuple):
+    """ A generated title, its fields as written in the IMDB dumps """
+    tconst: str
+    titleType: str
+    primaryTitle: str
+    originalTitle: str
+    isAdult: str
+    startYear: str
+    genres: str
+    averageRating: str
+    numVotes: str
+
+
+def synthetic_titles(count: int, seed: int = 1, movie_share: float = 1.0
+                     ) -> Iterator[SyntheticTitle]:
+    """
+    Yield count random titles. Unknown values are \\N, and a title without rating has empty
+    averageRating and numVotes.
+
+    :param movie_share: Share of the titles which are movies, the others having another type
+    """
+    rand = random.Random(seed)
+    for number in range(count):
+        title = " ".join(rand.choice(WORDS).capitalize() for _ in range(rand.randint(1, 4)))
+        rated = rand.random() < 0.7
+        yield SyntheticTitle(
+            f"tt{number:07d}",
+            "movie" if rand.random() < movie_share else rand.choice(OTHER_TYPES),
+            title,
+            title if rand.random() < 0.8 else " ".join(rand.sample(WORDS, 2)),
+            "1" if rand.random() < 0.02 else "0",
+            str(rand.randint(1900, 2023)) if rand.random() < 0.95 else r"\N",
+            ",".join(sorted(rand.sample(GENRES, rand.randint(1, 3))))
+            if rand.random() < 0.95 else r"\N",
+            str(round(rand.uniform(1, 10), 1)) if rated else "",
+            # Few titles get many votes, like in the real dataset
+            str(int(rand.paretovariate(0.8) * 5)) if rated else "")
+
+
+def write_csv(directory: Path, count: int, seed: int = 1) -> tuple[Path, Path]:
+    """ Write a title_basic.csv and a rating.csv of count random movies, return their paths """
+    movie_path = directory.joinpath("title_basic.csv")
+    rating_path = directory.joinpath("rating.csv")
+    with open(movie_path, "w", encoding="utf8", newline="") as movie_file, \
+            open(rating_path, "w", encoding="utf8", newline="") as rating_file:
+        movie_writer = csv.writer(movie_file)
+        rating_writer = csv.writer(rating_file)
+        movie_writer.writerow(["tconst", "primaryTitle", "originalTitle", "isAdult", "startYear",
+                               "genres"])
+        rating_writer.writerow(["tconst", "averageRating", "numVotes"])
+        for title in synthetic_titles(count, seed):
+            movie_writer.writerow([title.tconst, title.primaryTitle, title.originalTitle,
+                                   title.isAdult, title.startYear, title.genres])
+            if title.averageRating:
+                rating_writer.writerow([title.tconst, title.averageRating, title.numVotes])
+    return movie_path, rating_path
+
+
+def write_tsv(directory: Path, count: int, seed: int = 1, compress: bool = False,
+              movie_share: float = 0.6) -> tuple[Path, Path]:
+    """
+    Write a title.basics.tsv and a title.ratings.tsv of count random titles, as downloaded
+    from the IMDB datasets (gzipped if compress), return their paths.
+    """
+    suffix = ".tsv.gz" if compress else ".tsv"
+    basics_path = directory.joinpath("title.basics" + suffix)
+    ratings_path = directory.joinpath("title.ratings" + suffix)
+    opener = gzip.open if compress else open
+    with opener(basics_path, "wt", encoding="utf8", newline="") as basics_file, \
+            opener(ratings_path, "wt", encoding="utf8", newline="") as ratings_file:
+        basics_file.write("tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\t"
+                          "endYear\truntimeMinutes\tgenres\n")
+        ratings_file.write("tconst\taverageRating\tnumVotes\n")
+        for title in synthetic_titles(count, seed, movie_share):
+            basics_file.write("\t".join([title.tconst, title.titleType, title.primaryTitle,
+                                         title.originalTitle, title.isAdult, title.startYear,
+                                         r"\N", "90", title.genres]) + "\n")
+            if title.averageRating:
+                ratings_file.write(f"{title.tconst}\t{title.averageRating}\t{title.numVotes}\n")
+    return basics_path, ratings_path
+
+
+def write_credit_tsv(directory: Path, count: int, seed: int = 1,
+                     compress: bool = False) -> tuple[Path, Path]:
+    """
+    Write a title.principals.tsv crediting people to the count titles of write_tsv, and the
+    name.basics.tsv of these people (gzipped if compress), return their paths.
+    """
+    suffix = ".tsv.gz" if compress else ".tsv"
+    principals_path = directory.joinpath("title.principals" + suffix)
+    names_path = directory.joinpath("name.basics" + suffix)
+    opener = gzip.open if compress else open
+    rand = random.Random(seed)
+    people = max(1, count // TITLES_PER_PERSON)
+    with opener(principals_path, "wt", encoding="utf8", newline="") as principals_file:
+        principals_file.write("tconst\tordering\tnconst\tcategory\tjob\tcharacters\n")
+        for number in range(count):
+            for ordering in range(1, rand.randint(1, 2 * CREDITS_PER_TITLE) + 1):
+                # Some people are credited far more than others, like in the real dataset
+                person = int(people * rand.random() ** 3)
+                principals_file.write(f"tt{number:07d}\t{ordering}\tnm{person:07d}\t"
+                                      f"{rand.choice(CATEGORIES)}\t\\N\t\\N\n")
+    with opener(names_path, "wt", encoding="utf8", newline="") as names_file:
+        names_file.write("nconst\tprimaryName\tbirthYear\tdeathYear\tprimaryProfession\t"
+                         "knownForTitles\n")
+        for person in range(people):
+            names_file.write(f"nm{person:07d}\t{rand.choice(FIRST_NAMES).capitalize()} "
+                             f"{rand.choice(LAST_NAMES).capitalize()}\t\\N\t\\N\t\\N\t\\N\n")
+    return principals_path, names_path
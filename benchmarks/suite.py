@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Time the hot paths of the search on synthetic IMDB-shaped data and compare to a baseline.
+
+The dumps are generated from a fixed seed, so two runs on the same machine measure the same
+work: conversion of the TSV dumps by one and by several processes, csv import, single pass
+import of the dumps, import of the cast and crew, index build, snapshot, single searches,
+suggestions, fuzzy searches, searches by person, sorting, and query mixes built like the ones
+of movie_search. Each case reports its best time, its throughput and the peak of memory
+allocated while it runs (tracemalloc). The baseline is recorded on each machine with
+--save-baseline, none is committed.
+
+    python -m benchmarks.suite --scale 100k --save-baseline
+    python -m benchmarks.suite --scale 100k                  # exits with 1 on regressions
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+from classes import ColumnStore, Credit, DictStore, Movie, Person, Query, Rating, Repository
+from classes.repository import QUERY_CACHE_ROWS, QUERY_CACHE_SIZE
+from import_file.import_utils import convert_tsv, import_dumps
+
+from .data import FIRST_NAMES, GENRES, SCALES, WORDS, write_credit_tsv, write_tsv
+
+BASELINE_PATH = Path(__file__).parent.joinpath("baseline.json")
+STORES = {"dict": DictStore, "column": ColumnStore}
+# Number of queries of each query mix
+MIX_SIZE = 200
+# Sort orders offered by select_sort
+SORT_ORDERS = [("primaryTitle",), (("startYear", True), "primaryTitle"),
+               (("averageRating", True), "primaryTitle"), (("weightedRating", True),),
+               (("numVotes", True),)]
+
+
+class Case(NamedTuple):
+    """ A timed operation: setup() is not timed and returns the argument of run() """
+    name: str
+    setup: Callable[[], Any]
+    run: Callable[[Any], Any]
+    # Number of items processed by run(), or a function returning it once setup() ran
+    items: int | Callable[[], int]
+    unit: str
+
+
+class Measure(NamedTuple):
+    """ Result of a case, throughput being in unit per second """
+    seconds: float
+    throughput: float
+    unit: str
+    peak_bytes: Optional[int]
+
+
+def random_query(repository: Repository, rand: random.Random) -> tuple[Query, tuple]:
+    """ Return a Query on random criteria, as movie_search builds them, and a sort order """
+    query = Query(repository)
+    for search_type in rand.sample(["Title", "Year", "Rating", "Votes", "Genre", "Adult"],
+                                   rand.randint(1, 3)):
+        if search_type == "Title":
+            query.title(" ".join(rand.sample(WORDS, rand.randint(1, 2)))[:rand.randint(2, 9)])
+        elif search_type == "Year":
+            start = rand.randint(1900, 2023)
+            query.year(start, start + rand.choice([0, 5, 20, 100]))
+        elif search_type == "Rating":
+            query.rating(rand.choice([1, 5, 7, 8.5]), None)
+        elif search_type == "Votes":
+            query.votes(rand.choice([10, 100, 10000]), None)
+        elif search_type == "Genre":
+            query.genre(rand.sample(GENRES, rand.randint(1, 2)), rand.choice(["any", "all"]))
+        else:
+            query.adult(rand.random() < 0.1)
+    return query, rand.choice(SORT_ORDERS)
+
+
+def run_mix(repository: Repository, seed: int) -> int:
+    """ Run MIX_SIZE random queries, reading their first page, return the movies read """
+    rand = random.Random(seed)
+    read = 0
+    for _ in range(MIX_SIZE):
+        query, keys = random_query(repository, rand)
+        result = query.paginate(keys, page_size=10)
+        if result:
+            read += len(result.page(0))
+    return read
+
+
+def without_cache(repository: Repository) -> Repository:
+    """ Empty the result cache and disable it, so every query is computed """
+    repository._clear_results()
+    repository.cache_size = 0
+    return repository
+
+
+def with_warm_cache(repository: Repository) -> Repository:
+    """ Enable the result cache and fill it with the queries of the mix """
+    repository._clear_results()
+    # Each query caches its rows and its sorted result
+    repository.cache_size = max(QUERY_CACHE_SIZE, 2 * MIX_SIZE)
+    repository.cache_rows = max(QUERY_CACHE_ROWS, 2 * MIX_SIZE * len(repository.movies))
+    run_mix(repository, seed=2)
+    return repository
+
+
+def run_cached_mix(repository: Repository, seed: int) -> int:
+    """ Run the mix warmed by with_warm_cache, every query should be answered from the cache """
+    misses = repository.cache_misses
+    read = run_mix(repository, seed)
+    assert repository.cache_misses == misses, \
+        f"{repository.cache_misses - misses} queries of the cached mix missed the cache"
+    return read
+
+
+def build_cases(directory: Path, count: int, store_type: type) -> list[Case]:
+    """ Return the cases, in an order where each one can rely on the work of the previous """
+    basics_path = directory.joinpath("title.basics.tsv")
+    ratings_path = directory.joinpath("title.ratings.tsv")
+    movie_path = directory.joinpath("title_basic.csv")
+    rating_path = directory.joinpath("rating.csv")
+    principals_path = directory.joinpath("title.principals.tsv")
+    names_path = directory.joinpath("name.basics.tsv")
+    credit_path = directory.joinpath("principals.csv")
+    person_path = directory.joinpath("name_basic.csv")
+    snapshot_path = directory.joinpath("repository.bin")
+    # The repository searched, filled by the cases which import
+    repository = Repository(store_type())
+
+    def import_movies() -> None:
+        repository.movies.clear()
+        repository.import_movies(movie_path)
+
+    def searched() -> Repository:
+        repository.build_indexes()
+        return without_cache(repository)
+
+    def movie_count() -> int:
+        return len(repository.movies)
+
+    def person_query(name: str, start: int) -> list[int]:
+        return Query(repository).person(name).year(start, start + 20).rows()
+
+    return [
+        Case("convert_tsv movies", lambda: None,
+             lambda _: convert_tsv(basics_path, movie_path, Movie, workers=1), count, "rows"),
+        Case("convert_tsv 4 workers", lambda: None,
+             lambda _: convert_tsv(basics_path, movie_path, Movie, workers=4), count, "rows"),
+        # Like import_and_convert_tsv, only the ratings of the movies are kept
+        Case("convert_tsv ratings",
+             lambda: [fields[0] for fields in Repository.read_movie_rows(movie_path)],
+             lambda uids: convert_tsv(ratings_path, rating_path, Rating, uids, workers=1),
+             count, "rows"),
+        Case("import_movies", lambda: Repository(store_type()),
+             lambda fresh: fresh.import_movies(movie_path), count, "rows"),
+        Case("import_ratings", import_movies, lambda _: repository.import_ratings(rating_path),
+             count, "rows"),
+        Case("import_dumps", lambda: Repository(store_type()),
+             lambda fresh: import_dumps(fresh, basics_path, ratings_path, workers=1, save=False),
+             count, "rows"),
+        # Like import_and_convert_tsv, only the credits of the movies and the names of the
+        # people they credit are kept
+        Case("convert_tsv principals", lambda: list(repository.movies),
+             lambda uids: convert_tsv(principals_path, credit_path, Credit, uids, workers=1),
+             count, "titles"),
+        Case("import_credits", lambda: None, lambda _: repository.import_credits(credit_path),
+             lambda: len(repository.credits), "credits"),
+        Case("convert_tsv names", lambda: list(repository.credits.person_uids()),
+             lambda uids: convert_tsv(names_path, person_path, Person, uids, workers=1),
+             lambda: repository.credits.person_count(), "people"),
+        Case("import_people", lambda: None, lambda _: repository.import_people(person_path),
+             lambda: repository.credits.person_count(), "people"),
+        Case("build_indexes", repository._drop_indexes, lambda _: repository.build_indexes(),
+             movie_count, "movies"),
+        Case("save_snapshot", lambda: repository,
+             lambda searched_repository: searched_repository.save_snapshot(snapshot_path),
+             movie_count, "movies"),
+        Case("load_snapshot", lambda: Repository(store_type()),
+             lambda fresh: fresh.load_snapshot(snapshot_path), movie_count, "movies"),
+        Case("search_title", searched,
+             lambda searched_repository: [searched_repository.search_title(word, normalized=True)
+                                          for word in WORDS[:10]], 10, "queries"),
+        Case("search_year", searched,
+             lambda searched_repository: [searched_repository.search_year(year, year + 5)
+                                          for year in range(1900, 2020, 12)], 10, "queries"),
+        Case("search_rating", searched,
+             lambda searched_repository: [searched_repository.search_rating(low / 2, None)
+                                          for low in range(2, 20, 2)], 9, "queries"),
+        Case("suggest", searched,
+             lambda searched_repository: [searched_repository.suggest(word[:length])
+                                          for word in WORDS[:10] for length in (1, 3)],
+             20, "queries"),
+        Case("fuzzy_search", searched,
+             lambda searched_repository: [searched_repository.fuzzy_search(word[1:] + word[0])
+                                          for word in WORDS[:10]], 10, "queries"),
+        Case("search_person", searched,
+             lambda _: [person_query(name, start) for name in FIRST_NAMES[:5]
+                        for start in (1950, 2000)], 10, "queries"),
+        Case("sort_movies", lambda: list(searched().movies.values()),
+             lambda movies: repository.sort_movies(movies, SORT_ORDERS[2]),
+             movie_count, "movies"),
+        Case("paginate first page", lambda: list(searched().movies.values()),
+             lambda movies: repository.paginate(movies, SORT_ORDERS[1]).page(0),
+             movie_count, "movies"),
+        Case("query mix", searched, lambda searched_repository: run_mix(searched_repository, 2),
+             MIX_SIZE, "queries"),
+        Case("query mix cached", lambda: with_warm_cache(searched()),
+             lambda searched_repository: run_cached_mix(searched_repository, 2), MIX_SIZE,
+             "queries"),
+    ]
+
+
+def measure(case: Case, repeat: int, memory: bool) -> Measure:
+    """ Return the best time of repeat runs, and the peak of memory of one more run """
+    best = float("inf")
+    for _ in range(repeat):
+        argument = case.setup()
+        start = time.perf_counter()
+        case.run(argument)
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        argument = case.setup()
+        tracemalloc.start()
+        try:
+            case.run(argument)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    items = case.items() if callable(case.items) else case.items
+    return Measure(best, items / best if best else float("inf"), case.unit, peak)
+
+
+def compare(results: dict[str, Measure], baseline: dict[str, dict],
+            tolerance: float) -> list[str]:
+    """ Return a description of each case slower or using more memory than the baseline """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result.seconds > expected["seconds"] * (1 + tolerance):
+            regressions.append(f"{name}: {result.seconds:.4f}s instead of "
+                               f"{expected['seconds']:.4f}s")
+        if (result.peak_bytes is not None and expected.get("peak_bytes")
+                and result.peak_bytes > expected["peak_bytes"] * (1 + tolerance)):
+            regressions.append(f"{name}: {result.peak_bytes / 2**20:.1f} MiB peak instead of "
+                               f"{expected['peak_bytes'] / 2**20:.1f} MiB")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="10k", help="number of titles")
+    parser.add_argument("--store", choices=STORES, default="dict", help="store of the movies")
+    parser.add_argument("--repeat", type=int, default=3, help="runs timed, the best is kept")
+    parser.add_argument("--data-dir", type=Path,
+                        help="directory of the generated dumps, kept between runs "
+                             "(a temporary directory by default)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the memory peaks")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH,
+                        help="json file of the results compared to")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="record the results as the baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown tolerated before reporting a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = args.data_dir or Path(temp_dir)
+        directory = directory.joinpath(f"{args.scale}-{args.store}")
+        directory.mkdir(parents=True, exist_ok=True)
+        if not directory.joinpath("title.ratings.tsv").exists():
+            write_tsv(directory, SCALES[args.scale])
+        if not directory.joinpath("name.basics.tsv").exists():
+            write_credit_tsv(directory, SCALES[args.scale])
+
+        print(f"{args.scale} titles, {STORES[args.store].__name__}, best of {args.repeat}")
+        results = {}
+        for case in build_cases(directory, SCALES[args.scale], STORES[args.store]):
+            result = results[case.name] = measure(case, args.repeat, not args.no_memory)
+            peak = "" if result.peak_bytes is None else f"{result.peak_bytes / 2**20:9.1f} MiB"
+            print(f"{case.name:<24} {result.seconds:9.4f}s {result.throughput:12,.0f} "
+                  f"{result.unit}/s {peak}")
+
+    key = f"{args.scale}/{args.store}"
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        baselines[key] = {name: result._asdict() for name, result in results.items()}
+        args.baseline.write_text(json.dumps(baselines, indent=2))
+        print(f"Baseline saved in {args.baseline}")
+    elif key in baselines:
+        regressions = compare(results, baselines[key], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regression")
+    else:
+        print(f"No baseline for {key} in {args.baseline}, use --save-baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,4 +3,10 @@
 
 """ Import modules to the package """
 
+from .movie import *
+from .credits import *
+from .profiling import *
+from .storage import *
+from .results import *
 from .repository import *
+from .query import *
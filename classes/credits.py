@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Contain the Credits class, linking the movies to the people of their cast and crew """
+from array import array
+from bisect import bisect_left
+from collections.abc import Collection, Iterable, Iterator, Sequence
+from typing import Optional
+
+from .movie import Person
+
+# Credits are sorted as single integers packing, from the high bits down: movie number,
+# ordering, person number and category code in one direction, person position, movie
+# position and category code in the other
+CATEGORY_BITS = 8
+PERSON_BITS = 32
+ORDERING_BITS = 16
+MOVIE_BITS = 32
+
+
+def uid_number(uid: str) -> int:
+    """ Return the number of a tconst or nconst, "tt0000012" giving 12 """
+    return int(uid[2:])
+
+
+def movie_uid(number: int) -> str:
+    """ Return the tconst of a movie number, 12 giving "tt0000012" """
+    return f"tt{number:07d}"
+
+
+def person_uid(number: int) -> str:
+    """ Return the nconst of a person number, 12 giving "nm0000012" """
+    return f"nm{number:07d}"
+
+
+class Credits:
+    """
+    Inverted index of the principal cast and crew of the movies, in both directions.
+
+    Movies and people are referred to by the number of their tconst and nconst, kept once in
+    sorted arrays: a movie or a person is then known by its position in them. The credits of
+    each side are flat arrays of positions of the other side, the credits of position i lying
+    between offsets[i] and offsets[i + 1], with the category of each credit as a one byte code.
+    A few bytes per credit, where tuples of strings would take hundreds.
+
+    The credits are replaced as a whole by build(), the names of the people by set_names().
+    """
+
+    def __init__(self):
+        self.categories: list[str] = []
+        self._movies = array("I")
+        self._movie_offsets = array("I", [0])
+        self._movie_people = array("I")
+        self._movie_categories = array("B")
+        self._people = array("I")
+        self._person_offsets = array("I", [0])
+        self._person_movies = array("I")
+        self._person_categories = array("B")
+        self.names: list[str] = []
+
+    def __len__(self) -> int:
+        """ Return the number of credits """
+        return len(self._movie_people)
+
+    def person_count(self) -> int:
+        """ Return the number of people credited at least once """
+        return len(self._people)
+
+    def build(self, credits: Iterable[tuple[int, int, int, str]]) -> None:
+        """
+        Replace the credits by the (movie number, ordering, person number, category) provided.
+        The names of the people are forgotten, see set_names.
+
+        :raise ValueError: if a number, an ordering or the count of categories does not fit
+        the packed integers
+        """
+        codes: dict[str, int] = {}
+        entries = []
+        for movie, ordering, person, category in credits:
+            code = codes.get(category)
+            if code is None:
+                code = codes[category] = len(codes)
+            if (movie >> MOVIE_BITS or person >> PERSON_BITS or ordering >> ORDERING_BITS
+                    or code >> CATEGORY_BITS):
+                raise ValueError(f"Credit of [{movie_uid(movie)}] can't be packed.")
+            entries.append(((movie << ORDERING_BITS | ordering) << PERSON_BITS | person)
+                           << CATEGORY_BITS | code)
+        entries.sort()
+
+        category_mask = (1 << CATEGORY_BITS) - 1
+        person_mask = (1 << PERSON_BITS) - 1
+        people = sorted({entry >> CATEGORY_BITS & person_mask for entry in entries})
+        positions = dict(zip(people, range(len(people))))
+
+        movies, movie_offsets = array("I"), array("I")
+        movie_people, movie_categories = array("I"), array("B")
+        # The same credits from the side of the people, to be sorted by person then movie
+        person_entries = []
+        for entry in entries:
+            movie = entry >> (CATEGORY_BITS + PERSON_BITS + ORDERING_BITS)
+            if not movies or movies[-1] != movie:
+                movies.append(movie)
+                movie_offsets.append(len(movie_people))
+            person = positions[entry >> CATEGORY_BITS & person_mask]
+            code = entry & category_mask
+            movie_people.append(person)
+            movie_categories.append(code)
+            person_entries.append((person << MOVIE_BITS | len(movies) - 1) << CATEGORY_BITS
+                                  | code)
+        movie_offsets.append(len(movie_people))
+        del entries, positions
+
+        person_entries.sort()
+        movie_mask = (1 << MOVIE_BITS) - 1
+        person_offsets = array("I", bytes(4 * (len(people) + 1)))
+        person_movies, person_categories = array("I"), array("B")
+        for entry in person_entries:
+            person_offsets[(entry >> (CATEGORY_BITS + MOVIE_BITS)) + 1] += 1
+            person_movies.append(entry >> CATEGORY_BITS & movie_mask)
+            person_categories.append(entry & category_mask)
+        for position in range(len(people)):
+            person_offsets[position + 1] += person_offsets[position]
+
+        self.categories = list(codes)
+        self._movies, self._movie_offsets = movies, movie_offsets
+        self._movie_people, self._movie_categories = movie_people, movie_categories
+        self._people, self._person_offsets = array("I", people), person_offsets
+        self._person_movies, self._person_categories = person_movies, person_categories
+        self.names = [""] * len(people)
+
+    def set_names(self, people: Iterable[tuple[int, str]]) -> None:
+        """ Set the names of the (person number, name) provided, ignoring the uncredited ones """
+        names = [""] * len(self._people)
+        for number, name in people:
+            position = self.person_position(number)
+            if position is not None:
+                names[position] = name
+        self.names = names
+
+    def person_position(self, number: int) -> Optional[int]:
+        """ Return the position of a person number, None if the person has no credit """
+        position = bisect_left(self._people, number)
+        if position < len(self._people) and self._people[position] == number:
+            return position
+        return None
+
+    def person_uids(self) -> Iterator[str]:
+        """ Iterate over the nconst of every person credited, in increasing order """
+        return map(person_uid, self._people)
+
+    def credit_count(self, position: int) -> int:
+        """ Return the number of credits of the person at position """
+        return self._person_offsets[position + 1] - self._person_offsets[position]
+
+    def movie_numbers(self) -> array:
+        """ Return the number of every movie crediting someone, by position """
+        return self._movies
+
+    def movie_positions(self, position: int,
+                        categories: Optional[Collection[str]] = None) -> Sequence[int]:
+        """
+        Return the positions of the movies crediting the person at position, in increasing
+        order, a movie appearing once per credit.
+
+        :param categories: Only keep the credits in these categories, such as "director"
+        """
+        start, end = self._person_offsets[position], self._person_offsets[position + 1]
+        if categories is None:
+            return self._person_movies[start:end]
+        codes = {code for code, category in enumerate(self.categories) if category in categories}
+        return [movie for movie, code in zip(self._person_movies[start:end],
+                                             self._person_categories[start:end])
+                if code in codes]
+
+    def people_of(self, number: int) -> list[tuple[Person, str]]:
+        """ Return the people credited by a movie number with their category, in billing order """
+        position = bisect_left(self._movies, number)
+        if position == len(self._movies) or self._movies[position] != number:
+            return []
+        start, end = self._movie_offsets[position], self._movie_offsets[position + 1]
+        return [(Person(person_uid(self._people[person]), self.names[person]),
+                 self.categories[code])
+                for person, code in zip(self._movie_people[start:end],
+                                        self._movie_categories[start:end])]
+
+    def to_columns(self) -> tuple:
+        """ Return the content as builtins and arrays, quick to pickle, see from_columns """
+        return (self.categories, self._movies, self._movie_offsets, self._movie_people,
+                self._movie_categories, self._people, self._person_offsets,
+                self._person_movies, self._person_categories, self.names)
+
+    @classmethod
+    def from_columns(cls, columns: tuple) -> "Credits":
+        """ Return the Credits whose to_columns() returned columns """
+        credits = cls()
+        (credits.categories, credits._movies, credits._movie_offsets, credits._movie_people,
+         credits._movie_categories, credits._people, credits._person_offsets,
+         credits._person_movies, credits._person_categories, credits.names) = columns
+        return credits
@@ -0,0 +1,534 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Contain the secondary indexes the Repository uses to answer searches """
+import math
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from heapq import heappop, heappush
+from itertools import repeat
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from typing import Optional
+
+# Entries pack the key in the high bits and the row number in the low bits
+ROW_BITS = 32
+ROW_MASK = (1 << ROW_BITS) - 1
+# Absorbs float noise such as 7.3 * 100 == 729.9999999999999
+KEY_TOLERANCE = 1e-6
+# Posting lists TrigramIndex.candidates may intersect, the shortest ones, how much longer than
+# the candidates left a list can be, and the candidates sampled to tell whether an intersection
+# removes enough of them
+INTERSECTED_POSTINGS = 3
+INTERSECTED_RATIO = 4
+INTERSECTION_SAMPLE = 32
+
+
+class RangeIndex:
+    """
+    Sorted index of movie rows by a numeric key.
+
+    Keys are scaled to integers (scale=10 keeps one decimal) and packed with their row number
+    into a single sorted array of 64 bits integers, so a range of keys is found by bisecting
+    and read as one slice.
+    """
+
+    def __init__(self, scale: int = 1):
+        self.scale = scale
+        self._entries = array("q")
+
+    def _pack(self, key: float, row: int) -> int:
+        return round(key * self.scale) << ROW_BITS | row
+
+    def _bounds(self, min_key: Optional[float], max_key: Optional[float]) -> tuple[int, int]:
+        start, end = 0, len(self._entries)
+        if min_key is not None:
+            lower = math.ceil(min_key * self.scale - KEY_TOLERANCE)
+            start = bisect_left(self._entries, lower << ROW_BITS)
+        if max_key is not None:
+            upper = math.floor(max_key * self.scale + KEY_TOLERANCE) + 1
+            end = bisect_left(self._entries, upper << ROW_BITS)
+        return start, max(start, end)
+
+    def build(self, items: Iterable[tuple[float, int]]) -> None:
+        """ Replace the content of the index by the (key, row) pairs provided """
+        self._entries = array("q", sorted(self._pack(key, row) for key, row in items))
+
+    def insert(self, key: float, row: int) -> None:
+        """ Add a row to the index """
+        insort(self._entries, self._pack(key, row))
+
+    def remove(self, key: float, row: int) -> None:
+        """ Remove a row from the index, if it is there with this key """
+        entry = self._pack(key, row)
+        position = bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def count(self, min_key: Optional[float] = None, max_key: Optional[float] = None) -> int:
+        """ Return the number of rows having a key within the boundaries (inclusive) """
+        start, end = self._bounds(min_key, max_key)
+        return end - start
+
+    def rows(self, min_key: Optional[float] = None, max_key: Optional[float] = None) -> list[int]:
+        """ Return the rows having a key within the boundaries (inclusive), ordered by key """
+        start, end = self._bounds(min_key, max_key)
+        return [entry & ROW_MASK for entry in self._entries[start:end]]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def to_columns(self) -> tuple:
+        """ Return the content as its scale and its array of entries, see from_columns """
+        return self.scale, self._entries
+
+    @classmethod
+    def from_columns(cls, columns: tuple) -> "RangeIndex":
+        """
+        Return the RangeIndex whose to_columns() returned columns. The entries may be any
+        sequence of integers, such as a memoryview, the index can then only be searched.
+        """
+        scale, entries = columns
+        index = cls(scale)
+        index._entries = entries
+        return index
+
+
+class TrigramIndex:
+    """
+    Inverted index from every 3 characters long substring to the rows containing it.
+
+    A row can only contain a string if it contains all its trigrams, so intersecting the
+    posting lists of the rarest trigrams of the searched string narrows the candidates down,
+    which are then verified with a plain substring test. Posting lists are sorted arrays of
+    rows.
+    """
+
+    def __init__(self):
+        self._postings: dict[str, array] = {}
+
+    @staticmethod
+    def trigrams(text: str) -> set[str]:
+        """ Return every 3 characters long substring of the text """
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def build(self, items: Iterable[tuple[int, Iterable[str]]]) -> None:
+        """
+        Replace the content of the index by the (row, texts) pairs provided.
+        Rows must come in increasing order.
+        """
+        postings: dict[str, array] = {}
+        for row, texts in items:
+            for gram in set().union(*map(self.trigrams, texts)):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(row)
+        self._postings = postings
+
+    def add(self, row: int, texts: Iterable[str]) -> None:
+        """ Add a row to the posting list of every trigram of its texts """
+        for gram in set().union(*map(self.trigrams, texts)):
+            posting = self._postings.setdefault(gram, array("I"))
+            if not posting or posting[-1] < row:
+                posting.append(row)
+            else:
+                position = bisect_left(posting, row)
+                if position == len(posting) or posting[position] != row:
+                    posting.insert(position, row)
+
+    def remove(self, row: int, texts: Iterable[str]) -> None:
+        """ Remove a row from the posting list of every trigram of its texts """
+        for gram in set().union(*map(self.trigrams, texts)):
+            posting = self._postings.get(gram)
+            if posting is None:
+                continue
+            position = bisect_left(posting, row)
+            if position < len(posting) and posting[position] == row:
+                del posting[position]
+                if not posting:
+                    del self._postings[gram]
+
+    def candidates(self, text: str) -> Optional[array]:
+        """
+        Return the rows that may contain the text, or None if the text is too short to narrow
+        anything down and every row has to be checked.
+
+        The rarest trigram gives the candidates, which are then intersected with the next
+        shortest posting lists, at most INTERSECTED_POSTINGS in all. Intersecting costs about
+        as much as the substring tests it saves: a list is skipped when it is more than
+        INTERSECTED_RATIO times longer than the candidates left, or when a sample of them
+        shows it would remove less than half of them, as the trigrams of a word often come
+        together.
+        """
+        grams = self.trigrams(text)
+        if not grams:
+            return None
+        postings = sorted((self._postings.get(gram, array("I")) for gram in grams), key=len)
+        rows = postings[0]
+        for posting in postings[1:INTERSECTED_POSTINGS]:
+            if len(posting) > INTERSECTED_RATIO * len(rows):
+                break
+            sample = rows[::max(1, len(rows) // INTERSECTION_SAMPLE)]
+            if 2 * sum(map(contains_row, repeat(posting), sample)) > len(sample):
+                continue
+            rows = array("I", sorted(set(rows).intersection(posting)))
+        return rows
+
+    def to_columns(self) -> tuple:
+        """
+        Return the content as the sorted trigrams encoded in UTF-32, so each one is 12 bytes
+        long, the offset of the posting list of each trigram, and the posting lists end to
+        end. See from_columns.
+        """
+        grams = sorted(self._postings)
+        offsets = array("I", [0])
+        postings = array("I")
+        for gram in grams:
+            postings.extend(self._postings[gram])
+            offsets.append(len(postings))
+        return "".join(grams).encode("utf-32-le"), offsets, postings
+
+    @classmethod
+    def from_columns(cls, columns: tuple) -> "TrigramIndex":
+        """
+        Return the TrigramIndex whose to_columns() returned columns, which may be views such
+        as memoryviews. The index can then only be searched, see SortedPostings.
+        """
+        index = cls()
+        index._postings = SortedPostings(*columns)
+        return index
+
+
+class SortedPostings(Mapping):
+    """
+    Posting lists of a TrigramIndex as written by TrigramIndex.to_columns, from trigram to a
+    slice of the postings. Only the trigrams are decoded, a trigram being found by bisecting
+    them, the posting lists are read from the columns as they are.
+    """
+
+    def __init__(self, grams: bytes, offsets: Sequence[int], postings: Sequence[int]):
+        self._grams = str(grams, "utf-32-le")
+        self._offsets = offsets
+        self._postings = postings
+
+    def _gram(self, position: int) -> str:
+        return self._grams[3 * position:3 * position + 3]
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self._gram, range(len(self)))
+
+    def __getitem__(self, gram: str) -> Sequence[int]:
+        position = bisect_left(range(len(self)), gram, key=self._gram)
+        if position == len(self) or self._gram(position) != gram:
+            raise KeyError(gram)
+        return self._postings[self._offsets[position]:self._offsets[position + 1]]
+
+
+def contains_row(posting: array, row: int) -> bool:
+    """ Return True if the sorted posting list holds row """
+    position = bisect_left(posting, row)
+    return position < len(posting) and posting[position] == row
+
+
+def edit_distance(first: str, second: str, limit: int) -> int:
+    """
+    Return the Levenshtein distance between two strings, or limit + 1 as soon as it is known
+    to be over limit. Only the diagonal band of width 2 * limit + 1 is computed.
+    """
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    if len(first) > len(second):
+        first, second = second, first
+    over = limit + 1
+    previous = list(range(len(second) + 1))
+    for i, char in enumerate(first, 1):
+        start, end = max(1, i - limit), min(len(second), i + limit)
+        current = [over] * (len(second) + 1)
+        current[0] = i if i <= limit else over
+        best = current[0]
+        for j in range(start, end + 1):
+            cost = previous[j - 1] + (char != second[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > limit:
+            return over
+        previous = current
+    return min(previous[len(second)], over)
+
+
+class WordIndex:
+    """
+    Vocabulary of the words of the titles, with the rows containing each word, finding the
+    words within an edit distance of a misspelled one.
+
+    Words are padded with ^ and $ then cut into trigrams, each trigram listing the words which
+    hold it. An edit changes at most 3 trigrams, so a word within distance d of a word of n
+    distinct trigrams shares at least n - 3d of them: counting the shared trigrams over a few
+    posting lists leaves a handful of candidates, whose distance is then computed.
+    """
+
+    def __init__(self):
+        self._words: list[str] = []
+        self._word_ids: dict[str, int] = {}
+        self._rows: list[array] = []
+        self._grams: dict[str, array] = {}
+
+    @staticmethod
+    def trigrams(word: str) -> set[str]:
+        """ Return the trigrams of the word padded with ^ and $ """
+        padded = f"^{word}$"
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def build(self, items: Iterable[tuple[int, Iterable[str]]]) -> None:
+        """
+        Replace the content of the index by the (row, words) pairs provided.
+        Rows must come in increasing order.
+        """
+        words, word_ids, rows = [], {}, []
+        for row, row_words in items:
+            for word in set(row_words):
+                word_id = word_ids.get(word)
+                if word_id is None:
+                    word_id = word_ids[word] = len(words)
+                    words.append(word)
+                    rows.append(array("I"))
+                rows[word_id].append(row)
+        grams: dict[str, array] = {}
+        for word_id, word in enumerate(words):
+            for gram in self.trigrams(word):
+                posting = grams.get(gram)
+                if posting is None:
+                    posting = grams[gram] = array("I")
+                posting.append(word_id)
+        self._words, self._word_ids, self._rows, self._grams = words, word_ids, rows, grams
+
+    def rows(self, word_id: int) -> array:
+        """ Return the rows containing a word, in increasing order """
+        return self._rows[word_id]
+
+    def matches(self, word: str, max_distance: int) -> list[tuple[int, int]]:
+        """
+        Return the (word id, distance) of the words within max_distance of word. max_distance
+        must leave at least one trigram in common, (len(word) - 1) // 3 at most.
+        """
+        word_id = self._word_ids.get(word)
+        if max_distance == 0:
+            return [] if word_id is None else [(word_id, 0)]
+        grams = self.trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        needed = len(grams) - 3 * max_distance
+        words = self._words
+        result = []
+        for candidate, count in shared.items():
+            if count >= needed:
+                distance = edit_distance(word, words[candidate], max_distance)
+                if distance <= max_distance:
+                    result.append((candidate, distance))
+        return result
+
+
+class PrefixIndex:
+    """
+    Sorted array of texts, each with the row it comes from and a score, returning the rows
+    of the texts starting with a prefix, best score first.
+
+    The texts starting with a prefix form a contiguous range of the array, found by bisecting.
+    A segment tree holds for each node the position of the best scored text below it, so the
+    best text of any range is found in log n steps. The best k texts of a range come out of a
+    heap of sub-ranges, each one being split around its best text once that text is taken:
+    the cost depends on k, not on the number of texts starting with the prefix.
+    """
+
+    def __init__(self):
+        self._texts: list[str] = []
+        self._rows = array("I")
+        self._scores = array("q")
+        self._tree = array("I")
+
+    def build(self, items: Iterable[tuple[int, Iterable[str], int]]) -> None:
+        """ Replace the content of the index by the (row, texts, score) triples provided """
+        entries = [(text, row, score) for row, texts, score in items for text in set(texts)]
+        entries.sort()
+        self._texts = [text for text, _, _ in entries]
+        self._rows = array("I", [row for _, row, _ in entries])
+        self._scores = scores = array("q", [score for _, _, score in entries])
+
+        # Leaves are at count + position, the parent of node i is i // 2
+        count = len(entries)
+        tree = self._tree = array("I", bytes(4 * count)) + array("I", range(count))
+        for node in range(count - 1, 0, -1):
+            left, right = tree[2 * node], tree[2 * node + 1]
+            tree[node] = (left if (scores[left], -left) > (scores[right], -right) else right)
+
+    def _best(self, start: int, end: int) -> int:
+        """ Return the position of the best scored text between start and end (excluded) """
+        tree, scores = self._tree, self._scores
+        best = None
+        start += len(self._texts)
+        end += len(self._texts)
+        while start < end:
+            if start & 1:
+                candidate = tree[start]
+                if best is None or (scores[candidate], -candidate) > (scores[best], -best):
+                    best = candidate
+                start += 1
+            if end & 1:
+                end -= 1
+                candidate = tree[end]
+                if best is None or (scores[candidate], -candidate) > (scores[best], -best):
+                    best = candidate
+            start >>= 1
+            end >>= 1
+        return best
+
+    def top(self, prefix: str, count: int) -> list[int]:
+        """
+        Return the rows of the count best scored texts starting with prefix, best first and
+        each row once, ties being ordered by text.
+        """
+        texts = self._texts
+        start = bisect_left(texts, prefix)
+        end = bisect_left(texts, prefix + "\U0010ffff", start)
+        heap = []
+        if start < end:
+            best = self._best(start, end)
+            heap.append((-self._scores[best], best, start, end))
+        rows: list[int] = []
+        seen: set[int] = set()
+        while heap and len(rows) < count:
+            _, position, start, end = heappop(heap)
+            row = self._rows[position]
+            if row not in seen:
+                seen.add(row)
+                rows.append(row)
+            for sub_start, sub_end in ((start, position), (position + 1, end)):
+                if sub_start < sub_end:
+                    best = self._best(sub_start, sub_end)
+                    heappush(heap, (-self._scores[best], best, sub_start, sub_end))
+        return rows
+
+
+class BitmapIndex:
+    """
+    Set of rows of each key as a bitmap: a Python integer whose bit n is set when row n has the
+    key, and one more bitmap holding every row.
+
+    Bitmaps are combined with &, | and ~ in C, a machine word at a time, whatever the number
+    of rows they hold. They only turn back into row lists at the end, see rows().
+    """
+
+    def __init__(self):
+        self._bitmaps: dict[str, int] = {}
+        self._all = 0
+
+    def build(self, items: Iterable[tuple[int, Iterable[str]]]) -> None:
+        """ Replace the content of the index by the (row, keys) pairs provided """
+        bits: dict[str, bytearray] = {}
+        every_row = bytearray()
+        for row, keys in items:
+            byte, bit = row >> 3, 1 << (row & 7)
+            if byte >= len(every_row):
+                every_row.extend(bytes(byte + 1 - len(every_row)))
+            every_row[byte] |= bit
+            for key in keys:
+                key_bits = bits.get(key)
+                if key_bits is None:
+                    key_bits = bits[key] = bytearray(len(every_row))
+                elif byte >= len(key_bits):
+                    key_bits.extend(bytes(byte + 1 - len(key_bits)))
+                key_bits[byte] |= bit
+        self._bitmaps = {key: int.from_bytes(key_bits, "little") for key, key_bits in bits.items()}
+        self._all = int.from_bytes(every_row, "little")
+
+    def add(self, row: int, keys: Iterable[str]) -> None:
+        """ Add a row, having these keys """
+        bit = 1 << row
+        self._all |= bit
+        for key in keys:
+            self._bitmaps[key] = self._bitmaps.get(key, 0) | bit
+
+    def remove(self, row: int, keys: Iterable[str]) -> None:
+        """ Remove a row, which had these keys """
+        bit = 1 << row
+        self._all &= ~bit
+        for key in keys:
+            if key in self._bitmaps:
+                self._bitmaps[key] &= ~bit
+
+    def get(self, key: str) -> int:
+        """ Return the bitmap of the rows having the key """
+        return self._bitmaps.get(key, 0)
+
+    def all(self) -> int:
+        """ Return the bitmap of every row """
+        return self._all
+
+    def keys(self) -> list[str]:
+        """ Return the keys held by at least one row, in alphabetical order """
+        return sorted(key for key, bitmap in self._bitmaps.items() if bitmap)
+
+    def to_columns(self) -> tuple:
+        """
+        Return the content as its keys in alphabetical order, the length in bytes of a bitmap,
+        and the bitmap of every key then the one of every row end to end, little endian.
+        See from_columns.
+        """
+        keys = sorted(self._bitmaps)
+        bitmaps = [self._bitmaps[key] for key in keys] + [self._all]
+        size = (max(map(int.bit_length, bitmaps)) + 7) // 8
+        return keys, size, b"".join(bitmap.to_bytes(size, "little") for bitmap in bitmaps)
+
+    @classmethod
+    def from_columns(cls, columns: tuple) -> "BitmapIndex":
+        """
+        Return the BitmapIndex whose to_columns() returned columns. The bitmaps are read into
+        Python integers, a copy of rows / 8 bytes per key.
+        """
+        keys, size, bitmaps = columns
+        index = cls()
+        index._bitmaps = {key: int.from_bytes(bitmaps[position * size:(position + 1) * size],
+                                              "little")
+                          for position, key in enumerate(keys)}
+        index._all = int.from_bytes(bitmaps[len(keys) * size:], "little")
+        return index
+
+    @staticmethod
+    def rows(bitmap: int) -> list[int]:
+        """ Return the rows of a bitmap, in increasing order """
+        # The digits are scanned by str.find, Python only steps from one set bit to the next
+        bits = format(bitmap, "b")[::-1]
+        rows = []
+        row = bits.find("1")
+        while row != -1:
+            rows.append(row)
+            row = bits.find("1", row + 1)
+        return rows
+
+    @staticmethod
+    def from_rows(rows: Iterable[int]) -> int:
+        """ Return the bitmap of the rows """
+        bits = bytearray()
+        for row in rows:
+            byte = row >> 3
+            if byte >= len(bits):
+                bits.extend(bytes(byte + 1 - len(bits)))
+            bits[byte] |= 1 << (row & 7)
+        return int.from_bytes(bits, "little")
+
+    @staticmethod
+    def filter(bitmap: int, rows: Iterable[int]) -> list[int]:
+        """ Return the rows which are in the bitmap, in the same order """
+        bits = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+        size = len(bits)
+        return [row for row in rows if row >> 3 < size and bits[row >> 3] >> (row & 7) & 1]
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Contain the Movie and Rating definitions, and the Credit and Person of cast and crew """
+from functools import partial
+from typing import NamedTuple, Optional
+
+
+class Rating(NamedTuple):
+    """ Contain movie rating """
+    uid: str
+    averageRating: float
+    numVotes: int
+
+
+class Movie(NamedTuple):
+    """ Contain the basic information of the movie """
+    uid: str
+    primaryTitle: str
+    originalTitle: str
+    isAdult: bool
+    startYear: str
+    genres: list[str]
+    rating: Optional[Rating] = None
+
+    def to_dict(self) -> dict:
+        """ Return the movie as a flat dictionary of builtins, ready to be dumped to json """
+        return {
+            "uid": self.uid,
+            "primaryTitle": self.primaryTitle,
+            "originalTitle": self.originalTitle,
+            "isAdult": self.isAdult,
+            "startYear": int(self.startYear) if self.startYear else None,
+            "genres": list(self.genres) if self.genres else [],
+            "averageRating": self.rating.averageRating if self.rating else None,
+            "numVotes": self.rating.numVotes if self.rating else None
+        }
+
+    def __str__(self):
+        title = f"Title: {self.primaryTitle}, ({self.startYear if self.startYear else 'UNKNOWN'})"
+        if self.primaryTitle != self.originalTitle:
+            title += f"\nOriginal title: {self.originalTitle}"
+        genre = f"Genre: {'•'.join(self.genres)}" if self.genres else "UNKNOWN"
+        adult = " *** Adult Movie ***" if self.isAdult else ""
+        rating = ""
+        if self.rating:
+            rating = f"Rating: {self.rating.averageRating} out of {self.rating.numVotes} votes"
+
+        pad = 60 * "-"
+        strings = [pad, title, genre]
+        for extra_info in [adult, rating]:
+            if extra_info:
+                strings.append(extra_info)
+
+        return "\n".join(strings + [""])
+
+
+class Credit(NamedTuple):
+    """ Contain the job of a person in a movie, as listed by title.principals """
+    uid: str
+    ordering: int
+    nconst: str
+    category: str
+
+
+class Person(NamedTuple):
+    """ Contain a person of the cast or crew, as listed by name.basics """
+    nconst: str
+    primaryName: str
+
+
+# Build a Rating or a Movie from a tuple of its fields straight from C, skipping their __new__
+NEW_RATING = partial(tuple.__new__, Rating)
+NEW_MOVIE = partial(tuple.__new__, Movie)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Contain the instrumentation timing the stages of searches and imports """
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+from typing import NamedTuple, Optional, TextIO
+
+
+class Stage(NamedTuple):
+    """ Time spent in a stage of a trace, and the number of rows it produced if known """
+    name: str
+    seconds: float
+    rows: Optional[int] = None
+
+
+class Trace:
+    """ The stages of one search or import, in the order they ended """
+
+    def __init__(self, name: str, fields: dict):
+        self.name = name
+        self.fields = fields
+        self.stages: list[Stage] = []
+        self.started = time.time()
+        self.seconds = 0.0
+        self.rows: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        """ Return the trace as a dict of json types """
+        return {"trace": self.name, **self.fields, "started": self.started,
+                "seconds": self.seconds, "rows": self.rows,
+                "stages": [stage._asdict() for stage in self.stages]}
+
+    def summary(self) -> str:
+        """ Return the trace as a table of its stages, one per line """
+        lines = [f"{self.name}: {self.seconds * 1000:.2f} ms"
+                 + ("" if self.rows is None else f", {self.rows} rows")]
+        for stage in self.stages:
+            lines.append(f"  {stage.name:<24}{stage.seconds * 1000:10.2f} ms"
+                         + ("" if stage.rows is None else f"{stage.rows:>10} rows"))
+        return "\n".join(lines)
+
+
+class _Timer:
+    """ Context manager measuring a stage or a trace, rows may be set before it exits """
+    __slots__ = ("profiler", "name", "fields", "rows", "trace", "start")
+
+    def __init__(self, profiler: "Profiler", name: str, fields: Optional[dict] = None):
+        self.profiler = profiler
+        self.name = name
+        self.fields = fields
+        self.rows = None
+        self.trace = None
+
+    def __enter__(self) -> "_Timer":
+        if self.fields is not None:
+            self.trace = Trace(self.name, self.fields)
+            self.profiler._traces().append(self.trace)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        seconds = time.perf_counter() - self.start
+        if self.trace is None:
+            traces = self.profiler._traces()
+            if traces:
+                traces[-1].stages.append(Stage(self.name, seconds, self.rows))
+            return
+        self.profiler._traces().pop()
+        self.trace.seconds = seconds
+        self.trace.rows = self.rows
+        self.profiler._publish(self.trace)
+
+
+class _NullTimer:
+    """ Context manager doing nothing, returned while the profiler is disabled """
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    @property
+    def rows(self) -> None:
+        return None
+
+    @rows.setter
+    def rows(self, value: int) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Profiler:
+    """
+    Record the time and the rows of each stage of the searches and imports.
+
+    A trace covers one search or import, its stages are the timed blocks run on the same
+    thread until it ends, and it is handed to every listener when it does. While disabled,
+    trace() and stage() return a shared context manager which does nothing.
+
+        with PROFILER.trace("search", title=title) as trace:
+            with PROFILER.stage("title") as stage:
+                rows = ...
+                stage.rows = len(rows)
+            trace.rows = len(rows)
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.listeners: list[Callable[[Trace], None]] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def enable(self, listener: Optional[Callable[[Trace], None]] = None) -> None:
+        """ Start recording, handing each trace to listener if provided """
+        if listener is not None:
+            self.listeners.append(listener)
+        self.enabled = True
+
+    def disable(self) -> None:
+        """ Stop recording and forget the listeners """
+        self.enabled = False
+        self.listeners.clear()
+
+    def trace(self, name: str, **fields) -> _Timer | _NullTimer:
+        """ Return a context manager recording a trace, fields being exported with it """
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name, fields)
+
+    def stage(self, name: str) -> _Timer | _NullTimer:
+        """ Return a context manager recording a stage of the current trace, if any """
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name)
+
+    def _traces(self) -> list[Trace]:
+        try:
+            return self._local.traces
+        except AttributeError:
+            self._local.traces = []
+            return self._local.traces
+
+    def _publish(self, trace: Trace) -> None:
+        with self._lock:
+            for listener in self.listeners:
+                listener(trace)
+
+
+PROFILER = Profiler()
+
+
+def timed_stage(name: str) -> Callable[[Callable], Callable]:
+    """ Decorate a function so that each call is recorded as a stage of PROFILER """
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            with PROFILER.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary_printer(output: TextIO = sys.stderr) -> Callable[[Trace], None]:
+    """ Return a listener printing the summary of each trace """
+    def print_summary(trace: Trace) -> None:
+        print(trace.summary(), file=output, flush=True)
+    return print_summary
+
+
+def json_lines_writer(output: TextIO) -> Callable[[Trace], None]:
+    """ Return a listener writing each trace to output as a line of json """
+    def write_trace(trace: Trace) -> None:
+        output.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")
+        output.flush()
+    return write_trace
+
+
+@contextmanager
+def cprofiled(path: Optional[str] = None, limit: int = 30) -> Iterator[cProfile.Profile]:
+    """
+    Run the block under cProfile, then dump the statistics to path, or print the limit most
+    expensive functions by cumulative time to stderr without path.
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        if path:
+            profile.dump_stats(path)
+        else:
+            pstats.Stats(profile, stream=sys.stderr).sort_stats("cumulative").print_stats(limit)
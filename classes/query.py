@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Contain the Query class, which combines search criteria over a Repository """
+from array import array
+from collections.abc import Hashable, Iterable
+from functools import reduce
+from operator import and_
+from typing import NamedTuple, Optional
+
+from .movie import Movie
+from .profiling import PROFILER
+from .repository import Repository, SortKey, fold_title
+from .results import MovieRows, PagedResult
+
+# Checking a row against a criteria costs about this many rows read from an index
+PROBE_COST = 4
+
+# Sort keys used for each sort order offered to the user
+SORT_ORDERS: dict[str, list[tuple[str, bool]]] = {
+    "title": [("primaryTitle", False), ("startYear", False)],
+    "year": [("startYear", False), ("primaryTitle", False)],
+    "rating": [("averageRating", True), ("numVotes", True), ("primaryTitle", False)],
+    "weighted": [("weightedRating", True), ("numVotes", True), ("primaryTitle", False)],
+    "votes": [("numVotes", True), ("primaryTitle", False)]
+}
+
+
+def parse_bounds(text: str, number_type: type = int) -> tuple:
+    """
+    Parse boundaries written as "min:max", "min:", ":max" or a single "value".
+
+    :return: min, max; a missing boundary is None
+    :raise ValueError: if a boundary is not a number_type
+    """
+    if ":" not in text:
+        value = number_type(text)
+        return value, value
+    lower, upper = text.split(":", 1)
+    return (number_type(lower) if lower.strip() else None,
+            number_type(upper) if upper.strip() else None)
+
+
+class TitleCriteria(NamedTuple):
+    """ Movies whose primary or original title contains a string """
+    title: str
+    normalized: bool = True
+
+    def estimate(self, repository: Repository) -> int:
+        """ Upper bound of the number of matching movies """
+        return repository.estimate_title(self.title, self.normalized)
+
+    def key(self) -> "TitleCriteria":
+        """ Equivalent criteria, the same for every spelling matching the same movies """
+        return self._replace(title=fold_title(self.title)) if self.normalized else self
+
+    def rows(self, repository: Repository, rows: Optional[Iterable[int]] = None) -> list[int]:
+        """ Matching rows, among rows if provided """
+        return repository.title_rows(self.title, self.normalized, rows)
+
+
+class PersonCriteria(NamedTuple):
+    """ Movies crediting a person whose name contains a string, in some categories if given """
+    name: str
+    categories: Optional[tuple[str, ...]] = None
+
+    def estimate(self, repository: Repository) -> int:
+        """ Upper bound of the number of matching movies """
+        return repository.estimate_person(self.name)
+
+    def key(self) -> "PersonCriteria":
+        """ Equivalent criteria, the same for every spelling and order of the categories """
+        return self._replace(name=fold_title(self.name),
+                             categories=self.categories and tuple(sorted(set(self.categories))))
+
+    def rows(self, repository: Repository, rows: Optional[Iterable[int]] = None) -> list[int]:
+        """ Matching rows, among rows if provided """
+        return repository.person_rows(self.name, self.categories, rows)
+
+
+class YearCriteria(NamedTuple):
+    """ Movies with a startYear within boundaries (inclusive) """
+    min_year: Optional[int] = None
+    max_year: Optional[int] = None
+
+    def estimate(self, repository: Repository) -> int:
+        """ Number of matching movies """
+        return repository.count_year(self.min_year, self.max_year)
+
+    def rows(self, repository: Repository, rows: Optional[Iterable[int]] = None) -> list[int]:
+        """ Matching rows, among rows if provided """
+        return repository.year_rows(self.min_year, self.max_year, rows)
+
+
+class RatingCriteria(NamedTuple):
+    """ Movies with an averageRating within boundaries (inclusive) """
+    min_val: Optional[float] = None
+    max_val: Optional[float] = None
+
+    def estimate(self, repository: Repository) -> int:
+        """ Number of matching movies """
+        return repository.count_rating(self.min_val, self.max_val)
+
+    def rows(self, repository: Repository, rows: Optional[Iterable[int]] = None) -> list[int]:
+        """ Matching rows, among rows if provided """
+        return repository.rating_rows(self.min_val, self.max_val, rows)
+
+
+class VotesCriteria(NamedTuple):
+    """ Movies with a numVotes within boundaries (inclusive) """
+    min_votes: Optional[int] = None
+    max_votes: Optional[int] = None
+
+    def estimate(self, repository: Repository) -> int:
+        """ Number of matching movies """
+        return repository.count_votes(self.min_votes, self.max_votes)
+
+    def rows(self, repository: Repository, rows: Optional[Iterable[int]] = None) -> list[int]:
+        """ Matching rows, among rows if provided """
+        return repository.votes_rows(self.min_votes, self.max_votes, rows)
+
+
+class WeightedRatingCriteria(NamedTuple):
+    """ Movies with a weighted rating within boundaries (inclusive) """
+    min_val: Optional[float] = None
+    max_val: Optional[float] = None
+
+    def estimate(self, repository: Repository) -> int:
+        """ Number of matching movies """
+        return repository.count_weighted_rating(self.min_val, self.max_val)
+
+    def rows(self, repository: Repository, rows: Optional[Iterable[int]] = None) -> list[int]:
+        """ Matching rows, among rows if provided """
+        return repository.weighted_rating_rows(self.min_val, self.max_val, rows)
+
+
+class GenreCriteria(NamedTuple):
+    """ Movies having any, all or none of the genres """
+    genres: tuple[str, ...]
+    mode: str = "any"
+
+    def bitmap(self, repository: Repository) -> int:
+        """ Bitmap of the matching rows """
+        return repository.genre_bitmap(self.genres, self.mode)
+
+    def key(self) -> "GenreCriteria":
+        """ Equivalent criteria, the same whatever the order of the genres """
+        return self._replace(genres=tuple(sorted(set(self.genres))))
+
+
+class AdultCriteria(NamedTuple):
+    """ Adult movies only, or every movie but them """
+    adult: bool
+
+    def bitmap(self, repository: Repository) -> int:
+        """ Bitmap of the matching rows """
+        return repository.adult_bitmap(self.adult)
+
+
+class BitmapCriteria(NamedTuple):
+    """ Movies of a bitmap, the intersection of the GenreCriteria and AdultCriteria of a Query """
+    bitmap: int
+
+    def estimate(self, repository: Repository) -> int:
+        """ Number of matching movies """
+        return self.bitmap.bit_count()
+
+    def rows(self, repository: Repository, rows: Optional[Iterable[int]] = None) -> list[int]:
+        """ Matching rows, among rows if provided """
+        return repository.bitmap_rows(self.bitmap, rows)
+
+
+Criteria = (TitleCriteria | PersonCriteria | YearCriteria | RatingCriteria | VotesCriteria
+            | WeightedRatingCriteria | GenreCriteria | AdultCriteria | BitmapCriteria)
+# Criteria answered by a bitmap, intersected together before anything else
+BITMAP_CRITERIA = (GenreCriteria, AdultCriteria)
+
+
+def stage_name(criteria: Criteria) -> str:
+    """ Name under which the evaluation of a criteria is profiled, "year" for YearCriteria """
+    return type(criteria).__name__.removesuffix("Criteria").lower()
+
+
+class Query:
+    """
+    Collect search criteria, then find the movies matching all of them.
+
+    The criteria are not applied in the order they were given: the one expected to match the
+    fewest movies, according to the index statistics, is read from its index first. Each
+    following criteria is then either read from its index and intersected with the current
+    rows, or checked row by row, whichever is cheaper. Only row numbers are carried around
+    until the final movies are requested.
+
+    Genre and adult criteria are bitmaps, they are first intersected together with a bitwise
+    and, then planned as a single criteria.
+
+    Results are cached by the Repository under the set of criteria, so the same search asked
+    again, whatever the order of its criteria, is not evaluated again until the data changes.
+    """
+
+    def __init__(self, repository: Repository):
+        self.repository = repository
+        self.criteria: list[Criteria] = []
+
+    def title(self, title: str, normalized: bool = True) -> "Query":
+        """ Add a title criteria, accent and case insensitive unless normalized is False """
+        self.criteria.append(TitleCriteria(title, normalized))
+        return self
+
+    def person(self, name: str, categories: Optional[Iterable[str]] = None) -> "Query":
+        """
+        Add a cast and crew criteria, accent and case insensitive, the person having one of the
+        categories ("actor", "director"...) if provided
+        """
+        self.criteria.append(PersonCriteria(name, None if categories is None
+                                            else tuple(categories)))
+        return self
+
+    def year(self, min_year: Optional[int] = None, max_year: Optional[int] = None) -> "Query":
+        """ Add a startYear criteria, a missing boundary is not checked """
+        self.criteria.append(YearCriteria(min_year, max_year))
+        return self
+
+    def rating(self, min_val: Optional[float] = None, max_val: Optional[float] = None) -> "Query":
+        """ Add an averageRating criteria, a missing boundary is not checked """
+        self.criteria.append(RatingCriteria(min_val, max_val))
+        return self
+
+    def votes(self, min_votes: Optional[int] = None, max_votes: Optional[int] = None) -> "Query":
+        """ Add a numVotes criteria, a missing boundary is not checked """
+        self.criteria.append(VotesCriteria(min_votes, max_votes))
+        return self
+
+    def weighted_rating(self,
+                        min_val: Optional[float] = None,
+                        max_val: Optional[float] = None) -> "Query":
+        """ Add a weighted rating criteria, see Repository._build_weighted_ratings """
+        self.criteria.append(WeightedRatingCriteria(min_val, max_val))
+        return self
+
+    def genre(self, genres: Iterable[str], mode: str = "any") -> "Query":
+        """ Add a genre criteria, mode being "any", "all" or "none" of the genres """
+        self.criteria.append(GenreCriteria(tuple(genres), mode))
+        return self
+
+    def adult(self, adult: bool) -> "Query":
+        """ Keep only the adult movies, or exclude them if adult is False """
+        self.criteria.append(AdultCriteria(adult))
+        return self
+
+    def _planned_criteria(self) -> list[Criteria]:
+        """ Return the criteria, the bitmap ones being intersected into a BitmapCriteria """
+        criteria = [item for item in self.criteria if not isinstance(item, BITMAP_CRITERIA)]
+        bitmaps = [item.bitmap(self.repository) for item in self.criteria
+                   if isinstance(item, BITMAP_CRITERIA)]
+        if bitmaps:
+            criteria.append(BitmapCriteria(reduce(and_, bitmaps)))
+        return criteria
+
+    def plan(self) -> list[tuple[Criteria, int]]:
+        """ Return the criteria with their estimated number of matches, in evaluation order """
+        estimates = [(criteria, criteria.estimate(self.repository))
+                     for criteria in self._planned_criteria()]
+        return sorted(estimates, key=lambda item: item[1])
+
+    def cache_key(self) -> Hashable:
+        """ Return a key which is the same for every Query matching the same movies """
+        return frozenset(criteria.key() if hasattr(criteria, "key") else criteria
+                         for criteria in self.criteria)
+
+    def _evaluate(self) -> array:
+        with PROFILER.stage("plan"):
+            plan = self.plan()
+        if not plan:
+            return array("I", sorted(self.repository.movies.rows()))
+
+        rows = None
+        for criteria, estimate in plan:
+            if rows is not None and not rows:
+                break
+            with PROFILER.stage(stage_name(criteria)) as stage:
+                if rows is None:
+                    rows = criteria.rows(self.repository)
+                elif estimate < len(rows) * PROBE_COST:
+                    rows = set(rows).intersection(criteria.rows(self.repository))
+                else:
+                    rows = criteria.rows(self.repository, rows)
+                stage.rows = len(rows)
+
+        return array("I", sorted(rows))
+
+    def _row_array(self) -> array:
+        return self.repository.cached_result(("rows", self.cache_key()), self._evaluate)
+
+    def rows(self) -> list[int]:
+        """ Return the rows matching every criteria, in increasing order """
+        return self._row_array().tolist()
+
+    def movies(self) -> list[Movie]:
+        """ Return the movies matching every criteria """
+        return list(map(self.repository.movies.movie_at, self._row_array()))
+
+    def paginate(self,
+                 keys: Iterable[SortKey] = ("primaryTitle",),
+                 page_size: int = 10) -> PagedResult:
+        """
+        Return the movies matching every criteria as a PagedResult, see Repository.paginate.
+        The result is cached with the part of it already ordered, Movies are built as read.
+        """
+        keys = tuple((key, False) if isinstance(key, str) else tuple(key) for key in keys)
+        with PROFILER.stage("paginate") as stage:
+            result = self.repository.cached_result(
+                ("paginate", self.cache_key(), keys, page_size),
+                lambda: self.repository.paginate(
+                    MovieRows(self.repository.movies, self._row_array()), keys, page_size))
+            stage.rows = len(result)
+        return result
@@ -1,201 +1,1410 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-""" Contain the Repository class and Movie definition """
+""" Contain the Repository class """
 import csv
+import gc
+import heapq
 import logging
+import math
+import os
+import pickle
+import re
+import sys
+import threading
 import unicodedata
-from random import randrange
+from array import array
+from collections import OrderedDict
+from collections.abc import Callable, Collection, Hashable, Iterable, Iterator, Sequence
+from contextlib import contextmanager
+from functools import reduce
+from operator import and_, itemgetter, or_
 from pathlib import Path
-from typing import NamedTuple, Optional
+from typing import Any, NamedTuple, Optional
+
+from .credits import Credits, movie_uid, uid_number
+from .indexes import BitmapIndex, PrefixIndex, RangeIndex, TrigramIndex, WordIndex
+from .movie import NEW_MOVIE, NEW_RATING, Movie, Person, Rating
+from .profiling import PROFILER, timed_stage
+from .results import Descending, MovieRows, PagedResult
+from .storage import ColumnStore, DictStore, MappedStore
 
 logging.basicConfig(level=logging.DEBUG)
 
-class Rating(NamedTuple):
-    """ Contain movie rating """
-    uid: str
-    averageRating: float
-    numVotes: int
+DATA_PATH = Path(__file__).parent.parent.joinpath('data')
+SNAPSHOT_PATH = DATA_PATH.joinpath("repository.bin")
+MAPPED_PATH = DATA_PATH.joinpath("repository.map")
+CREDITS_PATH = DATA_PATH.joinpath("principals.csv")
+PEOPLE_PATH = DATA_PATH.joinpath("name_basic.csv")
+# Bump whenever the layout of the snapshot columns changes
+SNAPSHOT_VERSION = 4
+
+
+# Share of the movies changed by an update past which the indexes are rebuilt from scratch
+REBUILD_RATIO = 0.05
+
+# Columns read from title_basic.csv and rating.csv, in Movie and Rating field order
+MOVIE_COLUMNS = ("tconst", "primaryTitle", "originalTitle", "isAdult", "startYear", "genres")
+RATING_COLUMNS = ("tconst", "averageRating", "numVotes")
+# Columns read from principals.csv and name_basic.csv, in Credit and Person field order
+CREDIT_COLUMNS = ("tconst", "ordering", "nconst", "category")
+PERSON_COLUMNS = ("nconst", "primaryName")
+# Unknown value in the IMDB dumps
+NULL = r"\N"
+
+# Number of search results kept by the Repository, see Repository.cached_result
+QUERY_CACHE_SIZE = 128
+# Total number of rows of the search results kept, about 3 results of every movie of the IMDB
+QUERY_CACHE_ROWS = 2_000_000
+
+# Votes a movie needs for its own averageRating to weigh as much as the mean rating of the
+# catalogue, in its weighted rating
+WEIGHTED_MIN_VOTES = 1000
+# Weighted ratings are not rounded, their index keeps 4 decimals
+WEIGHTED_SCALE = 10000
+
+# Label of the adult movies in the label index, next to the genres
+ADULT_LABEL = "isAdult"
+# How the genres given to search_genre combine
+GENRE_MODES = ("any", "all", "none")
+
+# Most edits allowed in each word of a fuzzy title search, see Repository.fuzzy_search
+FUZZY_MAX_DISTANCE = 2
+# Words of a folded title, as indexed for the fuzzy title search
+WORD_PATTERN = re.compile(r"\w+")
 
+# Attributes of the Repository computed on first use, by one thread at a time
+LAZY_ATTRIBUTES = ("_year_index", "_rating_index", "_votes_index", "_weighted_ratings",
+                   "_weighted_index", "_title_index", "_folded_title_index", "_label_index",
+                   "_prefix_index", "_word_index", "_person_index", "_credit_rows")
+# Indexes written into the mapped catalogue by name, with the attribute holding each one and
+# the function reading it back from its columns, see Repository.save_mapped
+MAPPED_INDEXES = {
+    "year": ("_year_index", RangeIndex.from_columns),
+    "rating": ("_rating_index", RangeIndex.from_columns),
+    "votes": ("_votes_index", RangeIndex.from_columns),
+    "weighted_ratings": ("_weighted_ratings", itemgetter(0)),
+    "weighted": ("_weighted_index", RangeIndex.from_columns),
+    "title": ("_title_index", TrigramIndex.from_columns),
+    "folded_title": ("_folded_title_index", TrigramIndex.from_columns),
+    "label": ("_label_index", BitmapIndex.from_columns),
+}
 
-class Movie(NamedTuple):
-    """ Contain the basic information of the movie """
-    uid: str
-    primaryTitle: str
-    originalTitle: str
-    isAdult: bool
-    startYear: str
-    genres: list[str]
-    rating: Optional[Rating] = None
+# Attribute to sort by, or (attribute, reverse)
+SortKey = str | tuple[str, bool]
+
+
+class ImportReport(NamedTuple):
+    """ Count of what an incremental update did """
+    inserted: int = 0
+    changed: int = 0
+    removed: int = 0
+    unchanged: int = 0
 
     def __str__(self):
-        title = f"Title: {self.primaryTitle}, ({self.startYear if self.startYear else 'UNKNOWN'})"
-        if self.primaryTitle != self.originalTitle:
-            title += f"\nOriginal title: {self.originalTitle}"
-        genre = f"Genre: {'•'.join(self.genres)}" if self.genres else "UNKNOWN"
-        adult = " *** Adult Movie ***" if self.isAdult else ""
-        rating = ""
-        if self.rating:
-            rating = f"Rating: {self.rating.averageRating} out of {self.rating.numVotes} votes"
+        return (f"{self.inserted} inserted, {self.changed} changed, {self.removed} removed, "
+                f"{self.unchanged} unchanged")
+
+
+class FuzzyMatch(NamedTuple):
+    """ Movie found by a fuzzy title search, with the number of edits its title needed """
+    movie: Movie
+    distance: int
 
-        pad = 60 * "-"
-        strings = [pad, title, genre]
-        for extra_info in [adult, rating]:
-            if extra_info:
-                strings.append(extra_info)
 
-        return "\n".join(strings + [""])
+class CacheInfo(NamedTuple):
+    """ Statistics of the search result cache """
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+    rows: int
+    max_rows: int
+
+
+def normalize_string(string: str) -> str:
+    """ Remove the accents and other combining marks of a string """
+    # https://stackoverflow.com/a/517974
+    nfkd_form = unicodedata.normalize('NFKD', string)
+    return "".join([c for c in nfkd_form if not unicodedata.combining(c)])
+
+
+@contextmanager
+def paused_gc() -> Iterator[None]:
+    """
+    Suspend the cyclic garbage collector, for bulk loads which can't form reference cycles:
+    it would otherwise scan every tuple created, over and over.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def movie_labels(genres: list[str] | str, is_adult: bool) -> list[str]:
+    """ Return the keys of a movie in the label index: its genres, and ADULT_LABEL if adult """
+    labels = list(genres) if genres else []
+    if is_adult:
+        labels.append(ADULT_LABEL)
+    return labels
+
+
+def fold_title(title: str) -> str:
+    """ Return the accent and case insensitive form of a title, used to match and sort """
+    if title.isascii():
+        # Nothing to decompose, and lower() is casefold() for ascii
+        return title.lower()
+    return normalize_string(title).casefold()
 
 
 class Repository:
     """
     Repository that will contain the list of all movies and the method to manipulate them
+
+    Movies are kept in a DictStore unless an other storage engine is provided, like a
+    ColumnStore which is far more compact for the full IMDB movie set, or the read-only
+    MappedStore opened by load_mapped(). All give each movie a row number, which the secondary
+    indexes refer to.
+
+    Indexes are built on first use, or explicitly with build_indexes(). Once built, add_movie
+    and add_rating keep them up to date.
+
+    Search results are kept in a least recently used cache, which is emptied whenever a movie
+    or a rating actually changes.
+
+    The cast and crew of the movies are kept apart in credits, see Credits, and are searched by
+    name through an index of their own.
     """
 
-    def __init__(self):
-        self.movies: dict[str, Movie] = {}
+    def __init__(self,
+                 store: Optional[DictStore | ColumnStore] = None,
+                 cache_size: int = QUERY_CACHE_SIZE,
+                 cache_rows: int = QUERY_CACHE_ROWS):
+        self.movies: DictStore | ColumnStore = DictStore() if store is None else store
+        self._year_index: Optional[RangeIndex] = None
+        self._rating_index: Optional[RangeIndex] = None
+        self._votes_index: Optional[RangeIndex] = None
+        self._weighted_index: Optional[RangeIndex] = None
+        self._title_index: Optional[TrigramIndex] = None
+        self._folded_title_index: Optional[TrigramIndex] = None
+        self._label_index: Optional[BitmapIndex] = None
+        self._prefix_index: Optional[PrefixIndex] = None
+        self._word_index: Optional[WordIndex] = None
+        self.credits = Credits()
+        # Index of the folded names of the people, by position in credits
+        self._person_index: Optional[TrigramIndex] = None
+        self._folded_names: list[str] = []
+        # Row of each movie of credits, by position, -1 for the movies not stored
+        self._credit_rows: Optional[array] = None
+        # fold_title() of primaryTitle and originalTitle, by row
+        self._folded_primary: list[Optional[str]] = []
+        self._folded_original: list[Optional[str]] = []
+        self._folded_lock = threading.RLock()
+        # Weighted rating by row, 0 for the movies without rating
+        self._weighted_ratings: Optional[array] = None
+        self._results: OrderedDict[Hashable, Any] = OrderedDict()
+        self._results_lock = threading.Lock()
+        # Rows of the results cached
+        self._cached_rows = 0
+        # One lock per attribute computed on first use, see _get_index
+        self._build_locks = {attribute: threading.Lock() for attribute in LAZY_ATTRIBUTES}
+        self.cache_size = cache_size
+        self.cache_rows = cache_rows
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def add_movie(self, movie: Movie) -> None:
         """ Add a movie to the Repository or replace it if it exists but is different """
-        if movie.uid not in self.movies or self.movies[movie.uid] != movie:
+        previous = self.movies.get(movie.uid)
+        if previous is None or previous != movie:
             self.movies[movie.uid] = movie
+            self._update_indexes(self.movies.row_id(movie.uid), previous, movie)
 
     def add_rating(self, rating: Rating) -> None:
         """ Add rating to the movie if it finds a match """
-        if self.movies[rating.uid].rating != rating:
-            self.movies[rating.uid] = self.movies[rating.uid]._replace(rating=rating)
-
-    def import_movies(self) -> None:
-        """ Read title_basic.csv, create movie and try to add to the registry """
-        file_path = Path(__file__).parent.parent.joinpath('data', "title_basic.csv")
-        with open(file_path, encoding="utf8") as movie_file:
-            reader = csv.DictReader(movie_file)
+        previous = self.movies.get_rating(rating.uid)
+        if previous != rating:
+            self.movies.set_rating(rating.uid, rating)
+            self._update_rating_indexes(self.movies.row_id(rating.uid), previous, rating)
+
+    def remove_movie(self, uid: str) -> None:
+        """ Remove a movie from the Repository, if it is there """
+        previous = self.movies.get(uid)
+        if previous is not None:
+            self._update_indexes(self.movies.row_id(uid), previous, None)
+            del self.movies[uid]
+
+    def remove_rating(self, uid: str) -> None:
+        """ Remove the rating of a movie, if it has one """
+        previous = self.movies.get_rating(uid) if uid in self.movies else None
+        if previous:
+            self.movies.set_rating(uid, None)
+            self._update_rating_indexes(self.movies.row_id(uid), previous, None)
+
+    def build_indexes(self) -> None:
+        """ (Re)build every secondary index from the movies currently stored """
+        with PROFILER.trace("build_indexes") as trace:
+            self._build_year_index()
+            self._build_rating_index()
+            self._build_votes_index()
+            self._build_weighted_index()
+            self._build_title_index()
+            self._build_folded_title_index()
+            self._build_label_index()
+            self._build_prefix_index()
+            self._build_word_index()
+            self._build_person_index()
+            self._build_credit_rows()
+            trace.rows = self.movies.row_count()
+
+    # Each index is built into a local and only assigned once complete, so the searches
+    # running on other threads never see it half built, see _get_index
+
+    @timed_stage("year index")
+    def _build_year_index(self) -> None:
+        index = RangeIndex()
+        index.build(self.movies.year_items())
+        self._year_index = index
+
+    @timed_stage("rating index")
+    def _build_rating_index(self) -> None:
+        index = RangeIndex(scale=100)
+        index.build(
+            (average_rating, row) for row, average_rating, _ in self.movies.rating_items())
+        self._rating_index = index
+
+    @timed_stage("votes index")
+    def _build_votes_index(self) -> None:
+        index = RangeIndex()
+        index.build((num_votes, row) for row, _, num_votes in self.movies.rating_items())
+        self._votes_index = index
+
+    @timed_stage("weighted ratings")
+    def _build_weighted_ratings(self) -> None:
+        """
+        Compute the weighted rating of every movie in a single pass over the ratings.
+
+        It is the IMDB formula (v * R + m * C) / (v + m): the averageRating R of a movie with
+        v numVotes, pulled toward the mean rating C of the catalogue by m = WEIGHTED_MIN_VOTES
+        votes, so a handful of enthusiastic votes doesn't outrank thousands.
+
+        The pass creates a tuple per rated movie, the collector is paused so it doesn't scan
+        every movie stored several times over.
+        """
+        with paused_gc():
+            rated = list(self.movies.rating_items())
+            weighted = array("d", bytes(8 * self.movies.row_count()))
+            if rated:
+                prior = WEIGHTED_MIN_VOTES * math.fsum(item[1] for item in rated) / len(rated)
+                for row, average_rating, num_votes in rated:
+                    weighted[row] = ((num_votes * average_rating + prior)
+                                     / (num_votes + WEIGHTED_MIN_VOTES))
+        self._weighted_ratings = weighted
+        self._weighted_index = None
+
+    @timed_stage("weighted index")
+    def _build_weighted_index(self) -> None:
+        weighted = self._get_weighted_ratings()
+        index = RangeIndex(scale=WEIGHTED_SCALE)
+        index.build((weighted[row], row) for row, _, _ in self.movies.rating_items())
+        self._weighted_index = index
+
+    @timed_stage("title index")
+    def _build_title_index(self) -> None:
+        index = TrigramIndex()
+        index.build((row, self.movies.titles_at(row)) for row in self.movies.rows())
+        self._title_index = index
+
+    @timed_stage("folded title index")
+    def _build_folded_title_index(self) -> None:
+        index = TrigramIndex()
+        index.build((row, self.get_folded_titles(row)) for row in self.movies.rows())
+        self._folded_title_index = index
+
+    @timed_stage("label index")
+    def _build_label_index(self) -> None:
+        index = BitmapIndex()
+        index.build((row, movie_labels(genres, is_adult))
+                    for row, genres, is_adult in self.movies.label_items())
+        self._label_index = index
+
+    @timed_stage("prefix index")
+    def _build_prefix_index(self) -> None:
+        folded_primary, folded_original = self._get_folded_columns()
+        votes = {row: num_votes for row, _, num_votes in self.movies.rating_items()}
+        index = PrefixIndex()
+        index.build((row, (folded_primary[row], folded_original[row]), votes.get(row, 0))
+                    for row in self.movies.rows())
+        self._prefix_index = index
+
+    @timed_stage("word index")
+    def _build_word_index(self) -> None:
+        folded_primary, folded_original = self._get_folded_columns()
+        index = WordIndex()
+        index.build((row, WORD_PATTERN.findall(folded_primary[row])
+                     + WORD_PATTERN.findall(folded_original[row])) for row in self.movies.rows())
+        self._word_index = index
+
+    @timed_stage("person index")
+    def _build_person_index(self) -> None:
+        folded_names = list(map(fold_title, self.credits.names))
+        index = TrigramIndex()
+        index.build((position, (name,)) for position, name in enumerate(folded_names))
+        # person_positions reads the names once it has the index, they are assigned first
+        self._folded_names = folded_names
+        self._person_index = index
+
+    @timed_stage("credit rows")
+    def _build_credit_rows(self) -> None:
+        movies = self.movies
+        self._credit_rows = array("i", [movies.row_id(uid) if uid in movies else -1
+                                        for uid in map(movie_uid, self.credits.movie_numbers())])
+
+    def _drop_indexes(self) -> None:
+        """ Forget the indexes before a bulk change, they will be rebuilt when needed """
+        self._clear_results()
+        self._credit_rows = None
+        self._year_index = None
+        self._rating_index = None
+        self._votes_index = None
+        self._weighted_index = None
+        self._weighted_ratings = None
+        self._title_index = None
+        self._folded_title_index = None
+        self._label_index = None
+        self._prefix_index = None
+        self._word_index = None
+
+    def _fold_titles(self, row: int, primary_title: str, original_title: str) -> None:
+        """
+        Compute and store the folded titles of the movie at row. Searches on other threads
+        read them without the lock: the original title is always stored first, so a row whose
+        primary title is folded has both.
+        """
+        folded_primary = fold_title(primary_title)
+        folded_original = (folded_primary if original_title == primary_title
+                           else fold_title(original_title))
+        with self._folded_lock:
+            missing = row + 1 - len(self._folded_primary)
+            if missing > 0:
+                self._folded_original.extend([None] * missing)
+                self._folded_primary.extend([None] * missing)
+            self._folded_original[row] = folded_original
+            self._folded_primary[row] = folded_primary
+
+    def get_folded_titles(self, row: int) -> tuple[str, str]:
+        """ Return fold_title() of the primary and original titles of the movie at row """
+        if row >= len(self._folded_primary) or self._folded_primary[row] is None:
+            self._fold_titles(row, *self.movies.titles_at(row))
+        return self._folded_primary[row], self._folded_original[row]
+
+    def _get_folded_columns(self) -> tuple[Sequence[str], Sequence[str]]:
+        """ Return the folded primary and original titles by row, folding the missing ones """
+        if len(self._folded_primary) < self.movies.row_count():
+            # The other threads missing them wait instead of folding every title again
+            with self._folded_lock:
+                for row in self.movies.rows():
+                    self.get_folded_titles(row)
+        return self._folded_primary, self._folded_original
+
+    def _get_index(self, attribute: str, build: Callable[[], None]) -> Any:
+        """
+        Return an index, or any other attribute computed on first use, building it first if it
+        is None. Threads missing the same index wait for the first one to build it.
+        """
+        index = getattr(self, attribute)
+        if index is None:
+            with self._build_locks[attribute]:
+                index = getattr(self, attribute)
+                if index is None:
+                    build()
+                    index = getattr(self, attribute)
+        return index
+
+    def _get_year_index(self) -> RangeIndex:
+        return self._get_index("_year_index", self._build_year_index)
+
+    def _get_rating_index(self) -> RangeIndex:
+        return self._get_index("_rating_index", self._build_rating_index)
+
+    def _get_votes_index(self) -> RangeIndex:
+        return self._get_index("_votes_index", self._build_votes_index)
+
+    def _get_weighted_ratings(self) -> array:
+        return self._get_index("_weighted_ratings", self._build_weighted_ratings)
+
+    def _get_weighted_index(self) -> RangeIndex:
+        return self._get_index("_weighted_index", self._build_weighted_index)
+
+    def _get_title_index(self) -> TrigramIndex:
+        return self._get_index("_title_index", self._build_title_index)
+
+    def _get_folded_title_index(self) -> TrigramIndex:
+        return self._get_index("_folded_title_index", self._build_folded_title_index)
+
+    def _get_label_index(self) -> BitmapIndex:
+        return self._get_index("_label_index", self._build_label_index)
+
+    def _get_prefix_index(self) -> PrefixIndex:
+        return self._get_index("_prefix_index", self._build_prefix_index)
+
+    def _get_word_index(self) -> WordIndex:
+        return self._get_index("_word_index", self._build_word_index)
+
+    def _get_person_index(self) -> TrigramIndex:
+        return self._get_index("_person_index", self._build_person_index)
+
+    def _get_credit_rows(self) -> array:
+        return self._get_index("_credit_rows", self._build_credit_rows)
+
+    def _update_indexes(self, row: int, previous: Optional[Movie], movie: Optional[Movie]) -> None:
+        """
+        Reflect the replacement of previous by movie at row in the indexes which are built, and
+        in the folded titles. previous is None for an insertion, movie is None for a removal.
+        The prefix index is sorted as a whole, it is dropped and rebuilt on next use, like the
+        rows of the credited movies when a movie is inserted or removed.
+        """
+        self._clear_results()
+        self._prefix_index = None
+        if previous is None or movie is None:
+            # The credited movies are mapped to rows as a whole, it is rebuilt on next use
+            self._credit_rows = None
+        if self._year_index is not None:
+            previous_year = previous.startYear if previous else ""
+            year = movie.startYear if movie else ""
+            if year != previous_year:
+                if previous_year:
+                    self._year_index.remove(int(previous_year), row)
+                if year:
+                    self._year_index.insert(int(year), row)
+        self._update_rating_indexes(row, previous.rating if previous else None,
+                                    movie.rating if movie else None)
+        if self._label_index is not None:
+            previous_labels = movie_labels(previous.genres, previous.isAdult) if previous else None
+            labels = movie_labels(movie.genres, movie.isAdult) if movie else None
+            if labels != previous_labels:
+                if previous_labels is not None:
+                    self._label_index.remove(row, previous_labels)
+                if labels is not None:
+                    self._label_index.add(row, labels)
+        titles = (movie.primaryTitle, movie.originalTitle) if movie else ()
+        previous_titles = (previous.primaryTitle, previous.originalTitle) if previous else ()
+        if titles != previous_titles:
+            # The vocabulary is numbered as a whole, it is rebuilt on next use
+            self._word_index = None
+            if self._title_index is not None:
+                self._title_index.remove(row, previous_titles)
+                self._title_index.add(row, titles)
+            # The folded titles are not an index, they are always kept up to date
+            if self._folded_title_index is not None and previous:
+                self._folded_title_index.remove(row, self.get_folded_titles(row))
+            if movie:
+                self._fold_titles(row, movie.primaryTitle, movie.originalTitle)
+                if self._folded_title_index is not None:
+                    self._folded_title_index.add(row, self.get_folded_titles(row))
+
+    def _update_rating_indexes(self, row: int, previous: Optional[Rating],
+                               rating: Optional[Rating]) -> None:
+        """
+        Reflect the replacement of the previous rating at row in the rating and votes indexes
+        which are built. Weighted ratings depend on the mean of every rating, they are dropped
+        and computed again on next use.
+        """
+        if rating == previous:
+            return
+        self._clear_results()
+        self._weighted_ratings = None
+        self._weighted_index = None
+        # Suggestions are ranked by number of votes
+        self._prefix_index = None
+        for index, field in [(self._rating_index, "averageRating"),
+                             (self._votes_index, "numVotes")]:
+            if index is None:
+                continue
+            previous_value = getattr(previous, field) if previous else None
+            value = getattr(rating, field) if rating else None
+            if value != previous_value:
+                if previous_value is not None:
+                    index.remove(previous_value, row)
+                if value is not None:
+                    index.insert(value, row)
+
+    @staticmethod
+    def read_movie_rows(file_path: Path = DATA_PATH.joinpath("title_basic.csv")) -> Iterator[tuple]:
+        """
+        Read title_basic.csv and yield the fields of its movies as tuples, without rating.
+
+        Column positions are looked up once from the header, then every row is parsed as a
+        plain list: only startYear and genres can hold \\N, and only genres is split.
+        """
+        with open(file_path, encoding="utf8", newline="") as movie_file:
+            reader = csv.reader(movie_file)
+            header = next(reader, None)
+            if header is None:
+                return
+            uid, primary_title, original_title, is_adult, start_year, genres = map(
+                header.index, MOVIE_COLUMNS)
             for row in reader:
-                for key, elem in row.items():
-                    row[key] = elem.replace(r"\N", "")
-                row["uid"] = row.pop("tconst")
-                row["isAdult"] = bool(int(row["isAdult"]))
-                if row["genres"]:
-                    row["genres"] = row["genres"].split(",")
-
-                self.add_movie(Movie(**row))
-
-    def import_ratings(self) -> None:
-        """ Read rating.csv, create ratings and try to add to the registry """
-        file_path = Path(__file__).parent.parent.joinpath('data', "rating.csv")
-        with open(file_path, encoding="utf8") as rating_file:
-            reader = csv.DictReader(rating_file)
+                year = row[start_year]
+                genre_list = row[genres]
+                yield (row[uid], row[primary_title], row[original_title], row[is_adult] == "1",
+                       "" if year == NULL else year,
+                       genre_list.split(",") if genre_list and genre_list != NULL else "",
+                       None)
+
+    @staticmethod
+    def read_movies(file_path: Path = DATA_PATH.joinpath("title_basic.csv")) -> Iterator[Movie]:
+        """ Read title_basic.csv and yield its movies, without rating """
+        return map(NEW_MOVIE, Repository.read_movie_rows(file_path))
+
+    @staticmethod
+    def read_ratings(file_path: Path = DATA_PATH.joinpath("rating.csv")) -> Iterator[Rating]:
+        """ Read rating.csv and yield its ratings, see read_movie_rows """
+        with open(file_path, encoding="utf8", newline="") as rating_file:
+            reader = csv.reader(rating_file)
+            header = next(reader, None)
+            if header is None:
+                return
+            uid, average_rating, num_votes = map(header.index, RATING_COLUMNS)
             for row in reader:
-                for key, elem in row.items():
-                    row[key] = elem.replace(r"\N", "")
-                row["uid"] = row.pop("tconst")
-                self.add_rating(Rating(**row))
+                yield NEW_RATING((row[uid], float(row[average_rating]), int(row[num_votes])))
 
     @staticmethod
-    def _get_attrib(lst: list, attrib: str, index: int):
-        if attrib in ["averageRating", "averageRating"]:
-            return getattr(lst[index].rating, attrib)
+    def read_credits(file_path: Path = CREDITS_PATH) -> Iterator[tuple[int, int, int, str]]:
+        """
+        Read principals.csv and yield its credits as (movie number, ordering, person number,
+        category), see Credits.build.
+        """
+        with open(file_path, encoding="utf8", newline="") as credit_file:
+            reader = csv.reader(credit_file)
+            header = next(reader, None)
+            if header is None:
+                return
+            uid, ordering, nconst, category = map(header.index, CREDIT_COLUMNS)
+            for row in reader:
+                yield (uid_number(row[uid]), int(row[ordering]), uid_number(row[nconst]),
+                       sys.intern(row[category]))
+
+    @staticmethod
+    def read_people(file_path: Path = PEOPLE_PATH) -> Iterator[tuple[int, str]]:
+        """ Read name_basic.csv and yield its people as (person number, primaryName) """
+        with open(file_path, encoding="utf8", newline="") as person_file:
+            reader = csv.reader(person_file)
+            header = next(reader, None)
+            if header is None:
+                return
+            nconst, primary_name = map(header.index, PERSON_COLUMNS)
+            for row in reader:
+                yield uid_number(row[nconst]), row[primary_name]
+
+    def import_movies(self, file_path: Path = DATA_PATH.joinpath("title_basic.csv")) -> None:
+        """
+        Read title_basic.csv, create movie and try to add to the registry
+
+        When the repository is empty the rows are handed to the store as they are read, there
+        is nothing to compare them with and the store may not need Movie objects at all. The
+        indexes are dropped and rebuilt on first use, like the folded titles.
+        """
+        self._drop_indexes()
+        with PROFILER.trace("import_movies", path=str(file_path)) as trace:
+            if not self.movies:
+                self.movies.clear()
+                self._folded_primary, self._folded_original = [], []
+                with paused_gc(), PROFILER.stage("read and add rows"):
+                    self.movies.add_rows(self.read_movie_rows(file_path))
+            else:
+                with PROFILER.stage("read and update movies"):
+                    for movie in self.read_movies(file_path):
+                        self.add_movie(movie)
+            trace.rows = len(self.movies)
 
-        return getattr(lst[index], attrib)
+    def import_ratings(self, file_path: Path = DATA_PATH.joinpath("rating.csv")) -> None:
+        """
+        Read rating.csv and set the ratings of the movies. The rating and prefix indexes and
+        the cached results are dropped, the weighted ratings are computed again.
+        """
+        self._rating_index = None
+        self._votes_index = None
+        self._weighted_index = None
+        self._prefix_index = None
+        self._clear_results()
+        with PROFILER.trace("import_ratings", path=str(file_path)):
+            with paused_gc(), PROFILER.stage("read and set ratings"):
+                self.movies.set_ratings(self.read_ratings(file_path))
+            self._build_weighted_ratings()
+
+    def import_credits(self, file_path: Path = CREDITS_PATH) -> None:
+        """
+        Read principals.csv and replace the credits by its own, the names of the people being
+        forgotten until import_people. The credits of titles which are not movies of the
+        repository are kept, they just never match.
+        """
+        self._clear_results()
+        self._person_index = None
+        self._credit_rows = None
+        with PROFILER.trace("import_credits", path=str(file_path)) as trace:
+            with paused_gc(), PROFILER.stage("read and index credits"):
+                self.credits.build(self.read_credits(file_path))
+            trace.rows = len(self.credits)
+
+    def import_people(self, file_path: Path = PEOPLE_PATH) -> None:
+        """ Read name_basic.csv and set the names of the people credited """
+        self._clear_results()
+        self._person_index = None
+        with PROFILER.trace("import_people", path=str(file_path)) as trace:
+            with PROFILER.stage("read and set names"):
+                self.credits.set_names(self.read_people(file_path))
+            trace.rows = self.credits.person_count()
+
+    def import_rows(self, rows: Iterable[tuple]) -> None:
+        """
+        Replace the movies by rows of Movie fields, ratings included, such as the rows joined
+        from the IMDB dumps by import_file.read_dump_rows. They are stored as they are read, the
+        weighted ratings are computed right away and the indexes on first use.
+
+        The rows fill a new store, swapped in once they are all read: if reading them raises,
+        such as on a dump which is not sorted, the repository is left untouched.
+        """
+        with PROFILER.trace("import_rows") as trace:
+            store = DictStore() if isinstance(self.movies, DictStore) else ColumnStore()
+            with paused_gc(), PROFILER.stage("read and add rows"):
+                store.add_rows(rows)
+            self.movies = store
+            self._folded_primary, self._folded_original = [], []
+            self._drop_indexes()
+            self._build_weighted_ratings()
+            trace.rows = len(self.movies)
+
+    def update_rows(self, rows: Iterable[tuple]) -> ImportReport:
+        """
+        Bring the repository in line with rows of Movie fields, ratings included, touching only
+        what changed.
+
+        The rows are first compared with the repository, then only the inserted, changed and
+        removed movies are applied, updating the indexes in place.
+        """
+        seen: set[str] = set()
+        changes: list[Movie] = []
+        inserted = unchanged = 0
+        with PROFILER.trace("update_rows") as trace:
+            with PROFILER.stage("compare"):
+                for movie in map(NEW_MOVIE, rows):
+                    seen.add(movie.uid)
+                    previous = self.movies.get(movie.uid)
+                    if previous is None:
+                        inserted += 1
+                        changes.append(movie)
+                    elif previous != movie:
+                        changes.append(movie)
+                    else:
+                        unchanged += 1
+                removed = [uid for uid in self.movies if uid not in seen]
+
+            self._prepare_bulk_update(len(changes) + len(removed))
+            with PROFILER.stage("apply") as stage:
+                for movie in changes:
+                    self.add_movie(movie)
+                for uid in removed:
+                    self.remove_movie(uid)
+                stage.rows = len(changes) + len(removed)
+            self._get_weighted_ratings()
+            trace.rows = len(self.movies)
+
+        return ImportReport(inserted, len(changes) - inserted, len(removed), unchanged)
+
+    def update_movies(self,
+                      file_path: Path = DATA_PATH.joinpath("title_basic.csv")) -> ImportReport:
+        """
+        Bring the repository in line with a new title_basic.csv, touching only what changed,
+        see update_rows. Ratings are kept.
+        """
+        movies = self.movies
+        return self.update_rows(
+            (*row[:-1], movies.get_rating(row[0]) if row[0] in movies else None)
+            for row in self.read_movie_rows(file_path))
+
+    def update_ratings(self, file_path: Path = DATA_PATH.joinpath("rating.csv")) -> ImportReport:
+        """
+        Bring the ratings in line with a new rating.csv, touching only what changed.
+        Ratings of movies which are not in the repository are ignored.
+        """
+        seen: set[str] = set()
+        changes: list[Rating] = []
+        inserted = unchanged = 0
+        for rating in self.read_ratings(file_path):
+            if rating.uid not in self.movies:
+                continue
+            seen.add(rating.uid)
+            previous = self.movies.get_rating(rating.uid)
+            if previous is None:
+                inserted += 1
+                changes.append(rating)
+            elif previous != rating:
+                changes.append(rating)
+            else:
+                unchanged += 1
+        removed = [uid for uid in self.movies if uid not in seen and self.movies.get_rating(uid)]
+
+        self._prepare_bulk_update(len(changes) + len(removed))
+        for rating in changes:
+            self.add_rating(rating)
+        for uid in removed:
+            self.remove_rating(uid)
+        self._get_weighted_ratings()
+
+        return ImportReport(inserted, len(changes) - inserted, len(removed), unchanged)
+
+    def _prepare_bulk_update(self, change_count: int) -> None:
+        """ Drop the indexes if rebuilding them is cheaper than updating them one by one """
+        if change_count > len(self.movies) * REBUILD_RATIO:
+            self._drop_indexes()
+
+    @staticmethod
+    def snapshot_is_fresh(path: Path = SNAPSHOT_PATH) -> bool:
+        """ Return True if the snapshot exists and is newer than every csv it was built from. """
+        if not path.exists():
+            return False
+        snapshot_time = path.stat().st_mtime
+        return all(snapshot_time >= csv_path.stat().st_mtime
+                   for csv_path in [DATA_PATH.joinpath("title_basic.csv"),
+                                    DATA_PATH.joinpath("rating.csv"), CREDITS_PATH, PEOPLE_PATH]
+                   if csv_path.exists())
 
     @staticmethod
-    def quicksort(lst: list[Movie],
-                  attrib: Optional[str] = "primaryTitle",
-                  reverse: bool = False,
-                  start: Optional[int] = 0,
-                  end: Optional[int] = None) -> None:
+    def mapped_is_fresh(path: Path = MAPPED_PATH, snapshot_path: Path = SNAPSHOT_PATH) -> bool:
+        """
+        Return True if the mapped catalogue exists and is newer than every csv and than the
+        snapshot, as every import saves the snapshot but not the catalogue.
         """
-        Quicksort algorythm.
+        return (Repository.snapshot_is_fresh(path)
+                and not (snapshot_path.exists()
+                         and snapshot_path.stat().st_mtime > path.stat().st_mtime))
 
-        - Allow choice of the attribute to be sorted
-        - Allow reverse order
+    def save_snapshot(self, path: Path = SNAPSHOT_PATH) -> None:
         """
+        Write the whole repository, ratings included, into a binary snapshot.
 
-        # Initialize end value
-        if end is None:
-            end = len(lst) - 1
-        # Base case
-        if start >= end or len(lst) == 1:
-            return
+        Movies are stored as the typed arrays and the title buffer of a ColumnStore, see
+        ColumnStore.to_columns, which unpickle as a few blocks of bytes instead of objects.
+        The folded titles are saved too, so they are not computed again, a title whose
+        original is the same as the primary one being written once. The credits come first,
+        so load_credits() reads them without the movies. The file is written next to its
+        destination then swapped in, so a reader never sees a partial snapshot.
+        """
+        # to_columns numbers the movies again in this order, the folded titles follow it
+        rows = list(self.movies.rows())
+        folded_columns = [list(column) for column in zip(*map(self.get_folded_titles, rows))]
 
-        def compare(val_1, val_2):
-            if reverse:
-                return val_1 > val_2
-            return val_1 < val_2
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as snapshot_file:
+            pickle.dump(SNAPSHOT_VERSION, snapshot_file, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(self.credits.to_columns(), snapshot_file, pickle.HIGHEST_PROTOCOL)
+            pickle.dump((self.movies.to_columns(), folded_columns), snapshot_file,
+                        pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
 
-        def normalize_string(string: str) -> str:
-            # https://stackoverflow.com/a/517974
-            nfkd_form = unicodedata.normalize('NFKD', string)
-            return "".join([c for c in nfkd_form if not unicodedata.combining(c)])
+    def load_snapshot(self, path: Path = SNAPSHOT_PATH) -> bool:
+        """
+        Fill the repository from the binary snapshot. A ColumnStore is rebuilt straight from
+        the saved columns, a DictStore builds its movies from them column by column.
 
-        # Randomly select an item
-        pivot_index = randrange(start, end + 1)
-        # Ideally this would be decoupled, but I got to move on
-        pivot_value = normalize_string(Repository._get_attrib(lst, attrib, pivot_index)).upper()
+        :return: False if the snapshot is missing, outdated, of an other version or can't be
+        decoded, in which case the repository is left untouched and the csv files should be
+        imported instead.
+        """
+        if not self.snapshot_is_fresh(path):
+            return False
+
+        try:
+            with paused_gc(), PROFILER.trace("load_snapshot", path=str(path)) as trace, \
+                    open(path, "rb") as snapshot_file:
+                if pickle.load(snapshot_file) != SNAPSHOT_VERSION:
+                    return False
+                credits = Credits.from_columns(pickle.load(snapshot_file))
+                store_columns, folded_columns = pickle.load(snapshot_file)
+                store_type = DictStore if isinstance(self.movies, DictStore) else ColumnStore
+                movies = store_type.from_columns(store_columns)
+                trace.rows = len(movies)
+        except Exception as error:
+            # A snapshot which can't be decoded, whatever the reason, is treated as outdated
+            logging.warning("Could not read snapshot %s: %s", path, error)
+            return False
+
+        self.movies = movies
+        # The columns of an empty repository are empty
+        self._folded_primary, self._folded_original = folded_columns or ([], [])
+        self._set_credits(credits)
+        self._drop_indexes()
+        return True
+
+    def load_credits(self, path: Path = SNAPSHOT_PATH) -> bool:
+        """
+        Replace the credits by the ones of the binary snapshot, without reading its movies.
+
+        :return: False if the snapshot is missing, outdated or of an other version, in which
+        case the credits are left untouched.
+        """
+        if not self.snapshot_is_fresh(path):
+            return False
+        try:
+            with paused_gc(), open(path, "rb") as snapshot_file:
+                if pickle.load(snapshot_file) != SNAPSHOT_VERSION:
+                    return False
+                credits = Credits.from_columns(pickle.load(snapshot_file))
+        except Exception as error:
+            # A snapshot which can't be decoded, whatever the reason, is treated as outdated
+            logging.warning("Could not read snapshot %s: %s", path, error)
+            return False
+        self._set_credits(credits)
+        return True
+
+    def _set_credits(self, credits: Credits) -> None:
+        self.credits = credits
+        self._person_index = None
+        self._credit_rows = None
+        self._clear_results()
+
+    def save_mapped(self, path: Path = MAPPED_PATH) -> None:
+        """
+        Write the whole repository, ratings, folded titles and the indexes of MAPPED_INDEXES
+        included, as a read-only memory-mapped catalogue which load_mapped() opens without
+        reading it, see MappedStore.
+
+        The catalogue numbers the movies in uid order: its indexes are built over a copy of
+        the movies in that order. The prefix, word and person indexes are not written, they
+        are built on first use by each process.
+        """
+        uids = sorted(self.movies)
+        rows = self.movies.row_ids(uids)
+        folded_titles = list(map(self.get_folded_titles, rows))
+        ordered = Repository(ColumnStore())
+        ordered.movies.add_rows(map(self.movies.movie_at, rows))
+        if folded_titles:
+            ordered._folded_primary, ordered._folded_original = map(list, zip(*folded_titles))
+        indexes = {}
+        for name, (attribute, _) in MAPPED_INDEXES.items():
+            index = getattr(ordered, f"_get{attribute}")()
+            indexes[name] = (index,) if isinstance(index, array) else index.to_columns()
+        MappedStore.write(path, map(ordered.movies.movie_at, ordered.movies.rows()),
+                          folded_titles, indexes)
+
+    def load_mapped(self, path: Path = MAPPED_PATH, snapshot_path: Path = SNAPSHOT_PATH) -> bool:
+        """
+        Replace the movies by the memory-mapped catalogue written by save_mapped(). The
+        repository becomes read-only, and shares its movies with every process mapping the file.
+        So do the range indexes, the weighted ratings and the posting lists of the title
+        indexes, which are views over the file as well. The genre bitmaps are copied out of it.
+        The credits are not part of the catalogue, they are read from the snapshot if it is
+        up to date, see load_credits.
+
+        :return: False if the catalogue is missing, outdated or of an other version, in which
+        case the repository is left untouched, see mapped_is_fresh.
+        """
+        if not self.mapped_is_fresh(path, snapshot_path):
+            return False
+        try:
+            store = MappedStore(path)
+            indexes = {attribute: read(store.indexes[name])
+                       for name, (attribute, read) in MAPPED_INDEXES.items()}
+        except (OSError, ValueError, KeyError) as error:
+            logging.warning("Could not map catalogue %s: %s", path, error)
+            return False
+
+        self.movies = store
+        self._folded_primary, self._folded_original = store.folded_primary, store.folded_original
+        self._drop_indexes()
+        for attribute, index in indexes.items():
+            setattr(self, attribute, index)
+        self.load_credits(snapshot_path)
+        return True
+
+    def cached_result(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Return the search result cached under key, or compute and cache it.
+
+        At most cache_size results holding cache_rows rows in all are kept, the least recently
+        used ones being dropped first, and a result of more rows is not kept. Results must only
+        hold row numbers and values derived from the movies, not Movies, their length being
+        their number of rows.
+        The cache may be used from several threads, a result is then computed by each thread
+        missing it at the same time.
+        """
+        with self._results_lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.cache_hits += 1
+                return result
+            self.cache_misses += 1
+        result = compute()
+        if self.cache_size > 0 and len(result) <= self.cache_rows:
+            with self._results_lock:
+                previous = self._results.pop(key, None)
+                if previous is not None:
+                    self._cached_rows -= len(previous)
+                self._results[key] = result
+                self._cached_rows += len(result)
+                while len(self._results) > self.cache_size or self._cached_rows > self.cache_rows:
+                    self._cached_rows -= len(self._results.popitem(last=False)[1])
+        return result
+
+    def _clear_results(self) -> None:
+        """ Forget the cached search results """
+        with self._results_lock:
+            self._results.clear()
+            self._cached_rows = 0
+
+    def cache_info(self) -> CacheInfo:
+        """ Return the hit and miss counts and the size of the search result cache """
+        return CacheInfo(self.cache_hits, self.cache_misses, len(self._results), self.cache_size,
+                         self._cached_rows, self.cache_rows)
+
+    def _sort_column(self, lst: list[Movie], attrib: str, reverse: bool = False) -> list:
+        """
+        Return the values the movies are sorted on, computed once for the whole list.
+        Unknown values are replaced by a value ordering them last in the given direction.
+        """
+        missing = -math.inf if reverse else math.inf
+        if attrib == "primaryTitle":
+            folded_primary = self._get_folded_columns()[0]
+            return list(map(folded_primary.__getitem__, self._movie_rows(lst)))
+        if attrib == "startYear":
+            return [int(movie.startYear) if movie.startYear else missing for movie in lst]
+        if attrib == "averageRating":
+            return [movie.rating.averageRating if movie.rating else missing for movie in lst]
+        if attrib == "numVotes":
+            return [movie.rating.numVotes if movie.rating else missing for movie in lst]
+        if attrib == "weightedRating":
+            weighted = self._get_weighted_ratings()
+            return [weighted[row] or missing for row in self._movie_rows(lst)]
+        raise ValueError(f"Movies can't be sorted by [{attrib}].")
+
+    def _movie_rows(self, lst: Sequence[Movie]) -> Sequence[int]:
+        """ Return the rows of the movies, without building them if lst is a MovieRows """
+        if isinstance(lst, MovieRows):
+            return lst.rows
+        return self.movies.row_ids([movie.uid for movie in lst])
+
+    def sort_movies(self, lst: list[Movie], keys: Iterable[SortKey] = ("primaryTitle",)) -> None:
+        """
+        Sort a list of movies in place by one or several attributes.
+
+        Each key column is computed once, titles using their precomputed folded form, then
+        the positions are sorted by every key from the least significant one, relying on the
+        sort being stable.
 
-        # Put selected item at end of the list
-        lst[end], lst[pivot_index] = lst[pivot_index], lst[end]
+        :param keys: Attributes to sort by, most significant first. Each one is either the
+        name of the attribute or a (name, reverse) tuple.
+        Movies missing a value come last whatever the direction, ties are broken by uid.
+        """
+        keys = [(key, False) if isinstance(key, str) else key for key in keys]
+        order = sorted(range(len(lst)), key=[movie.uid for movie in lst].__getitem__)
+        for attrib, reverse in reversed(keys):
+            order.sort(key=self._sort_column(lst, attrib, reverse).__getitem__, reverse=reverse)
+        lst[:] = [lst[position] for position in order]
+
+    def paginate(self,
+                 lst: Sequence[Movie],
+                 keys: Iterable[SortKey] = ("primaryTitle",),
+                 page_size: int = 10) -> PagedResult:
+        """
+        Return the movies as a PagedResult, which only orders the pages actually read.
+
+        The keys work as in sort_movies(), the first one is computed for every movie and the
+        others only for the movies that end up tied on it.
+        """
+        keys = [(key, False) if isinstance(key, str) else key for key in keys]
+
+        def ascending_column(movies: list[Movie], attrib: str, reverse: bool) -> list:
+            column = self._sort_column(movies, attrib, reverse)
+            if not reverse:
+                return column
+            if attrib == "primaryTitle":
+                return list(map(Descending, column))
+            return [-value for value in column]
 
-        pointer = start
-        # Move the pointer from start to end
-        for cursor in range(start, end):
-            cursor_value = normalize_string(Repository._get_attrib(lst, attrib, cursor)).upper()
+        def tie_keys(movies: list[Movie]) -> list[tuple]:
+            return list(zip(*(ascending_column(movies, *key) for key in keys[1:]),
+                            [movie.uid for movie in movies]))
 
-            if compare(cursor_value, pivot_value):
-                lst[cursor], lst[pointer] = lst[pointer], lst[cursor]
-                pointer += 1
+        return PagedResult(lst, ascending_column(lst, *keys[0]), tie_keys, page_size)
 
-        lst[end], lst[pointer] = lst[pointer], lst[end]
+    def suggest(self, prefix: str, count: int = 10) -> list[Movie]:
+        """
+        Return the count movies whose primary or original title starts with prefix, ignoring
+        case and accents, the most voted first. The cost depends on count, not on the number
+        of titles starting with prefix, so it can be called on every keystroke.
+        """
+        rows = self._get_prefix_index().top(fold_title(prefix), count)
+        return list(map(self.movies.movie_at, rows))
 
-        Repository.quicksort(lst, attrib, reverse, start, pointer - 1)
-        Repository.quicksort(lst, attrib, reverse, pointer + 1, end)
+    def estimate_title(self, title: str, normalized: bool = False) -> int:
+        """ Return an upper bound of the number of movies matching the title, from the index """
+        if normalized:
+            candidates = self._get_folded_title_index().candidates(fold_title(title))
+        else:
+            candidates = self._get_title_index().candidates(title)
+        return len(self.movies) if candidates is None else len(candidates)
 
-    def search_title(self, title: str, lst: Optional[list[Movie]] = None) -> list[Movie]:
-        """ Return list of movies that match the provided string. """
+    def title_rows(self,
+                   title: str,
+                   normalized: bool = False,
+                   rows: Optional[Iterable[int]] = None) -> list[int]:
+        """
+        Return the rows of the movies whose primary or original title contains the string.
 
-        if not lst:
-            lst = list(self.movies.values())
-        result = [movie for movie in lst
-                  if title in movie.primaryTitle or title in movie.originalTitle]
+        :param rows: Only check these rows, otherwise the candidates are taken from the index
+        """
+        if normalized:
+            title = fold_title(title)
+            if rows is None:
+                rows = self._get_folded_title_index().candidates(title)
+            folded_primary, folded_original = self._get_folded_columns()
+            return [row for row in (self.movies.rows() if rows is None else rows)
+                    if title in folded_primary[row] or title in folded_original[row]]
 
+        if rows is None:
+            rows = self._get_title_index().candidates(title)
+        result = []
+        for row in self.movies.rows() if rows is None else rows:
+            movie = self.movies.movie_at(row)
+            if title in movie.primaryTitle or title in movie.originalTitle:
+                result.append(row)
         return result
 
+    def fuzzy_title_rows(self,
+                         title: str,
+                         max_distance: int = FUZZY_MAX_DISTANCE,
+                         rows: Optional[Iterable[int]] = None) -> dict[int, int]:
+        """
+        Return the rows of the movies whose titles hold every word of title, each one
+        possibly misspelled, with the total number of edits the words needed.
+
+        Case and accents are ignored. A word may have up to max_distance edits, but only a
+        third of its length, so that short words stay meaningful: "godfater" finds "The
+        Godfather" with one edit, "the" only matches itself.
+
+        :param rows: Only keep these rows
+        """
+        words = WORD_PATTERN.findall(fold_title(title))
+        if not words:
+            return {}
+        index = self._get_word_index()
+        word_matches = []
+        for word in words:
+            matches = index.matches(word, min(max_distance, (len(word) - 1) // 3))
+            if not matches:
+                return {}
+            word_matches.append(matches)
+        # The rarest word gives the candidates, the others are only checked against them
+        word_matches.sort(key=lambda matches: sum(len(index.rows(word_id))
+                                                  for word_id, _ in matches))
+
+        distances = None if rows is None else dict.fromkeys(rows, 0)
+        for matches in word_matches:
+            word_distances = {}
+            # The closest words come last, so each row keeps its smallest distance
+            for word_id, distance in sorted(matches, key=lambda match: -match[1]):
+                for row in index.rows(word_id):
+                    if distances is None or row in distances:
+                        word_distances[row] = distance
+            if distances is None:
+                distances = word_distances
+            else:
+                distances = {row: distances[row] + distance
+                             for row, distance in word_distances.items()}
+            if not distances:
+                break
+        return distances
+
+    def person_positions(self, name: str) -> list[int]:
+        """ Return the positions in credits of the people whose name contains the string """
+        name = fold_title(name)
+        candidates = self._get_person_index().candidates(name)
+        folded_names = self._folded_names
+        if candidates is None:
+            candidates = range(len(folded_names))
+        return [position for position in candidates if name in folded_names[position]]
+
+    def estimate_person(self, name: str) -> int:
+        """ Return an upper bound of the number of movies crediting the person, from the index """
+        candidates = self._get_person_index().candidates(fold_title(name))
+        if candidates is None:
+            return len(self.movies)
+        return min(len(self.movies), sum(map(self.credits.credit_count, candidates)))
+
+    def person_rows(self,
+                    name: str,
+                    categories: Optional[Collection[str]] = None,
+                    rows: Optional[Iterable[int]] = None) -> list[int]:
+        """
+        Return the rows of the movies crediting a person whose name contains the string,
+        ignoring case and accents, in increasing order.
+
+        :param categories: Only keep the credits in these categories, such as "director"
+        :param rows: Only keep these rows, in their order
+        """
+        positions = set()
+        for position in self.person_positions(name):
+            positions.update(self.credits.movie_positions(position, categories))
+        credit_rows = self._get_credit_rows()
+        found = {credit_rows[position] for position in positions}
+        found.discard(-1)
+        if rows is None:
+            return sorted(found)
+        return [row for row in rows if row in found]
+
+    def movie_people(self, uid: str) -> list[tuple[Person, str]]:
+        """ Return the cast and crew of a movie with their category, in billing order """
+        return self.credits.people_of(uid_number(uid))
+
+    def count_year(self, min_year: Optional[int] = None, max_year: Optional[int] = None) -> int:
+        """ Return the number of movies with a startYear within the boundaries, from the index """
+        return self._get_year_index().count(min_year, max_year)
+
+    def year_rows(self,
+                  min_year: Optional[int] = None,
+                  max_year: Optional[int] = None,
+                  rows: Optional[Iterable[int]] = None) -> list[int]:
+        """
+        Return the rows of the movies with a startYear within the boundaries (inclusive).
+
+        :param rows: Only check these rows, otherwise they are read from the index
+        """
+        if rows is None:
+            return self._get_year_index().rows(min_year, max_year)
+        min_year = -math.inf if min_year is None else min_year
+        max_year = math.inf if max_year is None else max_year
+        result = []
+        for row in rows:
+            year = self.movies.movie_at(row).startYear
+            if year and min_year <= int(year) <= max_year:
+                result.append(row)
+        return result
+
+    def count_rating(self, min_val: Optional[float] = None, max_val: Optional[float] = None) -> int:
+        """ Return the number of movies with an averageRating within the boundaries """
+        return self._get_rating_index().count(min_val, max_val)
+
+    def rating_rows(self,
+                    min_val: Optional[float] = None,
+                    max_val: Optional[float] = None,
+                    rows: Optional[Iterable[int]] = None) -> list[int]:
+        """
+        Return the rows of the movies with an averageRating within the boundaries (inclusive).
+
+        :param rows: Only check these rows, otherwise they are read from the index
+        """
+        if rows is None:
+            return self._get_rating_index().rows(min_val, max_val)
+        min_val = -math.inf if min_val is None else min_val
+        max_val = math.inf if max_val is None else max_val
+        result = []
+        for row in rows:
+            rating = self.movies.movie_at(row).rating
+            if rating and min_val <= rating.averageRating <= max_val:
+                result.append(row)
+        return result
+
+    def count_votes(self, min_votes: Optional[int] = None, max_votes: Optional[int] = None) -> int:
+        """ Return the number of movies with a numVotes within the boundaries, from the index """
+        return self._get_votes_index().count(min_votes, max_votes)
+
+    def votes_rows(self,
+                   min_votes: Optional[int] = None,
+                   max_votes: Optional[int] = None,
+                   rows: Optional[Iterable[int]] = None) -> list[int]:
+        """
+        Return the rows of the movies with a numVotes within the boundaries (inclusive).
+
+        :param rows: Only check these rows, otherwise they are read from the index
+        """
+        if rows is None:
+            return self._get_votes_index().rows(min_votes, max_votes)
+        min_votes = -math.inf if min_votes is None else min_votes
+        max_votes = math.inf if max_votes is None else max_votes
+        result = []
+        for row in rows:
+            rating = self.movies.movie_at(row).rating
+            if rating and min_votes <= rating.numVotes <= max_votes:
+                result.append(row)
+        return result
+
+    def get_weighted_rating(self, uid: str) -> Optional[float]:
+        """ Return the weighted rating of a movie, None if it has no rating """
+        return self._get_weighted_ratings()[self.movies.row_id(uid)] or None
+
+    def count_weighted_rating(self,
+                              min_val: Optional[float] = None,
+                              max_val: Optional[float] = None) -> int:
+        """ Return the number of movies with a weighted rating within the boundaries """
+        return self._get_weighted_index().count(min_val, max_val)
+
+    def weighted_rating_rows(self,
+                             min_val: Optional[float] = None,
+                             max_val: Optional[float] = None,
+                             rows: Optional[Iterable[int]] = None) -> list[int]:
+        """
+        Return the rows of the movies with a weighted rating within the boundaries (inclusive).
+
+        :param rows: Only check these rows, otherwise they are read from the index
+        """
+        if rows is None:
+            return self._get_weighted_index().rows(min_val, max_val)
+        min_val = -math.inf if min_val is None else min_val
+        max_val = math.inf if max_val is None else max_val
+        weighted = self._get_weighted_ratings()
+        return [row for row in rows if weighted[row] and min_val <= weighted[row] <= max_val]
+
+    def genres(self) -> list[str]:
+        """ Return every genre of the repository, in alphabetical order """
+        return [label for label in self._get_label_index().keys() if label != ADULT_LABEL]
+
+    def genre_bitmap(self, genres: Iterable[str], mode: str = "any") -> int:
+        """
+        Return the bitmap of the movies having any, all or none of the genres, see BitmapIndex.
+
+        :raise ValueError: if mode is not one of GENRE_MODES
+        """
+        index = self._get_label_index()
+        bitmaps = [index.get(genre) for genre in genres]
+        if mode == "any":
+            return reduce(or_, bitmaps, 0)
+        if mode == "all":
+            return reduce(and_, bitmaps, index.all())
+        if mode == "none":
+            return index.all() & ~reduce(or_, bitmaps, 0)
+        raise ValueError(f"Genres can't be combined with [{mode}], use one of {GENRE_MODES}.")
+
+    def adult_bitmap(self, adult: bool) -> int:
+        """ Return the bitmap of the adult movies, or of every other movie if adult is False """
+        index = self._get_label_index()
+        return index.get(ADULT_LABEL) if adult else index.all() & ~index.get(ADULT_LABEL)
+
+    @staticmethod
+    def bitmap_rows(bitmap: int, rows: Optional[Iterable[int]] = None) -> list[int]:
+        """
+        Return the rows of a bitmap in increasing order.
+
+        :param rows: Only keep these rows, in their order
+        """
+        return BitmapIndex.rows(bitmap) if rows is None else BitmapIndex.filter(bitmap, rows)
+
+    def _lst_rows(self, lst: Optional[list[Movie]]) -> Optional[list[int]]:
+        return None if lst is None else self.movies.row_ids([movie.uid for movie in lst])
+
+    def fuzzy_search(self,
+                     title: str,
+                     max_distance: int = FUZZY_MAX_DISTANCE,
+                     count: int = 10) -> list[FuzzyMatch]:
+        """
+        Return the count movies whose title best matches title despite typos, see
+        fuzzy_title_rows. The fewest edits come first, then the best weighted rating.
+        """
+        distances = self.fuzzy_title_rows(title, max_distance)
+        weighted = self._get_weighted_ratings()
+        best = heapq.nsmallest(count, distances,
+                               key=lambda row: (distances[row], -weighted[row], row))
+        return [FuzzyMatch(self.movies.movie_at(row), distances[row]) for row in best]
+
+    def search_person(self,
+                      name: str,
+                      categories: Optional[Collection[str]] = None,
+                      lst: Optional[list[Movie]] = None) -> list[Movie]:
+        """
+        Return a list of movies crediting a person whose name contains the string, among lst if
+        it is provided. See person_rows.
+        """
+
+        rows = self.person_rows(name, categories, self._lst_rows(lst))
+        return list(map(self.movies.movie_at, rows))
+
+    def search_title(self,
+                     title: str,
+                     lst: Optional[list[Movie]] = None,
+                     normalized: bool = False) -> list[Movie]:
+        """
+        Return list of movies that match the provided string, among lst if it is provided.
+
+        With normalized, the match ignores case and accents ("amelie" finds "Amélie").
+        """
+
+        rows = self.title_rows(title, normalized, self._lst_rows(lst))
+        return list(map(self.movies.movie_at, rows))
+
     def search_year(self,
                     min_year: Optional[int] = None,
                     max_year: Optional[int] = None,
                     lst: Optional[list[Movie]] = None) -> list[Movie]:
-        """ Return a list of movies that have startYear within specified boundaries. """
-
-        if not lst:
-            lst = list(self.movies.values())
-
-        if min_year and max_year:
-            return [movie for movie in lst
-                    if movie.startYear and min_year <= int(movie.startYear) <= max_year]
-        if min_year:
-            return [movie for movie in lst
-                    if movie.startYear and min_year <= int(movie.startYear)]
-        if max_year:
-            return [movie for movie in lst
-                    if movie.startYear and int(movie.startYear) <= max_year]
-        return []
+        """
+        Return a list of movies that have startYear within specified boundaries, among lst if
+        it is provided.
+        """
+
+        if not min_year and not max_year:
+            return []
+        rows = self.year_rows(min_year or None, max_year or None, self._lst_rows(lst))
+        return list(map(self.movies.movie_at, rows))
 
     def search_rating(self,
                       min_val: Optional[float] = None,
                       max_val: Optional[float] = None,
                       lst: Optional[list[Movie]] = None) -> list[Movie]:
-        """ Return a list of movies that have rating.averageRating within specified boundaries. """
-
-        if not lst:
-            lst = list(self.movies.values())
-
-        if min_val and max_val:
-            return [movie for movie in lst
-                    if movie.rating and min_val <= float(movie.rating.averageRating) <= max_val]
-        if min_val:
-            return [movie for movie in lst
-                    if movie.rating and min_val <= float(movie.rating.averageRating)]
-        if max_val:
-            return [movie for movie in lst
-                    if movie.rating and float(movie.rating.averageRating) <= max_val]
-        return []
+        """
+        Return a list of movies that have rating.averageRating within specified boundaries,
+        among lst if it is provided.
+        """
+
+        if not min_val and not max_val:
+            return []
+        rows = self.rating_rows(min_val or None, max_val or None, self._lst_rows(lst))
+        return list(map(self.movies.movie_at, rows))
+
+    def search_genre(self,
+                     genres: Iterable[str],
+                     mode: str = "any",
+                     lst: Optional[list[Movie]] = None) -> list[Movie]:
+        """
+        Return a list of movies having any, all or none of the genres, among lst if it is
+        provided. Genres are matched exactly, see genres().
+        """
+
+        rows = self.bitmap_rows(self.genre_bitmap(genres, mode), self._lst_rows(lst))
+        return list(map(self.movies.movie_at, rows))
+
+    def search_adult(self, adult: bool, lst: Optional[list[Movie]] = None) -> list[Movie]:
+        """ Return a list of the adult movies, or of the others, among lst if it is provided. """
+
+        rows = self.bitmap_rows(self.adult_bitmap(adult), self._lst_rows(lst))
+        return list(map(self.movies.movie_at, rows))
+
+    def search_votes(self,
+                     min_votes: Optional[int] = None,
+                     max_votes: Optional[int] = None,
+                     lst: Optional[list[Movie]] = None) -> list[Movie]:
+        """
+        Return a list of movies that have rating.numVotes within specified boundaries, among lst
+        if it is provided.
+        """
+
+        if not min_votes and not max_votes:
+            return []
+        rows = self.votes_rows(min_votes or None, max_votes or None, self._lst_rows(lst))
+        return list(map(self.movies.movie_at, rows))
+
+    def search_weighted_rating(self,
+                               min_val: Optional[float] = None,
+                               max_val: Optional[float] = None,
+                               lst: Optional[list[Movie]] = None) -> list[Movie]:
+        """
+        Return a list of movies that have a weighted rating within specified boundaries, among
+        lst if it is provided.
+        """
+
+        if not min_val and not max_val:
+            return []
+        rows = self.weighted_rating_rows(min_val or None, max_val or None, self._lst_rows(lst))
+        return list(map(self.movies.movie_at, rows))
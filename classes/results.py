@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Contain the lazily ordered result of a search """
+import heapq
+from array import array
+from collections.abc import Callable, Iterator
+from typing import Sequence
+
+from .movie import Movie
+from .profiling import timed_stage
+from .storage import ColumnStore, DictStore
+
+# Past this share of the results, sorting everything is cheaper than another selection
+FULL_SORT_RATIO = 0.25
+
+
+class MovieRows(Sequence):
+    """ Movies of a store given by their row numbers, each one built only when it is read """
+
+    def __init__(self, store: DictStore | ColumnStore, rows: array):
+        self.store = store
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return list(map(self.store.movie_at, self.rows[position]))
+        return self.store.movie_at(self.rows[position])
+
+
+class Descending:
+    """ Wrap a value so that it sorts in reverse order, for values that can't be negated """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other: "Descending") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Descending) and self.value == other.value
+
+
+class PagedResult:
+    """
+    Result of a search, ordered only as far as it is read.
+
+    The movies are ordered by a primary key, then by tie-breaking keys. To serve the first
+    pages, the top movies on the primary key are picked with a heap selection, which costs
+    O(n log k) instead of sorting all n movies, and the tie-breaking keys are only computed for
+    the movies tied with them. When a page past the ordered part is requested the selection
+    is extended, doubling each time, until it is cheaper to sort everything.
+
+    Results are cached and may be read from several threads at once: each read slices the
+    ordered list it made sure of, and the shared one is only replaced by a longer one.
+    """
+
+    def __init__(self,
+                 movies: Sequence[Movie],
+                 primary_keys: list,
+                 tie_keys: Callable[[list[Movie]], list[tuple]],
+                 page_size: int = 10):
+        """
+        :param movies: Movies in the result, in any order
+        :param primary_keys: Primary key of each movie, the result is in ascending key order
+        :param tie_keys: Function returning the tie-breaking key of each movie of a list
+        :param page_size: Number of movies per page
+        """
+        self._movies = movies
+        self._primary_keys = primary_keys
+        self._tie_keys = tie_keys
+        self.page_size = page_size
+        self._ordered: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+    def __bool__(self) -> bool:
+        return bool(self._movies)
+
+    def __iter__(self) -> Iterator[Movie]:
+        for page_number in range(self.page_count):
+            yield from self.page(page_number)
+
+    @property
+    def page_count(self) -> int:
+        """ Number of pages in the result """
+        return -(-len(self._movies) // self.page_size)
+
+    def page(self, page_number: int) -> list[Movie]:
+        """ Return the movies of a page, the first page being 0 """
+        start = page_number * self.page_size
+        return self.slice(start, start + self.page_size)
+
+    def slice(self, start: int, end: int) -> list[Movie]:
+        """ Return the movies from position start (included) to end (excluded) """
+        ordered = self._order_up_to(end)
+        return [self._movies[position] for position in ordered[start:end]]
+
+    @timed_stage("sort")
+    def _order_up_to(self, count: int) -> list[int]:
+        """ Return the positions of at least the first count movies in order """
+        ordered = self._ordered
+        total = len(self._movies)
+        count = min(count, total)
+        if count <= len(ordered):
+            return ordered
+        count = max(count, 2 * len(ordered))
+
+        primary_keys = self._primary_keys
+        if count >= total * FULL_SORT_RATIO:
+            candidates = range(total)
+        else:
+            top = heapq.nsmallest(count, range(total), key=primary_keys.__getitem__)
+            # Everything tied with the last selected movie may still come before it
+            threshold = primary_keys[top[-1]]
+            candidates = [position for position, key in enumerate(primary_keys)
+                          if not threshold < key]
+
+        full_keys = list(zip(map(primary_keys.__getitem__, candidates),
+                             self._tie_keys([self._movies[position] for position in candidates])))
+        order = sorted(range(len(candidates)), key=full_keys.__getitem__)
+        # Movies left out all come after the candidates, which are therefore a complete prefix
+        ordered = [candidates[index] for index in order]
+        # An other thread may have ordered further meanwhile
+        if len(ordered) > len(self._ordered):
+            self._ordered = ordered
+        return ordered
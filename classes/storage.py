@@ -0,0 +1,689 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Contain the storage engines the Repository can keep its movies in """
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping, Sequence
+from itertools import islice, repeat
+from operator import getitem, itemgetter
+from pathlib import Path
+from typing import Optional
+
+from .movie import NEW_MOVIE, NEW_RATING, Movie, Rating
+
+# Flags column layout: adult and rated bits, then one bit per genre
+ADULT_FLAG = 1
+RATED_FLAG = 2
+GENRE_SHIFT = 2
+MAX_GENRES = 64 - GENRE_SHIFT
+# Original title length telling it is the same as the primary one
+SAME_TITLE = 0xFFFF
+
+# MappedStore file layout: magic, header length, json header, then the 8 bytes aligned columns
+MAPPED_MAGIC = b"MOVIEMAP"
+MAPPED_VERSION = 2
+MAPPED_PREFIX = struct.Struct("<8sQ")
+MAPPED_ALIGNMENT = 8
+# Rows ColumnStore.add_rows converts to columns at once
+ADD_CHUNK_ROWS = 4096
+
+
+class DictStore(MutableMapping):
+    """
+    Keep one Movie object per title, the default storage engine.
+
+    It behaves like a dict[str, Movie], but also gives every uid a row number which stays the
+    same for as long as the movie is stored, so indexes can refer to movies by integers.
+    """
+
+    def __init__(self, movies: Optional[dict[str, Movie]] = None):
+        movies = movies or {}
+        self._row_ids: dict[str, int] = dict(zip(movies, range(len(movies))))
+        self._movies: list[Optional[Movie]] = list(movies.values())
+
+    def __len__(self) -> int:
+        return len(self._row_ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._row_ids)
+
+    def __contains__(self, uid: object) -> bool:
+        return uid in self._row_ids
+
+    def __getitem__(self, uid: str) -> Movie:
+        return self._movies[self._row_ids[uid]]
+
+    def __setitem__(self, uid: str, movie: Movie) -> None:
+        row = self._row_ids.get(uid)
+        if row is None:
+            self._row_ids[uid] = len(self._movies)
+            self._movies.append(movie)
+        else:
+            self._movies[row] = movie
+
+    def __delitem__(self, uid: str) -> None:
+        # The slot is left empty so the other row numbers don't move
+        self._movies[self._row_ids.pop(uid)] = None
+
+    def clear(self) -> None:
+        """ Remove every movie, row numbers start over from 0 """
+        self.__init__()
+
+    def row_id(self, uid: str) -> int:
+        """ Return the row number holding the movie """
+        return self._row_ids[uid]
+
+    def row_ids(self, uids: Iterable[str]) -> list[int]:
+        """ Return the row numbers holding each of the movies """
+        return list(map(self._row_ids.__getitem__, uids))
+
+    def movie_at(self, row: int) -> Movie:
+        """ Return the Movie stored at a row """
+        return self._movies[row]
+
+    def titles_at(self, row: int) -> tuple[str, str]:
+        """ Return the primary and original titles of the movie stored at a row """
+        movie = self._movies[row]
+        return movie.primaryTitle, movie.originalTitle
+
+    def get_rating(self, uid: str) -> Optional[Rating]:
+        """ Return the rating of a movie """
+        return self._movies[self._row_ids[uid]].rating
+
+    def set_rating(self, uid: str, rating: Optional[Rating]) -> None:
+        """ Replace the rating of a movie """
+        row = self._row_ids[uid]
+        self._movies[row] = NEW_MOVIE(self._movies[row][:-1] + (rating,))
+
+    def set_ratings(self, ratings: Iterable[Rating]) -> None:
+        """ Replace the rating of many movies """
+        row_ids, movies = self._row_ids, self._movies
+        for rating in ratings:
+            row = row_ids[rating.uid]
+            movies[row] = NEW_MOVIE(movies[row][:-1] + (rating,))
+
+    def add_rows(self, rows: Iterable[tuple]) -> None:
+        """ Add movies given as tuples of Movie fields, without comparing with the stored ones """
+        row_ids, movies = self._row_ids, self._movies
+        if not movies:
+            # An empty store numbers the rows in bulk, unless a uid turns out to be repeated
+            movies.extend(map(NEW_MOVIE, rows))
+            row_ids.update(zip(map(itemgetter(0), movies), range(len(movies))))
+            if len(row_ids) == len(movies):
+                return
+            rows = movies[:]
+            movies.clear()
+            row_ids.clear()
+        for movie in map(NEW_MOVIE, rows):
+            row = row_ids.setdefault(movie.uid, len(movies))
+            if row == len(movies):
+                movies.append(movie)
+            else:
+                movies[row] = movie
+
+    def rows(self) -> Iterator[int]:
+        """ Iterate over the row numbers of every stored movie """
+        return iter(self._row_ids.values())
+
+    def year_items(self) -> Iterator[tuple[int, int]]:
+        """ Iterate over (startYear, row) of every movie with a known startYear """
+        movies = self._movies
+        return ((int(movies[row].startYear), row) for row in self._row_ids.values()
+                if movies[row].startYear)
+
+    def rating_items(self) -> Iterator[tuple[int, float, int]]:
+        """ Iterate over (row, averageRating, numVotes) of every rated movie """
+        movies = self._movies
+        return ((row, *movies[row].rating[1:]) for row in self._row_ids.values()
+                if movies[row].rating)
+
+    def row_count(self) -> int:
+        """ Return the number of rows, the ones left empty by a removal included """
+        return len(self._movies)
+
+    def label_items(self) -> Iterator[tuple[int, list[str] | str, bool]]:
+        """ Iterate over (row, genres, isAdult) of every movie """
+        movies = self._movies
+        return ((row, movies[row].genres, movies[row].isAdult) for row in self._row_ids.values())
+
+    def to_columns(self) -> tuple:
+        """
+        Return the movies as the columns of a ColumnStore, quick to pickle and far smaller
+        than one Movie each, see from_columns. The movies are numbered again from 0 in row
+        order, and their genres come back in alphabetical order.
+        """
+        store = ColumnStore()
+        store.add_rows(map(self._movies.__getitem__, self.rows()))
+        return store.to_columns()
+
+    @classmethod
+    def from_columns(cls, columns: tuple) -> "DictStore":
+        """ Return the DictStore of the movies whose to_columns() returned columns """
+        columns_store = ColumnStore.from_columns(columns)
+        store = cls()
+        # Both stores number the rows from 0 in the same order, the uids are mapped once
+        store._row_ids = columns_store._row_ids
+        store._movies = list(map(NEW_MOVIE, columns_store.movie_rows()))
+        return store
+
+
+class ColumnStore(MutableMapping):
+    """
+    Keep movies as parallel columns instead of one Movie per title.
+
+    Every uid is given a row number and each field lives in a typed array at that row:
+
+    - startYear as an unsigned short (0 when unknown)
+    - averageRating as a float and numVotes as an unsigned int
+    - isAdult, "has a rating" and the genres packed in a single bitmask
+    - both titles encoded one after the other in a shared utf-8 buffer, the original title
+      being skipped when it is the same as the primary one
+
+    Genres come back in alphabetical order, which is the order used in the IMDB dumps.
+    It behaves like the dict[str, Movie] it replaces: a Movie is built on the fly each time
+    one is requested.
+    """
+
+    def __init__(self):
+        self._row_ids: dict[str, int] = {}
+        self._uids: list[str] = []
+        self._years = array("H")
+        self._average_ratings = array("f")
+        self._num_votes = array("I")
+        self._flags = array("Q")
+        self._genre_names: list[str] = []
+        self._genre_bits: dict[str, int] = {}
+        self._sorted_genres: list[tuple[int, str]] = []
+        self._titles = bytearray()
+        self._title_starts = array("I")
+        self._primary_lengths = array("H")
+        self._original_lengths = array("H")
+
+    def __len__(self) -> int:
+        return len(self._row_ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._row_ids)
+
+    def __contains__(self, uid: object) -> bool:
+        return uid in self._row_ids
+
+    def __getitem__(self, uid: str) -> Movie:
+        return self.movie_at(self._row_ids[uid])
+
+    def __setitem__(self, uid: str, movie: Movie) -> None:
+        self.set_fields(*movie)
+
+    def set_fields(self, uid: str, primary_title: str, original_title: str, is_adult: bool,
+                   start_year: str, genres: list[str] | str,
+                   rating: Optional[Rating] = None) -> None:
+        """ Store a movie given as its fields, no Movie needs to be built """
+        row = self._row_ids.get(uid)
+        if row is None:
+            row = self._row_ids[uid] = len(self._uids)
+            self._uids.append(uid)
+            self._years.append(0)
+            self._average_ratings.append(0)
+            self._num_votes.append(0)
+            self._flags.append(0)
+            self._title_starts.append(0)
+            self._primary_lengths.append(0)
+            self._original_lengths.append(0)
+            self._set_titles(row, primary_title, original_title)
+        elif (primary_title, original_title) != self._get_titles(row):
+            # The previous titles are left behind in the buffer, updates are rare
+            self._set_titles(row, primary_title, original_title)
+
+        flags = ADULT_FLAG if is_adult else 0
+        if genres:
+            flags |= self._genre_mask(genres)
+        self._years[row] = int(start_year) if start_year else 0
+        self._flags[row] = flags
+        self._store_rating(row, rating)
+
+    def add_rows(self, rows: Iterable[tuple]) -> None:
+        """
+        Add movies given as tuples of Movie fields, without comparing with the stored ones.
+
+        The rows are read by chunks: the fields of each new row are converted in a single pass
+        into plain lists, which then extend the arrays at once. Rows of a uid already stored
+        and ratings are applied once the chunk is stored.
+        """
+        row_ids, uids, titles = self._row_ids, self._uids, self._titles
+        rows = iter(rows)
+        # Few distinct years and genre lists: each one is converted once
+        year_values: dict[str, int] = {"": 0}
+        flag_values: dict[tuple, int] = {}
+        while chunk := list(islice(rows, ADD_CHUNK_ROWS)):
+            years, flags, title_starts, primary_lengths, original_lengths = [], [], [], [], []
+            repeated, ratings = [], []
+            try:
+                for row in chunk:
+                    uid, primary_title, original_title, is_adult, start_year, genres, rating = row
+                    if uid in row_ids:
+                        repeated.append(row)
+                        continue
+                    year = year_values.get(start_year)
+                    if year is None:
+                        year = year_values[start_year] = int(start_year)
+                    key = (is_adult, *genres)
+                    flag = flag_values.get(key)
+                    if flag is None:
+                        flag = flag_values[key] = ((ADULT_FLAG if is_adult else 0)
+                                                   | self._genre_mask(genres))
+                    row_ids[uid] = len(uids)
+                    uids.append(uid)
+                    years.append(year)
+                    flags.append(flag)
+                    if rating:
+                        ratings.append(rating)
+                    title_starts.append(len(titles))
+                    encoded = primary_title.encode("utf8")
+                    primary_lengths.append(len(encoded))
+                    titles += encoded
+                    if original_title == primary_title:
+                        original_lengths.append(SAME_TITLE)
+                    else:
+                        encoded = original_title.encode("utf8")
+                        original_lengths.append(len(encoded))
+                        titles += encoded
+            finally:
+                # The rows numbered so far get their columns even when a row can't be read
+                self._years.extend(years)
+                self._flags.extend(flags)
+                self._average_ratings.frombytes(
+                    bytes(len(years) * self._average_ratings.itemsize))
+                self._num_votes.frombytes(bytes(len(years) * self._num_votes.itemsize))
+                self._title_starts.extend(title_starts)
+                self._primary_lengths.extend(primary_lengths)
+                self._original_lengths.extend(original_lengths)
+            self.set_ratings(ratings)
+            for row in repeated:
+                self.set_fields(*row)
+
+    def get_rating(self, uid: str) -> Optional[Rating]:
+        """ Return the rating of a movie """
+        row = self._row_ids[uid]
+        if not self._flags[row] & RATED_FLAG:
+            return None
+        # Ratings have a single decimal, round away the float32 noise
+        return Rating(uid, round(self._average_ratings[row], 1), self._num_votes[row])
+
+    def set_rating(self, uid: str, rating: Optional[Rating]) -> None:
+        """ Replace the rating of a movie """
+        self._store_rating(self._row_ids[uid], rating)
+
+    def set_ratings(self, ratings: Iterable[Rating]) -> None:
+        """ Replace the rating of many movies """
+        row_ids, flags = self._row_ids, self._flags
+        average_ratings, num_votes = self._average_ratings, self._num_votes
+        for uid, average_rating, votes in ratings:
+            row = row_ids[uid]
+            flags[row] |= RATED_FLAG
+            average_ratings[row] = average_rating
+            num_votes[row] = votes
+
+    def _store_rating(self, row: int, rating: Optional[Rating]) -> None:
+        if rating:
+            self._flags[row] |= RATED_FLAG
+            self._average_ratings[row] = rating.averageRating
+            self._num_votes[row] = rating.numVotes
+        else:
+            self._flags[row] &= ~RATED_FLAG
+
+    def __delitem__(self, uid: str) -> None:
+        # The row itself stays allocated so the other row numbers don't move
+        row = self._row_ids.pop(uid)
+        self._flags[row] = 0
+
+    def clear(self) -> None:
+        """ Remove every movie, row numbers start over from 0 """
+        self.__init__()
+
+    def row_id(self, uid: str) -> int:
+        """ Return the row number holding the movie """
+        return self._row_ids[uid]
+
+    def row_ids(self, uids: Iterable[str]) -> list[int]:
+        """ Return the row numbers holding each of the movies """
+        return list(map(self._row_ids.__getitem__, uids))
+
+    def rows(self) -> Iterator[int]:
+        """ Iterate over the row numbers of every stored movie """
+        return iter(self._row_ids.values())
+
+    def year_items(self) -> Iterator[tuple[int, int]]:
+        """ Iterate over (startYear, row) of every movie with a known startYear """
+        years = self._years
+        return ((years[row], row) for row in self.rows() if years[row])
+
+    def rating_items(self) -> Iterator[tuple[int, float, int]]:
+        """ Iterate over (row, averageRating, numVotes) of every rated movie """
+        average_ratings, num_votes, flags = self._average_ratings, self._num_votes, self._flags
+        return ((row, round(average_ratings[row], 1), num_votes[row]) for row in self.rows()
+                if flags[row] & RATED_FLAG)
+
+    def row_count(self) -> int:
+        """ Return the number of rows, the ones left empty by a removal included """
+        return len(self._uids)
+
+    def label_items(self) -> Iterator[tuple[int, list[str] | str, bool]]:
+        """ Iterate over (row, genres, isAdult) of every movie """
+        flags, sorted_genres = self._flags, self._sorted_genres
+        for row in self.rows():
+            row_flags = flags[row]
+            genres = ([name for shift, name in sorted_genres if row_flags >> shift & 1]
+                      if row_flags >> GENRE_SHIFT else "")
+            yield row, genres, bool(row_flags & ADULT_FLAG)
+
+    def movie_rows(self) -> Iterator[tuple]:
+        """
+        Iterate over the fields of every movie as tuples, in row order, see add_rows.
+
+        Each field is decoded for the whole column at once, which is several times quicker
+        than a movie_at() per row. The titles are decoded as latin-1, whose characters are the
+        bytes of the buffer, so they are sliced by byte offsets, then the few which are not
+        ascii are decoded again as utf-8.
+        """
+        if len(self._row_ids) < len(self._uids):
+            # Rows left empty by a removal are skipped, movie by movie
+            return map(self.movie_at, self.rows())
+        text = str(self._titles, "latin-1")
+        primary_titles = [text[start:start + length] for start, length
+                          in zip(self._title_starts, self._primary_lengths)]
+        original_titles = [primary_title if length == SAME_TITLE
+                           else text[start + primary_length:start + primary_length + length]
+                           for primary_title, start, primary_length, length
+                           in zip(primary_titles, self._title_starts, self._primary_lengths,
+                                  self._original_lengths)]
+        if not text.isascii():
+            primary_titles, original_titles = (
+                [title if title.isascii() else title.encode("latin-1").decode("utf8")
+                 for title in titles] for titles in (primary_titles, original_titles))
+
+        # The years, the genres and the rounded ratings take few distinct values, each one is
+        # converted once
+        flags = self._flags
+        years = {year: str(year) if year else "" for year in set(self._years)}
+        genres = {flag: [name for shift, name in self._sorted_genres if flag >> shift & 1]
+                  if flag >> GENRE_SHIFT else "" for flag in set(flags)}
+        average_ratings = {value: round(value, 1) for value in set(self._average_ratings)}
+        ratings = [NEW_RATING((uid, average_ratings[average_rating], num_votes))
+                   if flag & RATED_FLAG else None for uid, average_rating, num_votes, flag
+                   in zip(self._uids, self._average_ratings, self._num_votes, flags)]
+        return zip(self._uids, primary_titles, original_titles,
+                   map(bool, map(ADULT_FLAG.__and__, flags)),
+                   map(years.__getitem__, self._years),
+                   # Each movie gets a list of its own
+                   map(getitem, map(genres.__getitem__, flags), repeat(slice(None))), ratings)
+
+    def to_columns(self) -> tuple:
+        """
+        Return the content as builtins and arrays, quick to pickle, see from_columns. The
+        rows left empty by a removal are dropped, the others being numbered again in order.
+        """
+        if len(self._row_ids) < len(self._uids):
+            store = ColumnStore()
+            store.add_rows(map(self.movie_at, self.rows()))
+            return store.to_columns()
+        return (self._uids, self._years, self._average_ratings, self._num_votes, self._flags,
+                self._genre_names, self._titles, self._title_starts, self._primary_lengths,
+                self._original_lengths)
+
+    @classmethod
+    def from_columns(cls, columns: tuple) -> "ColumnStore":
+        """ Return the ColumnStore whose to_columns() returned columns, no Movie is built """
+        store = cls()
+        (store._uids, store._years, store._average_ratings, store._num_votes, store._flags,
+         store._genre_names, store._titles, store._title_starts, store._primary_lengths,
+         store._original_lengths) = columns
+        store._row_ids = dict(zip(store._uids, range(len(store._uids))))
+        store._genre_bits = {name: bit for bit, name in enumerate(store._genre_names)}
+        store._sort_genres()
+        return store
+
+    def movie_at(self, row: int) -> Movie:
+        """ Build the Movie stored at a row """
+        uid = self._uids[row]
+        flags = self._flags[row]
+        rating = self.get_rating(uid) if flags & RATED_FLAG else None
+        genres = ""
+        if flags >> GENRE_SHIFT:
+            genres = [name for shift, name in self._sorted_genres if flags >> shift & 1]
+        year = self._years[row]
+        primary_title, original_title = self._get_titles(row)
+
+        return Movie(uid, primary_title, original_title, bool(flags & ADULT_FLAG),
+                     str(year) if year else "", genres, rating)
+
+    def titles_at(self, row: int) -> tuple[str, str]:
+        """ Return the primary and original titles of the movie stored at a row """
+        return self._get_titles(row)
+
+    def _genre_mask(self, genres: list[str]) -> int:
+        mask = 0
+        for genre in genres:
+            bit = self._genre_bits.get(genre)
+            if bit is None:
+                if len(self._genre_names) == MAX_GENRES:
+                    raise ValueError(f"ColumnStore can't hold more than {MAX_GENRES} genres.")
+                bit = self._genre_bits[genre] = len(self._genre_names)
+                self._genre_names.append(genre)
+                self._sort_genres()
+            mask |= 1 << (bit + GENRE_SHIFT)
+        return mask
+
+    def _sort_genres(self) -> None:
+        self._sorted_genres = sorted(
+            ((index + GENRE_SHIFT, name) for index, name in enumerate(self._genre_names)),
+            key=lambda item: item[1])
+
+    def _get_titles(self, row: int) -> tuple[str, str]:
+        start = self._title_starts[row]
+        end = start + self._primary_lengths[row]
+        primary_title = str(self._titles[start:end], "utf8")
+        original_length = self._original_lengths[row]
+        if original_length == SAME_TITLE:
+            return primary_title, primary_title
+        return primary_title, str(self._titles[end:end + original_length], "utf8")
+
+    def _set_titles(self, row: int, primary_title: str, original_title: str) -> None:
+        self._title_starts[row] = len(self._titles)
+        encoded = primary_title.encode("utf8")
+        self._primary_lengths[row] = len(encoded)
+        self._titles += encoded
+        if original_title == primary_title:
+            self._original_lengths[row] = SAME_TITLE
+        else:
+            encoded = original_title.encode("utf8")
+            self._original_lengths[row] = len(encoded)
+            self._titles += encoded
+
+
+class _StringColumn(Sequence):
+    """ Strings packed one after the other in a utf-8 buffer, delimited by an offset table """
+
+    def __init__(self, buffer: memoryview, offsets: memoryview):
+        self._buffer = buffer
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return str(self._buffer[self._offsets[row]:self._offsets[row + 1]], "utf8")
+
+    @staticmethod
+    def pack(strings: Iterable[str]) -> tuple[bytearray, array]:
+        """ Return the buffer and the offset table holding the strings """
+        buffer = bytearray()
+        offsets = array("I", [0])
+        for string in strings:
+            buffer += string.encode("utf8")
+            offsets.append(len(buffer))
+        return buffer, offsets
+
+
+class _SortedUids(Mapping):
+    """ Map the uids of a sorted uid column to their row number, by bisection """
+
+    def __init__(self, uids: _StringColumn):
+        self._uids = uids
+
+    def __len__(self) -> int:
+        return len(self._uids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._uids)
+
+    def __getitem__(self, uid: str) -> int:
+        row = bisect_left(self._uids, uid)
+        if row == len(self._uids) or self._uids[row] != uid:
+            raise KeyError(uid)
+        return row
+
+    def values(self) -> range:
+        return range(len(self._uids))
+
+
+class MappedStore(ColumnStore):
+    """
+    Read-only ColumnStore whose columns are memory-mapped from a file, see MappedStore.write.
+
+    Nothing is deserialized when opening: every column is a typed view over the file pages, so
+    opening costs the same whatever the number of movies, and every process mapping the same
+    file shares one copy of the catalogue in the page cache. Movies are sorted by uid in the
+    file, a uid is found by bisection instead of through a dict. The folded titles computed by
+    the Repository are stored as well, in folded_primary and folded_original, like the columns
+    of its indexes, in indexes.
+
+    Replacing the file (os.replace) is safe while it is mapped, processes keep reading the
+    version they opened until they open it again.
+    """
+
+    def __init__(self, path: Path):
+        # The columns of the parent class are all replaced, its __init__ is not needed
+        with open(path, "rb") as mapped_file:
+            self._map = mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = MAPPED_PREFIX.unpack_from(self._map)
+        if magic != MAPPED_MAGIC:
+            raise ValueError(f"{path} is not a movie map.")
+        header = json.loads(self._map[MAPPED_PREFIX.size:MAPPED_PREFIX.size + header_length])
+        if header["version"] != MAPPED_VERSION or header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written by an other version or platform.")
+
+        data = memoryview(self._map)[self._data_start(header_length):]
+        columns = {name: data[offset:offset + size].cast(typecode)
+                   for name, (offset, size, typecode) in header["columns"].items()}
+
+        self._uids = _StringColumn(columns["uids"], columns["uid_offsets"])
+        self._row_ids = _SortedUids(self._uids)
+        self._years = columns["years"]
+        self._average_ratings = columns["average_ratings"]
+        self._num_votes = columns["num_votes"]
+        self._flags = columns["flags"]
+        self._titles = columns["titles"]
+        self._title_starts = columns["title_starts"]
+        self._primary_lengths = columns["primary_lengths"]
+        self._original_lengths = columns["original_lengths"]
+        self.folded_primary = _StringColumn(columns["folded_primary"],
+                                            columns["folded_primary_offsets"])
+        self.folded_original = _StringColumn(columns["folded_original"],
+                                             columns["folded_original_offsets"])
+        self._genre_names = header["genres"]
+        self._genre_bits = {name: bit for bit, name in enumerate(self._genre_names)}
+        self._sort_genres()
+        # Columns of each index, the values which are not arrays come from the header
+        self.indexes: dict[str, tuple] = {
+            name: tuple(columns[value] if kind == "column" else value for kind, value in fields)
+            for name, fields in header["indexes"].items()}
+
+    @staticmethod
+    def _data_start(header_length: int) -> int:
+        return -(-(MAPPED_PREFIX.size + header_length) // MAPPED_ALIGNMENT) * MAPPED_ALIGNMENT
+
+    def rows(self) -> Iterator[int]:
+        """ Iterate over the row numbers of every stored movie """
+        return iter(range(len(self._uids)))
+
+    def to_columns(self) -> tuple:
+        """ Return the content as the columns of a ColumnStore, see ColumnStore.to_columns """
+        store = ColumnStore()
+        store.add_rows(self.movie_rows())
+        return store.to_columns()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("MappedStore is read-only, write a new file instead.")
+
+    __setitem__ = __delitem__ = set_fields = add_rows = set_rating = set_ratings = _read_only
+    clear = _read_only
+
+    @staticmethod
+    def write(path: Path, movies: Iterable[Movie],
+              folded_titles: Iterable[tuple[str, str]],
+              indexes: Optional[dict[str, tuple]] = None) -> None:
+        """
+        Write movies in the MappedStore format.
+
+        :param movies: Movies in increasing uid order
+        :param folded_titles: fold_title() of the primary and original titles of each movie
+        :param indexes: Columns of indexes over these rows by name, such as the to_columns() of
+        an index. Arrays and bytes are written as columns, the other values in the header.
+        :raise ValueError: if the movies are not in increasing uid order
+        """
+        store = ColumnStore()
+        previous_uid = None
+        for movie in movies:
+            if previous_uid is not None and movie.uid <= previous_uid:
+                raise ValueError("Movies must be written in increasing uid order.")
+            store[movie.uid] = movie
+            previous_uid = movie.uid
+        uids, uid_offsets = _StringColumn.pack(store._uids)
+        folded_primary, folded_original = zip(*folded_titles) if store else ((), ())
+        folded_primary, folded_primary_offsets = _StringColumn.pack(folded_primary)
+        folded_original, folded_original_offsets = _StringColumn.pack(folded_original)
+
+        columns = {
+            "uids": uids, "uid_offsets": uid_offsets,
+            "years": store._years, "average_ratings": store._average_ratings,
+            "num_votes": store._num_votes, "flags": store._flags,
+            "titles": store._titles, "title_starts": store._title_starts,
+            "primary_lengths": store._primary_lengths,
+            "original_lengths": store._original_lengths,
+            "folded_primary": folded_primary, "folded_primary_offsets": folded_primary_offsets,
+            "folded_original": folded_original, "folded_original_offsets": folded_original_offsets
+        }
+        index_fields = {}
+        for name, index_columns in (indexes or {}).items():
+            fields = index_fields[name] = []
+            for position, value in enumerate(index_columns):
+                if isinstance(value, (array, bytes, bytearray, memoryview)):
+                    columns[f"{name}/{position}"] = value
+                    fields.append(("column", f"{name}/{position}"))
+                else:
+                    fields.append(("value", value))
+        layout = {}
+        offset = 0
+        for name, column in columns.items():
+            view = memoryview(column)
+            layout[name] = (offset, view.nbytes, view.format)
+            offset += -(-view.nbytes // MAPPED_ALIGNMENT) * MAPPED_ALIGNMENT
+        header = json.dumps({"version": MAPPED_VERSION, "byteorder": sys.byteorder,
+                             "genres": store._genre_names, "columns": layout,
+                             "indexes": index_fields}).encode("utf8")
+
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "wb") as mapped_file:
+            mapped_file.write(MAPPED_PREFIX.pack(MAPPED_MAGIC, len(header)) + header)
+            for name, column in columns.items():
+                mapped_file.seek(MappedStore._data_start(len(header)) + layout[name][0])
+                mapped_file.write(column)
+            # Pad the last column, so every view falls within the file
+            mapped_file.truncate(MappedStore._data_start(len(header)) + offset)
+        os.replace(tmp_path, path)
@@ -3,7 +3,16 @@
 
 """ Import modules to the package """
 
-from .window_prompt import *
 from .print_utils import *
 from .prompt_utils import *
 from .selector_utils import *
+
+# Names of window_prompt, imported on first use only: tkinter is slow to load
+LAZY_NAMES = ("NoFileSelected", "PromptSelectionWindow")
+
+
+def __getattr__(name: str):
+    if name in LAZY_NAMES:
+        from . import window_prompt
+        return getattr(window_prompt, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
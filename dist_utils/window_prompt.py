@@ -8,7 +8,10 @@ import os
 from tkinter import filedialog
 from typing import Optional
 
-username = getpass.getuser()
+
+def default_initial_dir() -> str:
+    """ Return the Documents directory of the user, where the file dialogs start """
+    return "/home/" + getpass.getuser() + "/Documents"
 
 
 class NoFileSelected(Exception):
@@ -22,11 +25,11 @@ class PromptSelectionWindow:
     def __init__(self,
                  title: str = "Select your file",
                  extension_type: Optional[list[tuple[str, str]] | tuple] = (),
-                 initial_dir: str = "/home/" + username + "/Documents"):
+                 initial_dir: Optional[str] = None):
         self.title: str = title
         self._extension_type: Optional[list[tuple[str, str]] | tuple] = extension_type
         self.extension_type: tuple = self.get_extension_type()
-        self.initial_dir: str = initial_dir
+        self.initial_dir: str = initial_dir or default_initial_dir()
         self.full_path_to_file: str = self.open_selection_window()
 
     def get_extension_type(self):
@@ -4,3 +4,11 @@
 """ Import modules to the package """
 
 from .import_utils import *
+
+
+def __getattr__(name: str):
+    # The file dialog needs tkinter, it is only loaded on first use
+    if name == "TsvFileSelection":
+        from .file_selection import TsvFileSelection
+        return TsvFileSelection
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
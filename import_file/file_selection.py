@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" File dialog selecting IMDB dumps, only imported when an import is requested """
+
+from typing import Optional
+from dist_utils import PromptSelectionWindow
+
+
+class TsvFileSelection(PromptSelectionWindow):
+    """ Open a filedialog window to select a file and retrieve its path """
+    def __init__(self,
+                 title: Optional[str] = None,
+                 extension_type: Optional[tuple | list] = None,
+                 initial_dir: Optional[str] = None):
+        kwargs = {}
+        if title:
+            kwargs["title"] = title
+        if initial_dir:
+            kwargs["initial_dir"] = initial_dir
+
+        tsv_types = [("TSV Files (Tab)", ".tsv"), ("Compressed TSV Files", ".tsv.gz")]
+        if extension_type:
+            if isinstance(extension_type, tuple):
+                extension_type = [extension_type] + tsv_types
+            elif isinstance(extension_type, list):
+                extension_type.extend(tsv_types)
+        else:
+            extension_type = tsv_types
+        kwargs["extension_type"] = extension_type
+
+        super().__init__(**kwargs)
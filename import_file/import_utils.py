@@ -4,84 +4,361 @@
 """ Import related class and function """
 
 import csv
-from typing import Optional
+import gzip
+import io
+import os
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Optional, TextIO
 from pathlib import Path
-from dist_utils import PromptSelectionWindow, warning_msg
-from classes import Movie, Rating, Repository
-
-
-class TsvFileSelection(PromptSelectionWindow):
-    """ Open a filedialog window to select a file and retrieve its path """
-    def __init__(self,
-                 title: Optional[str] = None,
-                 extension_type: Optional[tuple | list] = None,
-                 initial_dir: Optional[str] = None):
-        kwargs = {}
-        if title:
-            kwargs["title"] = title
-        if initial_dir:
-            kwargs["initial_dir"] = initial_dir
-
-        if extension_type:
-            if isinstance(extension_type, tuple):
-                extension_type = [extension_type, ("TSV Files (Tab)", ".tsv")]
-                print(extension_type)
-            elif isinstance(extension_type, list):
-                extension_type.append(("TSV Files (Tab)", ".tsv"))
-        else:
-            extension_type = ("TSV Files (Tab)", ".tsv")
-        kwargs["extension_type"] = extension_type
-
-        super().__init__(**kwargs)
+from dist_utils import warning_msg
+from classes import NEW_RATING, MOVIE_COLUMNS, NULL, RATING_COLUMNS, ImportReport, Movie, Rating
+from classes import Credit, Person, Repository
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Size of the compressed blocks read from a .tsv.gz dump at a time
+GZIP_CHUNK_SIZE = 1024 * 1024
+# Size of the blocks of lines handed to the worker processes
+PARSE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Column which has to be in the file for each type, to detect a wrong selection
+REQUIRED_COLUMN = {Movie: "titleType", Rating: "averageRating", Credit: "category",
+                   Person: "primaryName"}
+# Name of the dump of each type, as shown to the user
+FILE_TYPES = {Movie: "TITLE BASIC", Rating: "RATING", Credit: "PRINCIPALS", Person: "NAME BASIC"}
+
+# Set in each worker process by _init_worker: (column indices, titleType index, allowed uids)
+_worker_config: Optional[tuple[list[int], Optional[int], Optional[frozenset[str]]]] = None
+
+
+def open_dump(path: str | Path) -> BinaryIO:
+    """
+    Open an IMDB dump for reading bytes, whether it is a plain .tsv or the .tsv.gz as downloaded.
+
+    Compressed files are decompressed on the fly, chunk by chunk, so the extracted text never
+    touches the disk.
+    """
+    with open(path, "rb") as probe:
+        is_gzip = probe.read(2) == GZIP_MAGIC
+
+    if is_gzip:
+        return io.BufferedReader(gzip.GzipFile(path, "rb"), buffer_size=GZIP_CHUNK_SIZE)
+
+    return open(path, "rb")
+
+
+def open_tsv(path: str | Path) -> TextIO:
+    """ Open an IMDB dump for reading text, see open_dump """
+    return io.TextIOWrapper(open_dump(path), encoding="utf8", newline="")
+
+
+def iter_line_chunks(dump: BinaryIO, chunk_size: int = PARSE_CHUNK_SIZE) -> Iterator[bytes]:
+    """ Read a dump in blocks of about chunk_size bytes, each ending on a line boundary """
+    remainder = b""
+    while block := dump.read(chunk_size):
+        block = remainder + block
+        cut = block.rfind(b"\n") + 1
+        if not cut:
+            remainder = block
+            continue
+        remainder = block[cut:]
+        yield block[:cut]
+    if remainder:
+        yield remainder
+
+
+def _init_worker(columns: list[int], type_column: Optional[int],
+                 allowed_uids: Optional[frozenset[str]]) -> None:
+    global _worker_config
+    _worker_config = (columns, type_column, allowed_uids)
+
+
+def _in_worker(function: Callable[..., Any], chunk: bytes) -> Any:
+    """ Apply function to a block of lines with the configuration of this worker process """
+    return function(chunk, *_worker_config)
+
+
+def _chunk_lines(chunk: bytes) -> list[str]:
+    """
+    Return the lines of a block of a dump. Only line feeds end a line, with the carriage return
+    before them if any: str.splitlines() would also break the titles holding U+2028, U+0085 or
+    a form feed.
+    """
+    text = chunk.decode("utf8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n")
+    lines = text.split("\n")
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _convert_chunk(chunk: bytes, columns: list[int], type_column: Optional[int],
+                   allowed_uids: Optional[frozenset[str]]) -> str:
+    """
+    Filter and project a block of tsv lines, return them as csv text.
+
+    Lines are split as plain tuples of fields: IMDB dumps don't quote anything.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for line in _chunk_lines(chunk):
+        fields = line.split("\t")
+        if type_column is not None and fields[type_column] != "movie":
+            continue
+        if allowed_uids is not None and fields[0] not in allowed_uids:
+            continue
+        writer.writerow([fields[column] for column in columns])
+    return output.getvalue()
+
+
+def convert_tsv(input_path: str | Path, output_path: str | Path,
+                obj_type: [Movie | Rating | Credit | Person],
+                allowed_uids: Optional[Iterable[str]] = None,
+                workers: Optional[int] = None) -> None:
+    """
+    Filter and project an IMDB dump into the csv file read by the Repository.
+
+    The dump is read in blocks of whole lines which are converted by a pool of worker
+    processes, the results being written back in order. At most a few blocks per worker are
+    in flight, so memory stays bounded whatever the size of the dump.
+
+    :param allowed_uids: Only keep the rows whose first field, the tconst or the nconst, is one
+    of these
+    :param workers: Number of worker processes, all the cores by default. With 1 the
+    conversion happens in this process.
+    :raise ValueError: if the dump lacks the columns expected for obj_type
+    """
+    with open_dump(input_path) as dump:
+        header = dump.readline().decode("utf8").rstrip("\r\n").split("\t")
+        if REQUIRED_COLUMN[obj_type] not in header:
+            raise ValueError(f"[{REQUIRED_COLUMN[obj_type]}] could not be found.")
+        fieldnames = [key for key in header if key in dir(obj_type) + ["tconst"]]
+        config = ([header.index(key) for key in fieldnames],
+                  header.index("titleType") if obj_type == Movie else None,
+                  None if allowed_uids is None else frozenset(allowed_uids))
+
+        with open(output_path, "w", encoding="utf8") as output_file:
+            csv.writer(output_file).writerow(fieldnames)
+            output_file.writelines(map_chunks(dump, _convert_chunk, config, workers))
+
+
+def map_chunks(dump: BinaryIO, function: Callable[..., Any], config: tuple,
+               workers: Optional[int] = None) -> Iterator[Any]:
+    """
+    Apply function to each block of lines of a dump followed by config, yield the results
+    in order.
+
+    The blocks are handed to a pool of worker processes, each one receiving config once. At
+    most a few blocks per worker are in flight, so memory stays bounded whatever the size of
+    the dump. With a single worker, everything happens in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in iter_line_chunks(dump):
+            yield function(chunk, *config)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=config) as executor:
+        pending = deque()
+        for chunk in iter_line_chunks(dump):
+            pending.append(executor.submit(_in_worker, function, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _parse_movie_chunk(chunk: bytes, columns: list[int], type_column: int, _) -> list[tuple]:
+    """
+    Return the movies of a block of title.basics lines as tuples of Movie fields without
+    rating, parsed like Repository.read_movie_rows parses title_basic.csv.
+    """
+    uid, primary_title, original_title, is_adult, start_year, genres = columns
+    movies = []
+    for line in _chunk_lines(chunk):
+        fields = line.split("\t")
+        if fields[type_column] != "movie":
+            continue
+        year = fields[start_year]
+        genre_list = fields[genres]
+        movies.append((fields[uid], fields[primary_title], fields[original_title],
+                       fields[is_adult] == "1", "" if year == NULL else year,
+                       genre_list.split(",") if genre_list and genre_list != NULL else ""))
+    return movies
+
+
+def _parse_rating_chunk(chunk: bytes, columns: list[int], *_) -> list[Rating]:
+    """ Return the ratings of a block of title.ratings lines """
+    uid, average_rating, num_votes = columns
+    ratings = []
+    for line in _chunk_lines(chunk):
+        fields = line.split("\t")
+        ratings.append(NEW_RATING((fields[uid], float(fields[average_rating]),
+                                   int(fields[num_votes]))))
+    return ratings
+
+
+def _read_dump(dump: BinaryIO, obj_type: [Movie | Rating],
+               workers: Optional[int] = None) -> Iterator[tuple]:
+    """ Yield the parsed rows of an IMDB dump of obj_type, its header being read first """
+    header = dump.readline().decode("utf8").rstrip("\r\n").split("\t")
+    columns = MOVIE_COLUMNS if obj_type == Movie else RATING_COLUMNS
+    missing = [key for key in (*columns, REQUIRED_COLUMN[obj_type]) if key not in header]
+    if missing:
+        raise ValueError(f"[{missing[0]}] could not be found.")
+    config = ([header.index(key) for key in columns],
+              header.index("titleType") if obj_type == Movie else None, None)
+    function = _parse_movie_chunk if obj_type == Movie else _parse_rating_chunk
+    for rows in map_chunks(dump, function, config, workers):
+        yield from rows
+
+
+def _tconst_number(uid: str) -> int:
+    """ Return the number of a tconst, "tt0000012" giving 12, the order of the dumps """
+    return int(uid[2:])
+
+
+def join_ratings(movies: Iterable[tuple], ratings: Iterable[Rating]) -> Iterator[tuple]:
+    """
+    Yield the movies with their rating appended, or None if they have none.
+
+    Both are streamed side by side like in a merge join, which requires them to be sorted by
+    tconst number as in the IMDB dumps: memory stays constant whatever their size.
+
+    :raise ValueError: if either is not sorted
+    """
+    ratings = iter(ratings)
+    rating = next(ratings, None)
+    rating_number = -1 if rating is None else _tconst_number(rating.uid)
+    previous_number = -1
+    for movie in movies:
+        number = _tconst_number(movie[0])
+        if number <= previous_number:
+            raise ValueError(f"[{movie[0]}] is out of order, the titles must be sorted.")
+        previous_number = number
+        while rating is not None and rating_number < number:
+            rating = next(ratings, None)
+            if rating is not None:
+                next_number = _tconst_number(rating.uid)
+                if next_number <= rating_number:
+                    raise ValueError(f"[{rating.uid}] is out of order, the ratings must be "
+                                     f"sorted.")
+                rating_number = next_number
+        yield (*movie, rating if rating_number == number else None)
+
+
+def read_dump_rows(basics_path: str | Path, ratings_path: Optional[str | Path] = None,
+                   workers: Optional[int] = None) -> Iterator[tuple]:
+    """
+    Yield the movies of a title.basics dump (.tsv or .tsv.gz) as tuples of Movie fields,
+    their rating joined from a title.ratings dump as both are read, in a single pass.
+
+    The basics are parsed by worker processes, see map_chunks, the ratings in this process.
+
+    :raise ValueError: if a dump lacks the expected columns or is not sorted by tconst
+    """
+    with open_dump(basics_path) as basics_dump:
+        movies = _read_dump(basics_dump, Movie, workers)
+        if ratings_path is None:
+            yield from ((*movie, None) for movie in movies)
+            return
+        with open_dump(ratings_path) as ratings_dump:
+            yield from join_ratings(movies, _read_dump(ratings_dump, Rating, 1))
+
+
+def import_dumps(repository: Repository, basics_path: str | Path,
+                 ratings_path: Optional[str | Path] = None, workers: Optional[int] = None,
+                 save: bool = True) -> ImportReport:
+    """
+    Fill the repository straight from the IMDB dumps, without writing the csv files.
+
+    An empty repository is loaded in bulk, otherwise only the movies which changed are
+    applied, see Repository.update_rows. The snapshot is written afterwards if save.
+
+    :raise ValueError: if a dump lacks the expected columns or is not sorted by tconst
+    """
+    rows = read_dump_rows(basics_path, ratings_path, workers)
+    if repository.movies:
+        report = repository.update_rows(rows)
+    else:
+        repository.import_rows(rows)
+        report = ImportReport(inserted=len(repository.movies))
+    if save:
+        repository.save_snapshot()
+    return report
+
+
+def allowed_uids_of(obj_type: [Movie | Rating | Credit | Person],
+                    repository: Optional[Repository]) -> Optional[Iterable[str]]:
+    """
+    Return the uids of the rows of a dump of obj_type worth keeping: ratings and credits of the
+    movies of the repository, names of the people it credits. None keeps every row.
+    """
+    if repository is None or obj_type == Movie:
+        return None
+    if obj_type == Person:
+        return repository.credits.person_uids()
+    return repository.movies
 
 
 def import_and_convert_tsv(
-        filename: str, obj_type: [Movie | Rating],
-        repository: Optional[Repository] = None) -> None:
+        filename: str, obj_type: [Movie | Rating | Credit | Person],
+        repository: Optional[Repository] = None,
+        workers: Optional[int] = None) -> None:
     """
-    Import raw basic title data from IMBD then:
+    Import raw basic title data from IMBD (.tsv or .tsv.gz) then:
 
-    - Filters only movies
-    - Selects only the fields relevant to Movie
+    - Filters only movies, or the rows about the movies and people of the repository
+    - Selects only the fields relevant to obj_type
     - Write into csv file
 
+    The dump is streamed, a title.principals of tens of millions of rows only leaves the
+    credits of the movies. The conversion runs on all the cores unless workers says
+    otherwise, see convert_tsv.
+
     :return:
     """
-    file_type = "TITLE BASIC" if obj_type == Movie else "RATING"
+    from .file_selection import TsvFileSelection
+
+    file_type = FILE_TYPES[obj_type]
     prompt_message = "Please select a " + file_type + " file"
 
-    with open(TsvFileSelection(prompt_message).full_path_to_file, encoding="utf8") as input_file:
-        reader = csv.DictReader(input_file, delimiter='\t')
-        fieldnames = [key for key in reader.fieldnames if key in dir(obj_type) + ["tconst"]]
+    try:
+        convert_tsv(TsvFileSelection(prompt_message).full_path_to_file,
+                    Path(__file__).parent.parent.joinpath('data', filename), obj_type,
+                    allowed_uids=allowed_uids_of(obj_type, repository),
+                    workers=workers)
+    except ValueError as error:
+        print(warning_msg(f"Looks like you selected the wrong file. {error}"))
+        import_and_convert_tsv(filename, obj_type, repository, workers)
+        return
 
-        if "titleType" not in reader.fieldnames and obj_type == Movie:
-            print(warning_msg(
-                "Looks like you selected the wrong file. [titleType] could not be found."))
-            import_and_convert_tsv(filename=filename, obj_type=obj_type)
-            return
+    print("Successfully imported the " + file_type + " file.")
 
-        if "averageRating" not in reader.fieldnames and obj_type == Rating:
-            print(warning_msg(
-                "Looks like you selected the wrong file. [averageRating] could not be found."))
-            import_and_convert_tsv(filename=filename, obj_type=obj_type)
-            return
 
-        with open(Path(__file__).parent.parent.joinpath('data', filename), "w",
-                  encoding="utf8") as output_file:
-            writer = csv.DictWriter(output_file, fieldnames, extrasaction="ignore")
-            writer.writeheader()
-
-            for row in reader:
-                # Filter for Movie:
-                if obj_type == Movie:
-                    if not row.get("titleType") == "movie":
-                        continue
-                elif obj_type == Rating:
-                    if row.get("tconst") not in repository.movies:
-                        continue
-                writer.writerow(row)
+def import_and_join_tsv(repository: Repository, workers: Optional[int] = None) -> None:
+    """
+    Import raw basic title and rating data from IMDB (.tsv or .tsv.gz) straight into the
+    repository, in a single pass joining the ratings to the movies, then save the snapshot.
+    See import_dumps.
+    """
+    from .file_selection import TsvFileSelection
+
+    basics_path = TsvFileSelection("Please select a TITLE BASIC file").full_path_to_file
+    ratings_path = TsvFileSelection("Please select a RATING file").full_path_to_file
+
+    try:
+        report = import_dumps(repository, basics_path, ratings_path, workers)
+    except ValueError as error:
+        print(warning_msg(f"Looks like you selected the wrong file. {error}"))
+        import_and_join_tsv(repository, workers)
+        return
+
+    print(f"Successfully imported the TITLE BASIC and RATING files: {report}.")
 
-    print("Successfully imported the " + file_type + " file.")
 
 if __name__ == "__main__":
     import_and_convert_tsv("title_basic.csv", Movie)
@@ -1,55 +1,149 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-""" Main file. Run from here. """
+"""
+Main file. Run from here.
+
+Without arguments the interactive search starts. Otherwise:
+
+- query: run a single search described by options and print the result
+- batch: run one search per line of a file (or stdin), loading the repository once
+- suggest: complete the start of a title with the most voted movies
+- fuzzy: search a title despite typos
+- serve: answer searches as JSON over HTTP, see service.SearchServer
+"""
+import argparse
+import json
 import logging
-from typing import Optional
+import shlex
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from typing import Optional, TextIO
 import dist_utils
-import import_file
-from classes import Repository, Movie, Rating
+from classes import Repository, Rating, Query, GENRE_MODES, SORT_ORDERS, parse_bounds
+from classes import CREDITS_PATH, PEOPLE_PATH, Credit, Person
+from classes import FUZZY_MAX_DISTANCE, TitleCriteria
+from classes import PROFILER, cprofiled, json_lines_writer, summary_printer
 
 logging.basicConfig(level=logging.DEBUG)
 
 repository = Repository()
+# Load of the repository running in the background, see init_repository
+loading: Optional[Future] = None
 
 
-def init_repository() -> None:
-    """ Load data from csv file into the repository. Alert if no data present. """
+def load_repository(mapped: bool = False) -> Repository:
+    """
+    Return a new repository, opened from the memory-mapped catalogue if mapped, otherwise
+    loaded from the snapshot, or from the csv files in which case the snapshot is saved. The
+    catalogue is saved as well if mapped.
+    """
+
+    loaded = Repository()
+    if mapped and loaded.load_mapped():
+        return loaded
+    if not loaded.load_snapshot():
+        import_csv_files(loaded)
+        if loaded.movies:
+            loaded.save_snapshot()
+    if mapped and loaded.movies:
+        loaded.save_mapped()
+    return loaded
+
+
+def import_csv_files(loaded: Repository) -> None:
+    """ Fill a repository from the csv files, the cast and crew only if they were imported. """
+
+    loaded.import_movies()
+    loaded.import_ratings()
+    if CREDITS_PATH.exists():
+        loaded.import_credits()
+        if PEOPLE_PATH.exists():
+            loaded.import_people()
 
-    repository.import_movies()
-    repository.import_ratings()
+
+def init_repository() -> None:
+    """
+    Start loading data into the repository on a background thread, from the binary snapshot
+    when it is up to date or from the csv files otherwise, so that the first prompts are
+    answered while it loads. See wait_repository.
+    """
+
+    global loading
+    executor = ThreadPoolExecutor(1, thread_name_prefix="repository-load")
+    loading = executor.submit(load_repository)
+    executor.shutdown(wait=False)
+
+
+def wait_repository(offer_import: bool = True) -> None:
+    """
+    Wait for the load started by init_repository, if it is still running, and search the
+    repository it loaded. Alert if no data present, and offer to import some if offer_import.
+    """
+
+    global repository, loading
+    if loading is None:
+        return
+    if not loading.done():
+        print("Loading the movies...")
+    repository = loading.result()
+    loading = None
 
     if not repository.movies:
         print(dist_utils.msg_box("You movie repository is empty. You will need to import data."))
+        if offer_import:
+            update_databases()
 
 
 def database_upgrade() -> None:
     """ Offers the user to proceed to a database upgrade. """
 
-    # Database update
-    update_database = dist_utils.ask_yes_no("Do you wish to update the databases?")
-    if update_database or not repository.movies:
-        dist_utils.multiline_msg_box([
-            "All databases are found at: https://datasets.imdbws.com/.",
-            "DB used for base movie: title.basics.tsv.gz.",
-            "DB used for ratings: title.ratings.tsv.gz",
-            "You will need to extract the .tsv file first.",
-            "NOTE: Base movie should be imported first.",
-            "NOTE: If you import a new movie DB you need to update the rating."
-            ])
-        import_answer_choices = ["Base Movie", "Rating", "Cancel"]
-        import_answer = dist_utils.ask_selection(
-            "What database would you like to update?",
-            dist_utils.generate_answer_selector(import_answer_choices),
-            dist_utils.generate_answer_selector_description(import_answer_choices)
-        )
-        if import_answer != "Cancel":
-            if import_answer == "Base Movie":
-                import_file.import_and_convert_tsv("title_basic.csv", Movie)
-                repository.import_movies()
-            if import_answer in ["Base Movie", "Rating"]:
-                import_file.import_and_convert_tsv("rating.csv", Rating, repository)
-                repository.import_ratings()
+    if dist_utils.ask_yes_no("Do you wish to update the databases?"):
+        wait_repository(offer_import=False)
+        update_databases()
+
+
+def update_databases() -> None:
+    """ Let the user select the IMDB dumps to import, then update the repository from them. """
+
+    # The file dialogs are only loaded now, they need a display
+    import import_file
+
+    dist_utils.multiline_msg_box([
+        "All databases are found at: https://datasets.imdbws.com/.",
+        "DB used for base movie: title.basics.tsv.gz.",
+        "DB used for ratings: title.ratings.tsv.gz",
+        "DB used for cast and crew: title.principals.tsv.gz, then name.basics.tsv.gz",
+        "You can select the .tsv.gz file directly, no need to extract it.",
+        "NOTE: Base movie imports both files at once, in a single pass.",
+        "NOTE: Rating and Cast and Crew need the base movie to be imported first."
+        ])
+    import_answer_choices = ["Base Movie", "Rating", "Cast and Crew", "Cancel"]
+    import_answer = dist_utils.ask_selection(
+        "What database would you like to update?",
+        dist_utils.generate_answer_selector(import_answer_choices),
+        dist_utils.generate_answer_selector_description(import_answer_choices)
+    )
+    if import_answer == "Base Movie":
+        # Ratings are joined to the movies as both dumps are read, no csv is written
+        import_file.import_and_join_tsv(repository)
+    if import_answer == "Rating":
+        import_file.import_and_convert_tsv("rating.csv", Rating, repository)
+        # An existing repository only receives what changed since the previous dump
+        if repository.movies:
+            print(f"Ratings: {repository.update_ratings()}.")
+        else:
+            repository.import_ratings()
+        repository.save_snapshot()
+    if import_answer == "Cast and Crew":
+        # Only the credits of the movies are kept, then only the names of the people credited
+        import_file.import_and_convert_tsv("principals.csv", Credit, repository)
+        repository.import_credits()
+        import_file.import_and_convert_tsv("name_basic.csv", Person, repository)
+        repository.import_people()
+        repository.save_snapshot()
 
 
 def ask_search_type(search_type_choices: list[str]) -> list[str]:
@@ -79,12 +173,12 @@ def ask_search_type(search_type_choices: list[str]) -> list[str]:
     return selected_search_types
 
 
-def ask_title(result: Optional[list[Movie]] = None) -> list[Movie]:
-    """ Ask for information contained in the title and return corresponding movies. """
+def ask_title(query: Query) -> None:
+    """ Ask for information contained in the title and add it to the query. """
 
     title_string = input(
         "Please enter the [Title] (or part of it) of the movie(s) you are searching for.\n")
-    return repository.search_title(title_string, result)
+    query.title(title_string, normalized=True)
 
 
 def define_boundary(criteria: str,
@@ -108,37 +202,92 @@ def define_boundary(criteria: str,
     return _min, _max
 
 
-def ask_year(result: Optional[list[Movie]] = None) -> list[Movie]:
-    """ Ask criteria for year search. Return movie list. """
+def ask_person(query: Query) -> None:
+    """ Ask for someone of the cast or crew, and their role, and add it to the query. """
+
+    if not repository.credits:
+        print(dist_utils.warning_msg("No cast and crew imported, update the databases first."))
+    name = input("Please enter the name (or part of it) of the [Person] you are searching for.\n")
+    role_choices = ["Any role"] + sorted(repository.credits.categories)
+    selected_role = dist_utils.ask_selection(
+        "What role did they have in the movie(s)?",
+        dist_utils.generate_answer_selector(role_choices),
+        dist_utils.generate_answer_selector_description(role_choices)
+    )
+    query.person(name, None if selected_role == "Any role" else [selected_role])
+
+
+def ask_year(query: Query) -> None:
+    """ Ask criteria for year search and add it to the query. """
 
     min_year, max_year = define_boundary("Year", int)
-    return repository.search_year(min_year, max_year, result)
+    query.year(min_year, max_year)
 
 
-def ask_rating(result: Optional[list[Movie]] = None) -> list[Movie]:
-    """ Ask criteria for rating search. Return movie list. """
+def ask_rating(query: Query) -> None:
+    """ Ask criteria for rating search and add it to the query. """
 
     min_rating, max_rating = define_boundary("Rating", float)
-    return repository.search_rating(min_rating, max_rating, result)
+    query.rating(min_rating, max_rating)
+
+
+def ask_votes(query: Query) -> None:
+    """ Ask criteria for number of votes search and add it to the query. """
+
+    min_votes, max_votes = define_boundary("Votes", int)
+    query.votes(min_votes, max_votes)
+
+
+def ask_genre(query: Query) -> None:
+    """ Ask the genres to look for, and how to combine them, and add them to the query. """
+
+    known_genres = {genre.casefold(): genre for genre in repository.genres()}
+    print("Available genres: " + ", ".join(known_genres.values()))
+    while True:
+        answer = input("Please enter the [Genre](s) you are searching for, separated by commas.\n")
+        names = [name.strip().casefold() for name in answer.split(",") if name.strip()]
+        unknown = [name for name in names if name not in known_genres]
+        if names and not unknown:
+            break
+        print(dist_utils.warning_msg(f"Unknown genre: {', '.join(unknown) or 'none given'}"))
+
+    genre_modes = ["Any of them", "Every one of them", "None of them"]
+    selected_mode = dist_utils.ask_selection(
+        "Movies should have:",
+        dist_utils.generate_answer_selector(genre_modes),
+        dist_utils.generate_answer_selector_description(genre_modes)
+    )
+    mode = {"Any of them": "any", "Every one of them": "all", "None of them": "none"}
+    query.genre([known_genres[name] for name in names], mode[selected_mode])
+
 
+def ask_adult(query: Query) -> None:
+    """ Ask whether adult movies are excluded or the only ones wanted, and add it to the query. """
 
-def select_quicksort(selected_search_types: list[str]) -> tuple[str, str]:
-    """ Ask user the criteria to sort result by.  """
-    selected_sort_type = selected_search_types[0]
+    adult_choices = ["Exclude adult movies", "Only adult movies"]
+    selected_choice = dist_utils.ask_selection(
+        "What do you want to do with [Adult] movies?",
+        dist_utils.generate_answer_selector(adult_choices),
+        dist_utils.generate_answer_selector_description(adult_choices)
+    )
+    query.adult(selected_choice == "Only adult movies")
+
+
+def select_sort(selected_search_types: list[str]) -> list[tuple[str, bool]]:
+    """ Ask user the criteria to sort result by. Return the sort keys, most significant first. """
+    sort_types = ["Title", "Year", "Rating", "Weighted", "Votes"]
+    # Person, Genre and Adult can't order the result, Title is used when they are the only criteria
+    selected_sort_types = [search_type for search_type in selected_search_types
+                           if search_type in sort_types] or ["Title"]
+    selected_sort_type = selected_sort_types[0]
     if len(selected_search_types) > 1:
-        sort_types = ["Title", "Year", "Rating"]
         selected_sort_type = dist_utils.ask_selection(
             "How do you want to sort your result?",
             dist_utils.generate_answer_selector(sort_types),
             dist_utils.generate_answer_selector_description(sort_types)
         )
 
-    type_to_attribute = {
-        "Title": "primaryTitle",
-        "Year": "startYear",
-        "Rating": "averageRating"
-    }
-    return selected_sort_type, type_to_attribute[selected_sort_type]
+    return SORT_ORDERS[selected_sort_type.lower()]
 
 
 def movie_search():
@@ -149,29 +298,58 @@ def movie_search():
 
     keep_searching = True
     while keep_searching:
-        search_type_choices = ["Title", "Year", "Rating"]
+        search_type_choices = ["Title", "Person", "Year", "Rating", "Votes", "Genre", "Adult"]
         selected_search_types = ask_search_type(search_type_choices)
+        wait_repository()
 
-        result = []
+        # The query evaluates the criteria in the most efficient order, not this one
+        query = Query(repository)
         if "Title" in selected_search_types:
-            result = ask_title(result)
+            ask_title(query)
+
+        if "Person" in selected_search_types:
+            ask_person(query)
 
         if "Year" in selected_search_types:
-            result = ask_year(result)
+            ask_year(query)
 
         if "Rating" in selected_search_types:
-            result = ask_rating(result)
+            ask_rating(query)
+
+        if "Votes" in selected_search_types:
+            ask_votes(query)
 
-        selected_sort_type, sort_attribute = select_quicksort(selected_search_types)
-        Repository.quicksort(result, sort_attribute, selected_sort_type == "Rating")
+        if "Genre" in selected_search_types:
+            ask_genre(query)
+
+        if "Adult" in selected_search_types:
+            ask_adult(query)
+
+        sort_keys = select_sort(selected_search_types)
+        with PROFILER.trace("search", types=selected_search_types) as trace:
+            result = query.paginate(sort_keys, page_size=10)
+            trace.rows = len(result)
 
         if result:
-            for i, movie in enumerate(result):
-                print(movie)
-                if (i + 1) % 10 == 0:
+            # Pages are only ordered when they are reached
+            for page_number in range(result.page_count):
+                with PROFILER.trace("page", number=page_number) as trace:
+                    page = result.page(page_number)
+                    trace.rows = len(page)
+                    with PROFILER.stage("print"):
+                        for movie in page:
+                            print(movie)
+                if page_number + 1 < result.page_count:
                     dist_utils.press_to_continue()
         else:
             print("Sorry, no movie was found.")
+            titles = [criteria.title for criteria in query.criteria
+                      if isinstance(criteria, TitleCriteria)]
+            close_matches = repository.fuzzy_search(titles[0], count=5) if titles else []
+            if close_matches:
+                print("Maybe you meant one of these titles:")
+                for movie, _ in close_matches:
+                    print(f"- {movie.primaryTitle} ({movie.startYear or 'UNKNOWN'})")
             dist_utils.press_to_continue()
 
         keep_searching = dist_utils.ask_yes_no("Do you wish to make another search?")
@@ -179,6 +357,260 @@ def movie_search():
     print("Thank you for using Movie Search!")
 
 
+class QueryArgumentParser(argparse.ArgumentParser):
+    """ ArgumentParser raising ValueError instead of exiting, so a bad batch line is skipped """
+    def error(self, message: str):
+        raise ValueError(message)
+
+
+def year_bounds(text: str) -> tuple[Optional[int], Optional[int]]:
+    """ Parse year boundaries from the command line. """
+    return parse_bounds(text, int)
+
+
+def rating_bounds(text: str) -> tuple[Optional[float], Optional[float]]:
+    """ Parse rating boundaries from the command line. """
+    return parse_bounds(text, float)
+
+
+def votes_bounds(text: str) -> tuple[Optional[int], Optional[int]]:
+    """ Parse number of votes boundaries from the command line. """
+    return parse_bounds(text, int)
+
+
+def genre_list(text: str) -> list[str]:
+    """ Parse comma separated genres from the command line. """
+    return [genre.strip() for genre in text.split(",") if genre.strip()]
+
+
+def role_list(text: str) -> list[str]:
+    """ Parse comma separated roles from the command line. """
+    return [role.strip().lower() for role in text.split(",") if role.strip()]
+
+
+def add_query_arguments(parser: argparse.ArgumentParser) -> None:
+    """ Add the options describing a search to a parser. """
+
+    parser.add_argument("--title", help="Part of the title, accent and case insensitive")
+    parser.add_argument("--exact-title", action="store_true",
+                        help="Make the title match accent and case sensitive")
+    parser.add_argument("--person", help="Part of the name of someone of the cast or crew")
+    parser.add_argument("--role", type=role_list,
+                        help="Comma separated roles of the person, such as actor,director")
+    parser.add_argument("--year", type=year_bounds,
+                        help="Year boundaries as min:max, min:, :max or a single year")
+    parser.add_argument("--rating", type=rating_bounds,
+                        help="Rating boundaries as min:max, min:, :max or a single rating")
+    parser.add_argument("--votes", type=votes_bounds,
+                        help="Number of votes boundaries as min:max, min:, :max or a single value")
+    parser.add_argument("--weighted-rating", type=rating_bounds,
+                        help="Weighted rating boundaries, the rating corrected by its votes")
+    parser.add_argument("--genre", type=genre_list,
+                        help="Comma separated genres, as written in the IMDB datasets")
+    parser.add_argument("--genre-mode", choices=list(GENRE_MODES), default="any",
+                        help="Whether movies have any, all or none of the genres")
+    parser.add_argument("--adult", choices=["exclude", "only"],
+                        help="Exclude adult movies, or keep only them")
+    parser.add_argument("--sort", choices=list(SORT_ORDERS), default="title")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--offset", type=int, default=0)
+
+
+def build_query(args: argparse.Namespace) -> Query:
+    """ Translate parsed query options into a Query. """
+
+    query = Query(repository)
+    if args.title is not None:
+        query.title(args.title, normalized=not args.exact_title)
+    if args.person is not None:
+        query.person(args.person, args.role)
+    if args.year is not None:
+        query.year(*args.year)
+    if args.rating is not None:
+        query.rating(*args.rating)
+    if args.votes is not None:
+        query.votes(*args.votes)
+    if args.weighted_rating is not None:
+        query.weighted_rating(*args.weighted_rating)
+    if args.genre is not None:
+        query.genre(args.genre, args.genre_mode)
+    if args.adult is not None:
+        query.adult(args.adult == "only")
+    return query
+
+
+def write_result(args: argparse.Namespace, output_format: str, output: TextIO,
+                 extra: Optional[dict] = None) -> None:
+    """ Run the search described by args and write the requested slice of the result. """
+
+    with PROFILER.trace("query", **(extra or {})) as trace:
+        result = build_query(args).paginate(SORT_ORDERS[args.sort], page_size=args.limit)
+        trace.rows = len(result)
+        movies = result.slice(args.offset, args.offset + args.limit)
+        with PROFILER.stage("print") as stage:
+            for movie in movies:
+                if output_format == "jsonl":
+                    output.write(json.dumps({**(extra or {}), **movie.to_dict()},
+                                            ensure_ascii=False))
+                    output.write("\n")
+                else:
+                    output.write(str(movie) + "\n")
+            output.flush()
+            stage.rows = len(movies)
+
+
+def query_command(args: argparse.Namespace) -> int:
+    """ Run a single search from the command line. """
+
+    write_result(args, args.format, sys.stdout)
+    return 0
+
+
+def suggest_command(args: argparse.Namespace) -> int:
+    """ Print the most voted movies whose title starts with the prefix. """
+
+    for movie in repository.suggest(args.prefix, args.limit):
+        if args.format == "jsonl":
+            sys.stdout.write(json.dumps(movie.to_dict(), ensure_ascii=False) + "\n")
+        else:
+            sys.stdout.write(str(movie) + "\n")
+    return 0
+
+
+def fuzzy_command(args: argparse.Namespace) -> int:
+    """ Print the movies whose title best matches despite typos, the fewest edits first. """
+
+    for movie, distance in repository.fuzzy_search(args.title, args.distance, args.limit):
+        if args.format == "jsonl":
+            sys.stdout.write(json.dumps({"distance": distance, **movie.to_dict()},
+                                        ensure_ascii=False) + "\n")
+        else:
+            sys.stdout.write(f"# {distance} edit(s)\n{movie}\n")
+    return 0
+
+
+def batch_command(args: argparse.Namespace) -> int:
+    """ Run one search per line of the input, each line holding the options of a query. """
+
+    line_parser = QueryArgumentParser(prog="batch line", add_help=False)
+    add_query_arguments(line_parser)
+    failures = 0
+    with (sys.stdin if args.input == "-" else open(args.input, encoding="utf8")) as input_file:
+        for line_number, line in enumerate(input_file, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                line_args = line_parser.parse_args(shlex.split(line))
+            except ValueError as error:
+                print(f"Line {line_number}: {error}", file=sys.stderr)
+                failures += 1
+                continue
+            if args.format == "text":
+                sys.stdout.write(f"# {line_number}: {line.strip()}\n")
+            write_result(line_args, args.format, sys.stdout, {"query": line_number})
+    logging.info("Query cache: %s", repository.cache_info())
+    return 1 if failures else 0
+
+
+def serve_command(args: argparse.Namespace) -> int:
+    """ Serve searches over HTTP until interrupted, reloading the data after each import. """
+
+    # asyncio and the server are only loaded by this command
+    import service
+
+    service.run_server(partial(load_repository, args.mapped), args.host, args.port,
+                       args.workers, args.max_pending)
+    return 0
+
+
+def main(argv: list[str]) -> int:
+    """ Dispatch the command line to the interactive search or a non-interactive mode. """
+
+    parser = argparse.ArgumentParser(description="Search movies from the IMDB datasets.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    query_parser = subparsers.add_parser("query", help="Run a single search")
+    add_query_arguments(query_parser)
+    query_parser.set_defaults(handler=query_command)
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Run one search per line of a file, each line holding query options")
+    batch_parser.add_argument("input", nargs="?", default="-",
+                              help="File holding the queries, stdin by default")
+    batch_parser.set_defaults(handler=batch_command)
+
+    suggest_parser = subparsers.add_parser(
+        "suggest", help="Complete the start of a title, the most voted movies first")
+    suggest_parser.add_argument("prefix", help="Start of the title, accent and case insensitive")
+    suggest_parser.add_argument("--limit", type=int, default=10)
+    suggest_parser.set_defaults(handler=suggest_command)
+
+    fuzzy_parser = subparsers.add_parser(
+        "fuzzy", help="Search a title despite typos, the closest matches first")
+    fuzzy_parser.add_argument("title", help="Words of the title, possibly misspelled")
+    fuzzy_parser.add_argument("--distance", type=int, default=FUZZY_MAX_DISTANCE,
+                              help="Most edits allowed in each word")
+    fuzzy_parser.add_argument("--limit", type=int, default=10)
+    fuzzy_parser.set_defaults(handler=fuzzy_command)
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve searches as JSON over HTTP, see service.SearchServer")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--workers", type=int, default=4,
+                              help="Number of threads running the searches")
+    serve_parser.add_argument("--max-pending", type=int, default=64,
+                              help="Searches accepted at the same time, the next ones get a 503")
+    serve_parser.set_defaults(handler=serve_command)
+
+    for subparser in [query_parser, batch_parser, suggest_parser, fuzzy_parser]:
+        subparser.add_argument("--format", choices=["text", "jsonl"], default="text")
+    for subparser in [query_parser, batch_parser, suggest_parser, fuzzy_parser, serve_parser]:
+        subparser.add_argument("--mapped", action="store_true",
+                               help="Open the memory-mapped catalogue, shared between processes")
+
+    parser.add_argument("--profile", action="store_true",
+                        help="Print the time and rows of each stage after every search")
+    parser.add_argument("--profile-log", metavar="FILE",
+                        help="Append the timings of every search and import as json lines")
+    parser.add_argument("--cprofile", metavar="FILE",
+                        help="Run under cProfile, then dump the statistics to FILE, or print "
+                             "the most expensive functions to stderr if FILE is -")
+
+    args = parser.parse_args(argv)
+    with ExitStack() as stack:
+        if args.profile:
+            PROFILER.enable(summary_printer())
+        if args.profile_log:
+            profile_log = stack.enter_context(open(args.profile_log, "a", encoding="utf8"))
+            PROFILER.enable(json_lines_writer(profile_log))
+        if args.profile or args.profile_log:
+            # Stop before the log is closed
+            stack.callback(PROFILER.disable)
+        if args.cprofile is not None:
+            stack.enter_context(cprofiled(None if args.cprofile == "-" else args.cprofile))
+        return run_command(args)
+
+
+def run_command(args: argparse.Namespace) -> int:
+    """ Run the interactive search or the subcommand of the parsed command line. """
+
+    if args.command is None:
+        movie_search()
+        return 0
+
+    if args.command == "serve":
+        return args.handler(args)
+
+    global repository
+    repository = load_repository(args.mapped)
+    if not repository.movies:
+        print("The movie repository is empty, run the interactive mode to import data.",
+              file=sys.stderr)
+        return 1
+    return args.handler(args)
+
+
 # Press the green button in the gutter to run the script.
 if __name__ == '__main__':
-    movie_search()
+    sys.exit(main(sys.argv[1:]))
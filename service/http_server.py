@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+HTTP/JSON search service, serving one Repository to many clients
+
+- GET /search: run a search, the parameters being the options of main.py query
+- GET /suggest: complete the start of a title, parameters prefix and limit
+- GET /fuzzy: search a title despite typos, parameters title, distance and limit
+- GET /credits: cast and crew of a movie, parameter uid
+- GET /health: number of movies, cache statistics and load time of the repository
+- POST /reload: load the repository again
+"""
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from classes import DATA_PATH, GENRE_MODES, SNAPSHOT_PATH, SORT_ORDERS, Query, Repository
+from classes import CREDITS_PATH, PEOPLE_PATH
+from classes import FUZZY_MAX_DISTANCE, PROFILER, parse_bounds
+
+# Largest page a client can request
+MAX_LIMIT = 1000
+# Longest request line or header line accepted, and number of header lines
+MAX_LINE = 8192
+MAX_HEADERS = 100
+# Largest request body accepted, no route reads one so it is only skipped
+MAX_BODY = 64 * 1024
+# Seconds an idle keep-alive connection is kept open
+IDLE_TIMEOUT = 15
+# Seconds between two checks of the data files, see SearchServer.watch
+RELOAD_INTERVAL = 5
+# Files which are rewritten when an import finishes
+WATCHED_PATHS = (DATA_PATH.joinpath("title_basic.csv"), DATA_PATH.joinpath("rating.csv"),
+                 CREDITS_PATH, PEOPLE_PATH, SNAPSHOT_PATH)
+
+
+class BadRequest(ValueError):
+    """ Request the server can't answer, reported to the client with a 400 """
+    status = HTTPStatus.BAD_REQUEST
+
+
+class BodyTooLarge(BadRequest):
+    """ Request whose body is over MAX_BODY, reported to the client with a 413 """
+    status = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+
+def build_search_query(repository: Repository, params: dict[str, str]) -> Query:
+    """
+    Translate the parameters of a /search request into a Query.
+
+    :raise BadRequest: if a parameter is not valid
+    """
+    query = Query(repository)
+    try:
+        if params.get("title"):
+            query.title(params["title"], normalized=params.get("exact_title") != "true")
+        if params.get("person"):
+            roles = [role.strip().lower() for role in params.get("role", "").split(",")
+                     if role.strip()]
+            query.person(params["person"], roles or None)
+        if params.get("year"):
+            query.year(*parse_bounds(params["year"], int))
+        if params.get("rating"):
+            query.rating(*parse_bounds(params["rating"], float))
+        if params.get("votes"):
+            query.votes(*parse_bounds(params["votes"], int))
+        if params.get("weighted_rating"):
+            query.weighted_rating(*parse_bounds(params["weighted_rating"], float))
+    except ValueError as error:
+        raise BadRequest(f"Invalid boundary: {error}") from error
+    if params.get("genre"):
+        mode = params.get("genre_mode", "any")
+        if mode not in GENRE_MODES:
+            raise BadRequest(f"genre_mode must be one of {', '.join(GENRE_MODES)}.")
+        query.genre([genre.strip() for genre in params["genre"].split(",") if genre.strip()],
+                    mode)
+    if params.get("adult"):
+        if params["adult"] not in ("exclude", "only"):
+            raise BadRequest("adult must be exclude or only.")
+        query.adult(params["adult"] == "only")
+    return query
+
+
+def int_param(params: dict[str, str], name: str, default: int, maximum: int) -> int:
+    """ Read a non negative integer parameter, up to maximum """
+    try:
+        value = int(params.get(name, default))
+    except ValueError as error:
+        raise BadRequest(f"{name} must be an integer.") from error
+    if not 0 <= value <= maximum:
+        raise BadRequest(f"{name} must be between 0 and {maximum}.")
+    return value
+
+
+def search(repository: Repository, params: dict[str, str]) -> dict:
+    """ Run a /search request, return the JSON body of the response """
+    sort = params.get("sort", "title")
+    if sort not in SORT_ORDERS:
+        raise BadRequest(f"sort must be one of {', '.join(SORT_ORDERS)}.")
+    limit = int_param(params, "limit", 10, MAX_LIMIT)
+    offset = int_param(params, "offset", 0, 2 ** 31)
+
+    with PROFILER.trace("search", params=params) as trace:
+        result = build_search_query(repository, params).paginate(SORT_ORDERS[sort])
+        with PROFILER.stage("page") as stage:
+            movies = [movie.to_dict() for movie in result.slice(offset, offset + limit)]
+            stage.rows = len(movies)
+        trace.rows = len(result)
+    return {
+        "total": len(result),
+        "offset": offset,
+        "limit": limit,
+        "movies": movies
+    }
+
+
+def suggest(repository: Repository, params: dict[str, str]) -> dict:
+    """ Run a /suggest request, return the JSON body of the response """
+    limit = int_param(params, "limit", 10, MAX_LIMIT)
+    movies = repository.suggest(params.get("prefix", ""), limit)
+    return {"movies": [movie.to_dict() for movie in movies]}
+
+
+def fuzzy(repository: Repository, params: dict[str, str]) -> dict:
+    """ Run a /fuzzy request, return the JSON body of the response """
+    if not params.get("title"):
+        raise BadRequest("title is required.")
+    distance = int_param(params, "distance", FUZZY_MAX_DISTANCE, FUZZY_MAX_DISTANCE)
+    limit = int_param(params, "limit", 10, MAX_LIMIT)
+    matches = repository.fuzzy_search(params["title"], distance, limit)
+    return {"movies": [{"distance": distance, **movie.to_dict()}
+                       for movie, distance in matches]}
+
+
+def credits(repository: Repository, params: dict[str, str]) -> dict:
+    """ Run a /credits request, return the JSON body of the response """
+    uid = params.get("uid", "")
+    if not uid.startswith("tt") or not uid[2:].isdigit():
+        raise BadRequest("uid must be a tconst, such as tt0068646.")
+    return {"uid": uid, "people": [{**person._asdict(), "category": category}
+                                   for person, category in repository.movie_people(uid)]}
+
+
+class SearchServer:
+    """
+    Serve searches over HTTP from a single Repository, loaded once.
+
+    Connections are handled by asyncio while the searches themselves run on a thread pool, so
+    a slow title scan doesn't hold up the other requests. At most max_pending searches are
+    accepted at the same time, the next ones being answered 503 until one finishes.
+
+    Reloading builds a new Repository in the background, then swaps it in: searches already
+    running finish on the previous one, the following ones use the new one. A reload happens
+    on POST /reload, and when the data files changed and stayed the same for one check, which
+    is when an import has finished writing them.
+    """
+
+    def __init__(self,
+                 load_repository: Callable[[], Repository],
+                 workers: int = 4,
+                 max_pending: int = 64,
+                 watched_paths: tuple[Path, ...] = WATCHED_PATHS):
+        """
+        :param load_repository: Function returning a loaded Repository, called at start and
+        on each reload
+        :param workers: Number of threads running the searches
+        :param max_pending: Number of searches accepted at the same time
+        """
+        self.load_repository = load_repository
+        self.max_pending = max_pending
+        self.watched_paths = watched_paths
+        self.repository: Optional[Repository] = None
+        self.loaded_at = 0.0
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="search")
+        self._reload_executor = ThreadPoolExecutor(1, thread_name_prefix="reload")
+        self._pending = 0
+        self._reload_task: Optional[asyncio.Task] = None
+        # State of the watched files when the repository was last loaded
+        self._loaded_state: tuple = ()
+
+    def _file_state(self) -> tuple:
+        return tuple(path.stat().st_mtime_ns if path.exists() else None
+                     for path in self.watched_paths)
+
+    async def reload(self) -> None:
+        """ Load a new Repository and swap it in, one reload running at a time """
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload())
+        await asyncio.shield(self._reload_task)
+
+    async def _reload(self) -> None:
+        start = time.perf_counter()
+        repository = await asyncio.get_running_loop().run_in_executor(
+            self._reload_executor, self.load_repository)
+        # Loading may write a snapshot, which must not trigger an other reload
+        self._loaded_state = self._file_state()
+        self.repository = repository
+        self.loaded_at = time.time()
+        logging.info("Repository loaded: %d movies in %.2fs", len(repository.movies),
+                     time.perf_counter() - start)
+
+    async def watch(self, interval: float = RELOAD_INTERVAL) -> None:
+        """ Reload whenever the watched files changed, once they stopped changing """
+        previous_state = self._file_state()
+        while True:
+            await asyncio.sleep(interval)
+            state = self._file_state()
+            if state == previous_state and state != self._loaded_state:
+                try:
+                    await self.reload()
+                except Exception:  # pylint: disable=broad-except
+                    logging.exception("Reload failed, the previous repository is kept")
+                    self._loaded_state = state
+            previous_state = state
+
+    async def handle_search(self, params: dict[str, str],
+                            function: Callable[[Repository, dict], dict] = search
+                            ) -> tuple[HTTPStatus, dict]:
+        """ Run a search, or another function, on the pool unless too many are already pending """
+        if self._pending >= self.max_pending:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Too many pending searches."}
+        self._pending += 1
+        try:
+            body = await asyncio.get_running_loop().run_in_executor(
+                self._executor, function, self.repository, params)
+        except BadRequest as error:
+            return HTTPStatus.BAD_REQUEST, {"error": str(error)}
+        finally:
+            self._pending -= 1
+        return HTTPStatus.OK, body
+
+    async def route(self, method: str, target: str) -> tuple[HTTPStatus, dict]:
+        """ Answer a request, return the status and the JSON body """
+        url = urlsplit(target)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == "/search" and method == "GET":
+            return await self.handle_search(params)
+        if url.path == "/suggest" and method == "GET":
+            # The first suggestion builds the prefix index, it runs on the pool too
+            return await self.handle_search(params, suggest)
+        if url.path == "/fuzzy" and method == "GET":
+            return await self.handle_search(params, fuzzy)
+        if url.path == "/credits" and method == "GET":
+            return await self.handle_search(params, credits)
+        if url.path == "/health" and method == "GET":
+            return HTTPStatus.OK, {"movies": len(self.repository.movies),
+                                   "loaded_at": self.loaded_at,
+                                   "pending": self._pending,
+                                   "cache": self.repository.cache_info()._asdict()}
+        if url.path == "/reload" and method == "POST":
+            await self.reload()
+            return HTTPStatus.OK, {"movies": len(self.repository.movies),
+                                   "loaded_at": self.loaded_at}
+        if url.path in ("/search", "/suggest", "/fuzzy", "/credits", "/health", "/reload"):
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"{method} is not allowed."}
+        return HTTPStatus.NOT_FOUND, {"error": f"{url.path} does not exist."}
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """ Serve the requests of a connection, kept alive between them unless asked not to """
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), IDLE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                method, target, version, headers = request
+                try:
+                    status, body = await self.route(method, target)
+                except BadRequest as error:
+                    status, body = HTTPStatus.BAD_REQUEST, {"error": str(error)}
+                except Exception:  # pylint: disable=broad-except
+                    logging.exception("Error while answering %s %s", method, target)
+                    status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal error."}
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version == "HTTP/1.1")
+                write_response(writer, status, body, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except BadRequest as error:
+            write_response(writer, error.status, {"error": str(error)}, False)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000) -> None:
+        """ Load the repository, then serve until cancelled """
+        await self.reload()
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_LINE)
+        watcher = asyncio.create_task(self.watch())
+        logging.info("Serving on %s", ", ".join(str(sock.getsockname())
+                                                for sock in server.sockets))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._reload_executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def read_request(reader: asyncio.StreamReader
+                       ) -> Optional[tuple[str, str, str, dict[str, str]]]:
+    """
+    Read a request line and its headers, any body is read and ignored.
+
+    :return: method, target, HTTP version and headers (lower case names), or None when the
+    client closed the connection
+    :raise BadRequest: if the request is malformed, BodyTooLarge if its body is over MAX_BODY
+    """
+    try:
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode("latin1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise BadRequest("Malformed request line.")
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            if len(headers) == MAX_HEADERS:
+                raise BadRequest("Too many headers.")
+            name, _, value = line.decode("latin1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+    except ValueError as error:
+        # StreamReader.readline raises ValueError past its limit
+        raise BadRequest("Request line or header too long.") from error
+    if "content-length" in headers:
+        length = headers["content-length"]
+        # int() would also take signs, underscores, spaces and non ASCII digits
+        if not (length.isascii() and length.isdigit()):
+            raise BadRequest("Invalid Content-Length.")
+        if int(length) > MAX_BODY:
+            raise BodyTooLarge(f"The body can't be over {MAX_BODY} bytes.")
+        await reader.readexactly(int(length))
+    return parts[0], parts[1], parts[2], headers
+
+
+def write_response(writer: asyncio.StreamWriter, status: HTTPStatus, body: dict,
+                   keep_alive: bool) -> None:
+    """ Write a JSON response """
+    content = json.dumps(body, ensure_ascii=False).encode("utf8")
+    writer.write(
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(content)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin1")
+        + content)
+
+
+def run_server(load_repository: Callable[[], Repository],
+               host: str = "127.0.0.1",
+               port: int = 8000,
+               workers: int = 4,
+               max_pending: int = 64) -> None:
+    """ Start a SearchServer and serve until interrupted """
+    try:
+        asyncio.run(SearchServer(load_repository, workers, max_pending).serve(host, port))
+    except KeyboardInterrupt:
+        pass
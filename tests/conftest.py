@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Fixtures shared by the tests: synthetic csv files and the repositories loaded from them """
+from pathlib import Path
+
+import pytest
+
+from benchmarks.data import write_csv
+from classes import ColumnStore, DictStore, Repository
+
+# Movies of the synthetic csv files, enough for every criteria to match some of them
+MOVIE_COUNT = 3000
+
+
+@pytest.fixture(scope="session")
+def csv_paths(tmp_path_factory) -> tuple[Path, Path]:
+    """ title_basic.csv and rating.csv of MOVIE_COUNT synthetic movies """
+    return write_csv(tmp_path_factory.mktemp("csv"), MOVIE_COUNT)
+
+
+@pytest.fixture(params=[DictStore, ColumnStore], ids=["dict", "column"])
+def repository(request, csv_paths) -> Repository:
+    """ A repository of each storage engine, loaded from the synthetic csv files """
+    loaded = Repository(request.param())
+    loaded.import_movies(csv_paths[0])
+    loaded.import_ratings(csv_paths[1])
+    return loaded
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Check the cast and crew searches against a plain scan of the credits of every movie """
+from typing import Optional
+
+import pytest
+
+from benchmarks.data import write_credit_tsv
+from classes import Credit, Person, Query, Repository
+from classes.repository import fold_title
+from import_file.import_utils import convert_tsv
+
+from .conftest import MOVIE_COUNT
+
+
+@pytest.fixture(scope="module")
+def credited(csv_paths, tmp_path_factory) -> Repository:
+    """ A repository of the synthetic movies, with the credits and names of their people """
+    directory = tmp_path_factory.mktemp("credits")
+    principals, names = write_credit_tsv(directory, MOVIE_COUNT)
+    credit_path = directory.joinpath("principals.csv")
+    person_path = directory.joinpath("name_basic.csv")
+    repository = Repository()
+    repository.import_movies(csv_paths[0])
+    repository.import_ratings(csv_paths[1])
+    convert_tsv(principals, credit_path, Credit, repository.movies, workers=1)
+    repository.import_credits(credit_path)
+    convert_tsv(names, person_path, Person, repository.credits.person_uids(), workers=1)
+    repository.import_people(person_path)
+    return repository
+
+
+def scan(repository: Repository, name: str, categories: Optional[set[str]] = None) -> list[str]:
+    """ Return the uids of the movies crediting a person whose folded name contains name """
+    name = fold_title(name)
+    return [uid for uid in repository.movies
+            if any(name in fold_title(person.primaryName)
+                   and (categories is None or category in categories)
+                   for person, category in repository.movie_people(uid))]
+
+
+@pytest.mark.parametrize("name, categories", [
+    ("martin", None),
+    ("LEA GARCIA", None),
+    ("chloé müller", None),
+    ("n", None),
+    ("anna", {"director"}),
+    ("smith", {"actor", "actress"}),
+    ("nobody at all", None),
+])
+def test_search_person_matches_scan(credited, name, categories):
+    expected = scan(credited, name, categories)
+    found = credited.search_person(name, categories)
+    assert sorted(movie.uid for movie in found) == sorted(expected)
+    assert credited.estimate_person(name) >= len(scan(credited, name))
+
+
+def test_query_person_matches_scan(credited):
+    query = Query(credited).person("dupont", ["writer"]).year(1990, 2010)
+    expected = {uid for uid in scan(credited, "dupont", {"writer"})
+                if credited.movies[uid].startYear
+                and 1990 <= int(credited.movies[uid].startYear) <= 2010}
+    assert expected, "the synthetic data should match the query"
+    assert {movie.uid for movie in query.movies()} == expected
+
+
+def test_movie_people_in_billing_order(credited, tmp_path):
+    principals, names = write_credit_tsv(tmp_path, MOVIE_COUNT)
+    names_by_uid = {}
+    with open(names, encoding="utf8") as names_file:
+        next(names_file)
+        for line in names_file:
+            nconst, primary_name = line.split("\t")[:2]
+            names_by_uid[nconst] = primary_name
+    expected = {}
+    with open(principals, encoding="utf8") as principals_file:
+        next(principals_file)
+        for line in principals_file:
+            tconst, _, nconst, category = line.split("\t")[:4]
+            expected.setdefault(tconst, []).append(
+                (Person(nconst, names_by_uid[nconst]), category))
+    for uid in list(credited.movies)[::50]:
+        assert credited.movie_people(uid) == expected.get(uid, [])
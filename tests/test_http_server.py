@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Check the parsing of the requests of the search service and its answers over a socket """
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import pytest
+
+from classes import SORT_ORDERS, Query
+from classes.repository import fold_title
+from service.http_server import MAX_BODY, BadRequest, BodyTooLarge, SearchServer, read_request
+
+
+def parse(data: bytes):
+    """ Return what read_request reads from data """
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(read())
+
+
+def test_read_request_skips_the_body():
+    reader_data = (b"POST /reload HTTP/1.1\r\nHost: x\r\nContent-Length: 4\r\n\r\nbody"
+                   b"GET /health HTTP/1.1\r\n\r\n")
+
+    async def read_both():
+        reader = asyncio.StreamReader()
+        reader.feed_data(reader_data)
+        reader.feed_eof()
+        return await read_request(reader), await read_request(reader)
+
+    first, second = asyncio.run(read_both())
+    assert first == ("POST", "/reload", "HTTP/1.1", {"host": "x", "content-length": "4"})
+    assert second == ("GET", "/health", "HTTP/1.1", {})
+
+
+@pytest.mark.parametrize("length", ["-1", "+4", "1_0", " ", "0x10", "٣"])
+def test_invalid_content_length_is_a_bad_request(length):
+    request = f"POST /reload HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("utf8")
+    with pytest.raises(BadRequest) as error:
+        parse(request)
+    assert error.value.status == HTTPStatus.BAD_REQUEST
+
+
+def test_large_body_is_refused():
+    request = f"POST /reload HTTP/1.1\r\nContent-Length: {MAX_BODY + 1}\r\n\r\n".encode()
+    with pytest.raises(BodyTooLarge) as error:
+        parse(request)
+    assert error.value.status == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+
+def test_malformed_request_line():
+    with pytest.raises(BadRequest):
+        parse(b"GET /search\r\n\r\n")
+    assert parse(b"") is None
+
+
+def exchange(repository, request: bytes) -> tuple[int, dict]:
+    """ Send a request to a SearchServer serving repository, return the status and the body """
+    async def run():
+        search_server = SearchServer(lambda: repository)
+        search_server.repository = repository
+        server = await asyncio.start_server(search_server.handle_connection, "127.0.0.1", 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(
+                *server.sockets[0].getsockname()[:2])
+            writer.write(request)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(body)
+    return asyncio.run(run())
+
+
+def test_server_answers_errors_with_their_status(repository):
+    status, body = exchange(repository, b"GET /search?sort=nope HTTP/1.1\r\n"
+                                        b"Connection: close\r\n\r\n")
+    assert status == 400 and "sort" in body["error"]
+    status, _ = exchange(repository, b"POST /reload HTTP/1.1\r\nContent-Length: -1\r\n\r\n")
+    assert status == 400
+    status, _ = exchange(repository, f"POST /reload HTTP/1.1\r\nContent-Length: "
+                                     f"{MAX_BODY + 1}\r\n\r\n".encode())
+    assert status == 413
+
+
+def test_server_search(repository):
+    status, body = exchange(repository, b"GET /search?genre=Drama&sort=year&offset=5&limit=3"
+                                        b" HTTP/1.0\r\n\r\n")
+    expected = Query(repository).genre(["Drama"]).paginate(SORT_ORDERS["year"])
+    assert status == 200
+    assert body["total"] == len(expected)
+    assert [movie["uid"] for movie in body["movies"]] == [
+        movie.uid for movie in expected.slice(5, 8)]
+
+
+def test_shared_paged_result_read_from_threads(repository):
+    query = Query(repository).genre(["Comedy", "Drama"])
+    expected = [movie.uid for movie in sorted(query.movies(), key=lambda movie: (
+        -movie.rating.averageRating, -movie.rating.numVotes, fold_title(movie.primaryTitle),
+        movie.uid) if movie.rating else (1, fold_title(movie.primaryTitle), movie.uid))]
+    # A fresh result, read from the last page first by several threads at once
+    result = query.paginate(SORT_ORDERS["rating"], page_size=5)
+    pages = list(range(result.page_count))[::-1] * 4
+    with ThreadPoolExecutor(8) as executor:
+        read = list(executor.map(lambda number: (number, result.page(number)), pages))
+    for number, page in read:
+        assert [movie.uid for movie in page] == expected[number * 5:number * 5 + 5]
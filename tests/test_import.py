@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Check the imports of the IMDB dumps, through the csv files or straight into the repository """
+from pathlib import Path
+
+import pytest
+
+from benchmarks.data import synthetic_titles, write_tsv
+from classes import ColumnStore, DictStore, Movie, Rating, Repository
+from import_file.import_utils import convert_tsv, import_dumps, join_ratings
+
+TITLE_COUNT = 2000
+BASICS_HEADER = ("tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\t"
+                 "runtimeMinutes\tgenres\n")
+RATINGS_HEADER = "tconst\taverageRating\tnumVotes\n"
+# Characters str.splitlines() would also break a line on
+LINE_BREAKS = "\u2028\u0085\x1c\x0c\x0b"
+
+
+def import_csv(basics: Path, ratings: Path, directory: Path, workers: int = 1) -> Repository:
+    """ Return a repository loaded through the csv files converted from the dumps """
+    movie_path = directory.joinpath("title_basic.csv")
+    rating_path = directory.joinpath("rating.csv")
+    convert_tsv(basics, movie_path, Movie, workers=workers)
+    repository = Repository()
+    repository.import_movies(movie_path)
+    convert_tsv(ratings, rating_path, Rating, repository.movies, workers=workers)
+    repository.import_ratings(rating_path)
+    return repository
+
+
+def write_dumps(directory: Path, titles: list[str], line_end: str = "\n") -> tuple[Path, Path]:
+    """ Write a title.basics.tsv of movies with these titles, each one rated, and its ratings """
+    basics = directory.joinpath("title.basics.tsv")
+    ratings = directory.joinpath("title.ratings.tsv")
+    with open(basics, "w", encoding="utf8", newline="") as basics_file, \
+            open(ratings, "w", encoding="utf8", newline="") as ratings_file:
+        basics_file.write(BASICS_HEADER.replace("\n", line_end))
+        ratings_file.write(RATINGS_HEADER.replace("\n", line_end))
+        for number, title in enumerate(titles, 1):
+            basics_file.write(f"tt{number:07d}\tmovie\t{title}\t{title}\t0\t2000\t\\N\t90\t"
+                              f"Drama{line_end}")
+            ratings_file.write(f"tt{number:07d}\t7.5\t{number}{line_end}")
+    return basics, ratings
+
+
+@pytest.fixture(scope="module")
+def dumps(tmp_path_factory) -> tuple[Path, Path]:
+    """ title.basics.tsv.gz and title.ratings.tsv.gz of synthetic titles, movies or not """
+    return write_tsv(tmp_path_factory.mktemp("dumps"), TITLE_COUNT, compress=True)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_convert_tsv_keeps_the_movies(dumps, tmp_path, workers):
+    repository = import_csv(*dumps, tmp_path, workers)
+    titles = [title for title in synthetic_titles(TITLE_COUNT, movie_share=0.6)
+              if title.titleType == "movie"]
+    assert sorted(repository.movies) == [title.tconst for title in titles]
+    for title in titles:
+        movie = repository.movies[title.tconst]
+        assert movie.primaryTitle == title.primaryTitle
+        assert movie.startYear == ("" if title.startYear == r"\N" else title.startYear)
+        if title.averageRating:
+            assert movie.rating == (title.tconst, float(title.averageRating),
+                                    int(title.numVotes))
+        else:
+            assert movie.rating is None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_import_dumps_matches_the_csv_import(dumps, tmp_path, workers):
+    expected = import_csv(*dumps, tmp_path)
+    repository = Repository()
+    report = import_dumps(repository, *dumps, workers=workers, save=False)
+    assert report.inserted == len(expected.movies)
+    assert dict(repository.movies.items()) == dict(expected.movies.items())
+
+
+@pytest.mark.parametrize("line_end", ["\n", "\r\n"])
+def test_titles_holding_line_breaks(tmp_path, line_end):
+    titles = [f"Before{char}After" for char in LINE_BREAKS]
+    basics, ratings = write_dumps(tmp_path, titles, line_end)
+    repository = Repository()
+    import_dumps(repository, basics, ratings, workers=1, save=False)
+    converted = import_csv(basics, ratings, tmp_path)
+    for loaded in (repository, converted):
+        assert [movie.primaryTitle for movie in loaded.movies.values()] == titles
+        assert all(movie.rating for movie in loaded.movies.values())
+
+
+def test_unsorted_dump_leaves_the_repository_untouched(repository, tmp_path):
+    movies = dict(repository.movies.items())
+    basics, ratings = write_dumps(tmp_path, ["First", "Second", "Third"])
+    lines = basics.read_text(encoding="utf8").splitlines(keepends=True)
+    basics.write_text("".join([lines[0], lines[2], lines[1], lines[3]]), encoding="utf8")
+
+    with pytest.raises(ValueError):
+        import_dumps(Repository(), basics, ratings, workers=1, save=False)
+    with pytest.raises(ValueError):
+        repository.import_rows(join_ratings(
+            [("tt0000002", "B", "B", False, "", ""), ("tt0000001", "A", "A", False, "", "")],
+            []))
+    assert dict(repository.movies.items()) == movies
+
+
+def test_import_dumps_updates_a_loaded_repository(tmp_path):
+    basics, ratings = write_dumps(tmp_path, ["First", "Second", "Third"])
+    repository = Repository()
+    import_dumps(repository, basics, ratings, workers=1, save=False)
+
+    basics, ratings = write_dumps(tmp_path, ["First", "Changed"])
+    report = import_dumps(repository, basics, ratings, workers=1, save=False)
+    assert (report.inserted, report.changed, report.removed, report.unchanged) == (0, 1, 1, 1)
+    assert [movie.primaryTitle for movie in repository.movies.values()] == ["First", "Changed"]
+
+
+def test_update_movies_keeps_the_ratings(csv_paths, tmp_path):
+    repository = Repository()
+    repository.import_movies(csv_paths[0])
+    repository.import_ratings(csv_paths[1])
+    lines = csv_paths[0].read_text(encoding="utf8").splitlines(keepends=True)
+    uid = lines[1].split(",")[0]
+    rating = repository.movies[uid].rating
+    path = tmp_path.joinpath("title_basic.csv")
+    path.write_text("".join([lines[0], f"{uid},Renamed,Renamed,0,1999,Drama\n"]
+                            + lines[2:-1]), encoding="utf8")
+
+    report = repository.update_movies(path)
+    assert (report.inserted, report.changed, report.removed) == (0, 1, 1)
+    assert repository.movies[uid] == Movie(uid, "Renamed", "Renamed", False, "1999", ["Drama"],
+                                           rating)
+
+
+def test_column_store_add_rows_matches_dict_store(monkeypatch):
+    monkeypatch.setattr("classes.storage.ADD_CHUNK_ROWS", 3)
+    rows = [(f"tt{number:07d}", f"Title {number}", "Été" if number % 3 else f"Title {number}",
+             number % 5 == 0, str(1900 + number) if number % 4 else "",
+             ["Comedy", "Drama"][:number % 3] or "", Rating(f"tt{number:07d}", 7.5, number)
+             if number % 2 else None) for number in range(10)]
+    # A repeated uid replaces the movie, in the same chunk or a later one
+    rows += [rows[9][:1] + ("Again",) + rows[9][2:], rows[1][:1] + ("Remade",) + rows[1][2:]]
+    expected = DictStore()
+    expected.add_rows(rows[:6])
+    expected.add_rows(rows[6:])
+    store = ColumnStore()
+    store.add_rows(rows[:6])
+    store.add_rows(rows[6:])
+    assert dict(store.items()) == dict(expected.items())
+    assert [store.row_id(uid) for uid in store] == [expected.row_id(uid) for uid in store]
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Check Query and the searches it plans against a plain scan of every movie """
+import gc
+import math
+import weakref
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from classes import Movie, Query, Repository
+from classes.repository import WEIGHTED_MIN_VOTES, fold_title
+
+
+def scan(repository: Repository, predicate: Callable[[Movie], bool]) -> list[int]:
+    """ Return the rows of the movies matching predicate, in increasing order """
+    return sorted(row for row in repository.movies.rows()
+                  if predicate(repository.movies.movie_at(row)))
+
+
+def folded_title_contains(text: str) -> Callable[[Movie], bool]:
+    text = fold_title(text)
+    return lambda movie: (text in fold_title(movie.primaryTitle)
+                          or text in fold_title(movie.originalTitle))
+
+
+def rated(movie: Movie, low: float, high: float, field: str) -> bool:
+    return movie.rating is not None and low <= getattr(movie.rating, field) <= high
+
+
+def genres(movie: Movie) -> set[str]:
+    return set(movie.genres) if movie.genres else set()
+
+
+CASES = {
+    "title": (lambda query: query.title("Dark"), folded_title_contains("dark")),
+    "title accents": (lambda query: query.title("CAFE"), folded_title_contains("café")),
+    "title two words": (lambda query: query.title("love night"),
+                        folded_title_contains("love night")),
+    "title exact": (lambda query: query.title("Café", normalized=False),
+                    lambda movie: "Café" in movie.primaryTitle or "Café" in movie.originalTitle),
+    "title short": (lambda query: query.title("ma"), folded_title_contains("ma")),
+    "year": (lambda query: query.year(1990, 1999),
+             lambda movie: movie.startYear != "" and 1990 <= int(movie.startYear) <= 1999),
+    "year open": (lambda query: query.year(min_year=2020),
+                  lambda movie: movie.startYear != "" and int(movie.startYear) >= 2020),
+    "rating": (lambda query: query.rating(7.5, 8.2),
+               lambda movie: rated(movie, 7.5, 8.2, "averageRating")),
+    "votes": (lambda query: query.votes(100),
+              lambda movie: rated(movie, 100, math.inf, "numVotes")),
+    "genre any": (lambda query: query.genre(["Drama", "Horror"]),
+                  lambda movie: bool(genres(movie) & {"Drama", "Horror"})),
+    "genre all": (lambda query: query.genre(["Drama", "Horror"], "all"),
+                  lambda movie: genres(movie) >= {"Drama", "Horror"}),
+    "genre none": (lambda query: query.genre(["Drama", "Comedy"], "none"),
+                   lambda movie: not genres(movie) & {"Drama", "Comedy"}),
+    "adult": (lambda query: query.adult(True), lambda movie: movie.isAdult),
+    "combined": (lambda query: query.title("the").year(1950, 2000).rating(5).genre(["Drama"]),
+                 lambda movie: (folded_title_contains("the")(movie)
+                                and movie.startYear != "" and 1950 <= int(movie.startYear) <= 2000
+                                and rated(movie, 5, math.inf, "averageRating")
+                                and "Drama" in genres(movie))),
+    "combined not adult": (lambda query: query.adult(False).votes(max_votes=20).title("star"),
+                           lambda movie: (not movie.isAdult
+                                          and rated(movie, -math.inf, 20, "numVotes")
+                                          and folded_title_contains("star")(movie))),
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_query_matches_scan(repository, name):
+    build, predicate = CASES[name]
+    expected = scan(repository, predicate)
+    assert expected, "the synthetic data should match every case"
+    assert build(Query(repository)).rows() == expected
+
+
+def test_query_without_criteria_returns_everything(repository):
+    assert Query(repository).rows() == sorted(repository.movies.rows())
+
+
+def test_weighted_rating_matches_formula(repository):
+    ratings = [movie.rating for movie in repository.movies.values() if movie.rating]
+    mean = math.fsum(rating.averageRating for rating in ratings) / len(ratings)
+    prior = WEIGHTED_MIN_VOTES * mean
+    for movie in repository.movies.values():
+        weighted = repository.get_weighted_rating(movie.uid)
+        if movie.rating is None:
+            assert weighted is None
+        else:
+            expected = ((movie.rating.numVotes * movie.rating.averageRating + prior)
+                        / (movie.rating.numVotes + WEIGHTED_MIN_VOTES))
+            assert weighted == pytest.approx(expected)
+
+
+def test_paginate_orders_like_a_full_sort(repository):
+    query = Query(repository).genre(["Comedy"])
+    result = query.paginate([("startYear", True), "primaryTitle"], page_size=7)
+    expected = sorted(query.movies(), key=lambda movie: (
+        -int(movie.startYear) if movie.startYear else math.inf,
+        fold_title(movie.primaryTitle), movie.uid))
+    assert [movie.uid for movie in result.page(3)] == [movie.uid for movie in expected[21:28]]
+    assert [movie.uid for movie in result] == [movie.uid for movie in expected]
+
+
+def test_replaced_repository_is_freed(csv_paths):
+    repository = Repository()
+    repository.import_movies(csv_paths[0])
+    repository.import_ratings(csv_paths[1])
+    # A cached PagedResult refers back to the repository through its tie keys
+    Query(repository).genre(["Comedy"]).paginate(["primaryTitle"]).page(0)
+    replaced = weakref.ref(repository)
+    del repository
+    gc.collect()
+    assert replaced() is None
+
+
+def test_query_is_cached_whatever_the_order_of_its_criteria(repository):
+    rows = Query(repository).title("love").year(1950).rows()
+    hits = repository.cache_info().hits
+    assert Query(repository).year(1950).title("LOVE").rows() == rows
+    assert repository.cache_info().hits == hits + 1
+
+
+def test_cached_results_are_bounded_by_their_rows(csv_paths):
+    repository = Repository(cache_rows=300)
+    repository.import_movies(csv_paths[0])
+    assert len(Query(repository).rows()) > 300
+    assert repository.cache_info().size == 0
+    for year in range(1950, 2000):
+        Query(repository).year(year, year + 5).rows()
+        assert repository.cache_info().rows <= 300
+    rows = Query(repository).year(1999, 2004).rows()
+    hits = repository.cache_info().hits
+    assert Query(repository).year(1999, 2004).rows() == rows
+    assert repository.cache_info().hits == hits + 1
+
+
+def test_import_ratings_drops_cached_results(csv_paths):
+    repository = Repository()
+    repository.import_movies(csv_paths[0])
+    assert Query(repository).rating(7).rows() == []
+    repository.import_ratings(csv_paths[1])
+    expected = scan(repository, lambda movie: rated(movie, 7, math.inf, "averageRating"))
+    assert expected
+    assert Query(repository).rating(7).rows() == expected
+
+
+@pytest.mark.parametrize("name", ["year", "rating", "title", "genre all"])
+def test_first_queries_from_threads_see_whole_indexes(repository, name):
+    build, predicate = CASES[name]
+    expected = scan(repository, predicate)
+    # The indexes are not built yet, every thread asks for them at once
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: build(Query(repository)).rows(), range(8)))
+    assert results == [expected] * 8
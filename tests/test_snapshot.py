@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Check the binary snapshot and the memory-mapped catalogue give back the same repository """
+import os
+import pickle
+import time
+
+from classes import Query, Repository
+from classes.repository import SNAPSHOT_VERSION
+
+
+def same_repository(loaded: Repository, expected: Repository) -> None:
+    assert dict(loaded.movies.items()) == dict(expected.movies.items())
+    for query in (lambda repo: Query(repo).title("amelie"),
+                  lambda repo: Query(repo).year(1980, 1990).rating(6),
+                  lambda repo: Query(repo).genre(["Drama"]).votes(50)):
+        assert query(loaded).movies() == query(expected).movies()
+
+
+def test_snapshot_round_trip(repository, tmp_path):
+    path = tmp_path.joinpath("repository.bin")
+    repository.save_snapshot(path)
+    loaded = Repository(type(repository.movies)())
+    assert loaded.load_snapshot(path)
+    same_repository(loaded, repository)
+
+
+def test_snapshot_after_removals_and_updates(repository, tmp_path):
+    uids = list(repository.movies)
+    repository.remove_movie(uids[0])
+    repository.add_movie(repository.movies[uids[1]]._replace(primaryTitle="Été à Paris"))
+    repository.remove_rating(uids[2])
+    path = tmp_path.joinpath("repository.bin")
+    repository.save_snapshot(path)
+    loaded = Repository(type(repository.movies)())
+    assert loaded.load_snapshot(path)
+    same_repository(loaded, repository)
+    assert Query(loaded).title("ete a paris").rows() == [loaded.movies.row_id(uids[1])]
+
+
+def test_snapshot_of_an_empty_repository(tmp_path):
+    path = tmp_path.joinpath("repository.bin")
+    Repository().save_snapshot(path)
+    loaded = Repository()
+    assert loaded.load_snapshot(path)
+    assert not loaded.movies
+    assert Query(loaded).title("love").rows() == []
+
+
+def test_missing_snapshot(tmp_path):
+    assert not Repository().load_snapshot(tmp_path.joinpath("repository.bin"))
+
+
+def test_undecodable_snapshot_is_outdated(repository, tmp_path):
+    path = tmp_path.joinpath("repository.bin")
+    repository.save_snapshot(path)
+    path.write_bytes(path.read_bytes()[:1000])
+    movies = dict(repository.movies.items())
+    assert not repository.load_snapshot(path)
+    assert dict(repository.movies.items()) == movies
+
+    with open(path, "wb") as snapshot_file:
+        pickle.dump(SNAPSHOT_VERSION, snapshot_file)
+        pickle.dump(("not", "credits"), snapshot_file)
+    assert not repository.load_snapshot(path)
+    assert not repository.load_credits(path)
+    assert dict(repository.movies.items()) == movies
+
+
+def test_snapshot_of_an_other_version(tmp_path):
+    path = tmp_path.joinpath("repository.bin")
+    with open(path, "wb") as snapshot_file:
+        pickle.dump(SNAPSHOT_VERSION - 1, snapshot_file)
+    assert not Repository().load_snapshot(path)
+
+
+def test_mapped_round_trip(repository, tmp_path):
+    snapshot_path, map_path = tmp_path.joinpath("repository.bin"), tmp_path.joinpath("movies.map")
+    repository.save_snapshot(snapshot_path)
+    repository.save_mapped(map_path)
+    loaded = Repository()
+    assert loaded.load_mapped(map_path, snapshot_path)
+    same_repository(loaded, repository)
+
+
+def test_mapped_indexes_answer_like_built_ones(repository, tmp_path):
+    map_path = tmp_path.joinpath("movies.map")
+    repository.save_mapped(map_path)
+    loaded = Repository()
+    assert loaded.load_mapped(map_path, tmp_path.joinpath("repository.bin"))
+    for search in (lambda repo: repo.search_title("love"),
+                   lambda repo: repo.search_title("AMÉLIE", normalized=True),
+                   lambda repo: repo.search_title("zzzz"),
+                   lambda repo: repo.search_year(1980, 1990),
+                   lambda repo: repo.search_rating(7.5),
+                   lambda repo: repo.search_votes(100, 5000),
+                   lambda repo: repo.search_weighted_rating(6.5),
+                   lambda repo: repo.search_genre(["Comedy", "Drama"], "all"),
+                   lambda repo: repo.search_adult(True)):
+        assert sorted(search(loaded)) == sorted(search(repository))
+    assert loaded.genres() == repository.genres()
+
+
+def test_mapped_catalogue_is_outdated_by_a_newer_snapshot(repository, tmp_path):
+    snapshot_path, map_path = tmp_path.joinpath("repository.bin"), tmp_path.joinpath("movies.map")
+    repository.save_mapped(map_path)
+    assert Repository.mapped_is_fresh(map_path, snapshot_path)
+    repository.save_snapshot(snapshot_path)
+    os.utime(snapshot_path, (time.time() + 10, time.time() + 10))
+    assert not Repository.mapped_is_fresh(map_path, snapshot_path)
+    assert not Repository().load_mapped(map_path, snapshot_path)